@@ -0,0 +1,224 @@
+"""
+Synthetic spec interface package used by the benchmarks.
+
+Sample messages carry the send time (perf_counter_ns) and a sequence number
+followed by `data` padding bytes, with the usual ID, SENDER, LENGTH header.
+
+Nested and ZMQ packages of configurable depth and list size are used by the
+out-message wrapper benchmarks.
+"""
+import struct
+import time
+import types
+from collections.abc import MutableSequence
+
+BYTE_ORDER = 'BIG'
+HEADER = struct.Struct('!IHH')  # message id, sender, length
+SAMPLE = struct.Struct('!QI')   # sent_ns, sequence
+SENDER = 1
+
+
+class Sample:
+	ID = 1
+	source = ['benchmark']
+
+	def __init__(self, sent_ns=0, sequence=0, data=b''):
+		self.sent_ns = sent_ns
+		self.sequence = sequence
+		self.data = data
+
+	@classmethod
+	def from_dict(cls, _dict):
+		return cls(**(_dict or dict()))
+
+	def to_dict(self):
+		return dict(sent_ns=self.sent_ns, sequence=self.sequence, size=len(self.data))
+
+	def serialize(self):
+		length = HEADER.size + SAMPLE.size + len(self.data)
+		return HEADER.pack(self.ID, SENDER, length) + SAMPLE.pack(self.sent_ns, self.sequence) + self.data
+
+
+message_map = {Sample.ID: Sample}
+
+
+def sample_size(size):
+	"""Length of the padding giving a serialized Sample of `size` bytes."""
+	return max(size - HEADER.size - SAMPLE.size, 0)
+
+
+def timestamped(sequence, padding):
+	return Sample(time.perf_counter_ns(), sequence, padding).serialize()
+
+
+def deserialize(buffer):
+	message_id, _, length = HEADER.unpack_from(buffer)
+	sent_ns, sequence = SAMPLE.unpack_from(buffer, HEADER.size)
+	return message_map[message_id](sent_ns, sequence, bytes(buffer[HEADER.size + SAMPLE.size:length]))
+
+
+def install():
+	"""Provide the header accessors that SpecNodeWrapper leaves to the interface owner."""
+	from rsimulator.network.wrappers.node_wrapper import SpecNodeWrapper
+	SpecNodeWrapper.get_message_name_from_buffer = \
+		lambda self, buffer: message_map[HEADER.unpack_from(buffer)[0]].__name__
+	SpecNodeWrapper.get_message_length_start_end_bytes = lambda self: [6, 8]
+	SpecNodeWrapper.msgid_sender_length = lambda self: [0, HEADER.size]
+
+
+# Nested spec packages (out-message wrapper benchmarks)
+
+class Scalar:
+	"""u32 leaf value."""
+	FORMAT = struct.Struct('!I')
+
+	def __init__(self, value=0):
+		self.value = value
+
+	@classmethod
+	def from_dict(cls, value):
+		return cls(value or 0)
+
+	def to_dict(self):
+		return self.value
+
+	def serialize(self):
+		return self.FORMAT.pack(self.value)
+
+
+class Array(MutableSequence):
+	"""List of Scalar, serialized with a u16 length."""
+	ITEM = Scalar
+	DEFAULT_SIZE = 0  # Number of elements when the default data does not set the list
+	LENGTH = struct.Struct('!H')
+
+	def __init__(self, items=None):
+		self._list = list(items or ())
+
+	@classmethod
+	def from_dict(cls, items):
+		if items is None:
+			items = range(cls.DEFAULT_SIZE)
+		return cls([cls.ITEM.from_dict(item) for item in items])
+
+	def to_dict(self):
+		return [item.to_dict() for item in self._list]
+
+	def serialize(self):
+		return self.LENGTH.pack(len(self._list)) + b''.join(item.serialize() for item in self._list)
+
+	def __getitem__(self, index):
+		return self._list[index]
+
+	def __setitem__(self, index, value):
+		self._list[index] = value
+
+	def __delitem__(self, index):
+		del self._list[index]
+
+	def __len__(self):
+		return len(self._list)
+
+	def insert(self, index, value):
+		self._list.insert(index, value)
+
+
+class Structure:
+	FIELDS = dict()  # field name -> type
+
+	def __init__(self, **fields):
+		for name, Type in self.FIELDS.items():
+			setattr(self, name, fields[name] if name in fields else Type())
+
+	@classmethod
+	def from_dict(cls, _dict):
+		_dict = _dict or dict()
+		return cls(**{name: Type.from_dict(_dict.get(name)) for name, Type in cls.FIELDS.items()})
+
+	def to_dict(self):
+		return {name: getattr(self, name).to_dict() for name in self.FIELDS}
+
+	def serialize(self):
+		return b''.join(getattr(self, name).serialize() for name in self.FIELDS)
+
+
+class NestedMessage(Structure):
+	ID = 0
+
+	def serialize(self):
+		body = super().serialize()
+		return HEADER.pack(self.ID, SENDER, HEADER.size + len(body)) + body
+
+	@classmethod
+	def layout(cls):
+		"""{leaf path: (offset, format)} of the default message (serialize-by-patch)."""
+		fields = dict()
+
+		def walk(Type, prefix, offset):
+			for name, Field in Type.FIELDS.items():
+				if issubclass(Field, Scalar):
+					fields[prefix + name] = (offset, 'I')
+					offset += Scalar.FORMAT.size
+				elif issubclass(Field, Array):
+					offset += Array.LENGTH.size
+					for index in range(Field.DEFAULT_SIZE):
+						fields[f'{prefix}{name}.{index}'] = (offset, 'I')
+						offset += Scalar.FORMAT.size
+				else:
+					offset = walk(Field, f'{prefix}{name}.', offset)
+			return offset
+
+		walk(cls, '', HEADER.size)
+		return fields
+
+
+def nested_message(name, depth, list_size, message_id=1):
+	"""
+	Return a message class `depth` levels deep: every level has a `value` and a `child`,
+	the innermost level has a `value` and an `items` list of `list_size` elements.
+	"""
+	Items = type(f'{name}Items', (Array,), dict(DEFAULT_SIZE=list_size))
+	Level = type(f'{name}Level1', (Structure,), dict(FIELDS=dict(value=Scalar, items=Items)))
+	for level in range(2, depth):
+		Level = type(f'{name}Level{level}', (Structure,), dict(FIELDS=dict(value=Scalar, child=Level)))
+	fields = dict(value=Scalar, child=Level) if depth > 1 else Level.FIELDS
+	return type(name, (NestedMessage,), dict(ID=message_id, FIELDS=fields))
+
+
+def nested_package(shapes):
+	"""
+	Return an interface package (module) with a nested message for each (depth, list_size) in shapes.
+	Message names are 'Depth{depth}List{list_size}'.
+	"""
+	package = types.ModuleType('synthetic_nested')
+	package.BYTE_ORDER = BYTE_ORDER
+	package.message_map = dict()
+	for message_id, (depth, list_size) in enumerate(shapes, start=1):
+		name = f'Depth{depth}List{list_size}'
+		Message = nested_message(name, depth, list_size, message_id)
+		setattr(package, name, Message)
+		package.message_map[message_id] = Message
+	return package
+
+
+def nested_paths(depth):
+	"""Return (leaf path, list path) of a nested message."""
+	parents = ['child'] * (depth - 1)
+	return parents + ['value'], parents + ['items']
+
+
+def zmq_package(names):
+	"""Return a ZMQ-like interface package with a Message subclass for each name."""
+	from rsimulator.network.interface.zmq.interface import Message
+	package = types.ModuleType('synthetic_zmq')
+	for name in names:
+		setattr(package, name, type(name, (Message,), dict(
+			__init__=lambda self, payload=None, _name=name: Message.__init__(self, _name, payload))))
+	return package
+
+
+def nested_payload(depth, list_size):
+	payload = dict(value=0, items=list(range(list_size)))
+	for _ in range(depth - 1):
+		payload = dict(value=0, child=payload)
+	return payload
@@ -0,0 +1,84 @@
+"""
+Offline message generation: one message at a time vs NumPy batches.
+
+	loop    SpecOutMessageWrapper.update_data (two leaves) + serialize per message
+	batch   rsimulator.network.batch.generate (counter + seeded uniform fields)
+
+Usage:
+	python benchmarks/batch.py [--counts 10000 100000] [--depth 4] [--list-size 64] [--json]
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+BENCHMARKS = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCHMARKS))
+sys.path.insert(0, BENCHMARKS)
+
+import _synthetic
+from out_message_wrappers import create_network, NODE_NAME
+
+LOOP_LIMIT = 100000  # The loop is extrapolated above this count
+
+
+def run(network, depth, list_size, count):
+	from rsimulator.network.batch import generate
+
+	name = f'Depth{depth}List{list_size}'
+	package = network.get_node_wrap(NODE_NAME).interface_pkg
+	wrap = network.get_message_wrap(name, node_name=NODE_NAME)
+	leaf, _ = _synthetic.nested_paths(depth)
+	first = ['value']
+
+	loop_count = min(count, LOOP_LIMIT)
+	start = time.perf_counter()
+	for index in range(loop_count):
+		wrap.update_data(first, index)
+		wrap.update_data(leaf, index % 1000)
+		wrap.serialize()
+	loop = (time.perf_counter() - start) * count / loop_count
+
+	generate(package, name, 1)  # Imports numpy
+	start = time.perf_counter()
+	batch = generate(package, name, count, seed=1, fields={
+		'value': {'counter': [0, 1]},
+		'.'.join(leaf): {'uniform': [0, 1000]},
+	})
+	elapsed = time.perf_counter() - start
+	return dict(count=count, message_size=batch.message_size, loop_s=round(loop, 4), batch_s=round(elapsed, 4),
+		speedup=round(loop / elapsed, 1), batch_msgs_s=round(count / elapsed))
+
+
+def main():
+	parser = argparse.ArgumentParser(description='rsimulator batch generation benchmark')
+	parser.add_argument('--counts', nargs='+', type=int, default=[10000, 100000, 1000000])
+	parser.add_argument('--depth', type=int, default=4)
+	parser.add_argument('--list-size', type=int, default=64)
+	parser.add_argument('--json', action='store_true', help='print the results as JSON')
+	args = parser.parse_args()
+
+	workdir = tempfile.mkdtemp(prefix='rsim_batch_bench_')
+	cwd = os.getcwd()
+	try:
+		os.chdir(workdir)
+		network = create_network([(args.depth, args.list_size)], workdir)
+		results = [run(network, args.depth, args.list_size, count) for count in args.counts]
+	finally:
+		os.chdir(cwd)
+		shutil.rmtree(workdir, ignore_errors=True)
+
+	if args.json:
+		print(json.dumps(results, indent=2))
+		return
+	print(f'{"count":>9}{"bytes":>7}{"loop_s":>10}{"batch_s":>10}{"speedup":>9}{"batch msg/s":>14}')
+	for result in results:
+		print(f'{result["count"]:>9}{result["message_size"]:>7}{result["loop_s"]:>10}{result["batch_s"]:>10}'
+			  f'{result["speedup"]:>9}{result["batch_msgs_s"]:>14}')
+
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,93 @@
+"""
+Startup benchmark for the YAML configuration cache.
+
+Generates a default-data file of the requested size and measures:
+	- safe_load:  pure Python yaml.safe_load (the loader used before the cache)
+	- cold:       cache miss (C loader + cache write)
+	- warm:       cache hit (pickle load)
+
+Usage:
+	python benchmarks/config_cache.py [--size-mb 2] [--runs 3] [--json]
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from rsimulator.conf import cache
+
+
+def generate_default_data(path, size_mb):
+	"""Write a default-data YAML file of about size_mb megabytes."""
+	target = size_mb * 1024 * 1024
+	with open(path, 'w') as stream:
+		index = 0
+		while stream.tell() < target:
+			stream.write(f'Message{index}:\n'
+						 f'  header: {{id: {index}, sender: 1, length: 64}}\n'
+						 f'  counter: {index}\n'
+						 f'  status: {{enabled: true, mode: NOMINAL, gain: {index * 0.5}}}\n'
+						 f'  samples: [{", ".join(str(index + i) for i in range(16))}]\n')
+			index += 1
+
+
+def timed(func, *args):
+	start = time.perf_counter()
+	result = func(*args)
+	return time.perf_counter() - start, result
+
+
+def main():
+	parser = argparse.ArgumentParser(description='rsimulator YAML cache benchmark')
+	parser.add_argument('--size-mb', type=float, default=2)
+	parser.add_argument('--runs', type=int, default=3)
+	parser.add_argument('--json', action='store_true', help='print the results as JSON')
+	args = parser.parse_args()
+
+	import yaml
+
+	def safe_load(path):
+		with open(path, 'r') as stream:
+			return yaml.safe_load(stream)
+
+	workdir = tempfile.mkdtemp(prefix='rsim_cache_bench_')
+	try:
+		data_file = os.path.join(workdir, 'default_data.yaml')
+		cache_dir = os.path.join(workdir, 'cache')
+		generate_default_data(data_file, args.size_mb)
+
+		results = dict(safe_load=list(), cold=list(), warm=list())
+		reference = None
+		for _ in range(args.runs):
+			elapsed, reference = timed(safe_load, data_file)
+			results['safe_load'].append(elapsed)
+			shutil.rmtree(cache_dir, ignore_errors=True)
+			elapsed, cold = timed(cache.load_yaml, data_file, cache_dir)
+			results['cold'].append(elapsed)
+			elapsed, warm = timed(cache.load_yaml, data_file, cache_dir)
+			results['warm'].append(elapsed)
+			assert cold == warm == reference, 'cached data differs from yaml.safe_load'
+
+		summary = dict(
+			file_mb=round(os.path.getsize(data_file) / 1024 / 1024, 2),
+			libyaml=bool(getattr(yaml, '__with_libyaml__', False)),
+			**{f'{name}_s': round(min(values), 4) for name, values in results.items()},
+		)
+		summary['speedup_warm_vs_safe_load'] = round(summary['safe_load_s'] / summary['warm_s'], 1)
+	finally:
+		shutil.rmtree(workdir, ignore_errors=True)
+
+	if args.json:
+		print(json.dumps(summary, indent=2))
+	else:
+		for key, value in summary.items():
+			print(f'{key:>28}: {value}')
+
+
+if __name__ == '__main__':
+	main()
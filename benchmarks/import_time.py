@@ -0,0 +1,91 @@
+"""
+Import-time benchmark for rsimulator.
+
+Runs `python -X importtime -c "import rsimulator"` in a clean working directory and checks that:
+	- the median cumulative import time of the package stays within the budget
+	- the heavy optional dependencies are not imported
+	- importing the package does not create any file (e.g. the log/ directory)
+
+Usage:
+	python benchmarks/import_time.py [--runs 10] [--budget-ms 75]
+
+The exit code is 1 if one of the checks fails.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+PACKAGE = 'rsimulator'
+LAZY_MODULES = ('yaml', 'zmq', 'transitions', 'asyncio', 'numpy')
+DEFAULT_BUDGET_MS = 75
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def run_python(code, cwd, importtime=False):
+	env = dict(os.environ)
+	env['PYTHONPATH'] = os.pathsep.join(filter(None, [REPO_ROOT, env.get('PYTHONPATH')]))
+	args = [sys.executable] + (['-X', 'importtime'] if importtime else []) + ['-c', code]
+	return subprocess.run(args, cwd=cwd, env=env, capture_output=True, text=True, check=True)
+
+
+def package_import_time_us(stderr):
+	"""Return the cumulative import time (us) of the top-level package."""
+	for line in stderr.splitlines():
+		if not line.startswith('import time:'):
+			continue
+		_, cumulative, name = line[len('import time:'):].split('|')
+		if name.strip() == PACKAGE:
+			return int(cumulative)
+	raise RuntimeError(f'{PACKAGE} not found in the importtime output')
+
+
+def main():
+	parser = argparse.ArgumentParser(description='rsimulator import-time benchmark')
+	parser.add_argument('--runs', type=int, default=10)
+	parser.add_argument('--budget-ms', type=float, default=DEFAULT_BUDGET_MS)
+	parser.add_argument('--json', action='store_true', help='print the results as JSON')
+	args = parser.parse_args()
+
+	with tempfile.TemporaryDirectory() as cwd:
+		# Warm-up run so that the bytecode cache is written
+		run_python(f'import {PACKAGE}', cwd)
+		timings = [package_import_time_us(run_python(f'import {PACKAGE}', cwd, importtime=True).stderr) / 1000
+			for _ in range(args.runs)]
+		loaded = run_python(
+			f'import sys, {PACKAGE}; print(",".join(m for m in {LAZY_MODULES!r} if m in sys.modules))',
+			cwd).stdout.strip()
+		created_files = os.listdir(cwd)
+
+	result = dict(
+		runs=args.runs,
+		median_ms=round(statistics.median(timings), 3),
+		min_ms=round(min(timings), 3),
+		max_ms=round(max(timings), 3),
+		budget_ms=args.budget_ms,
+		eagerly_imported=[m for m in loaded.split(',') if m],
+		created_files=created_files,
+	)
+	failures = list()
+	if result['median_ms'] > args.budget_ms:
+		failures.append(f'median import time {result["median_ms"]} ms exceeds the {args.budget_ms} ms budget')
+	if result['eagerly_imported']:
+		failures.append(f'modules imported eagerly: {result["eagerly_imported"]}')
+	if created_files:
+		failures.append(f'files created at import time: {created_files}')
+
+	if args.json:
+		print(json.dumps(dict(result, failures=failures), indent=2))
+	else:
+		print(f'import {PACKAGE}: median {result["median_ms"]} ms '
+			  f'(min {result["min_ms"]}, max {result["max_ms"]}, budget {args.budget_ms}) over {args.runs} runs')
+		for failure in failures:
+			print(f'FAIL: {failure}')
+	return 1 if failures else 0
+
+
+if __name__ == '__main__':
+	sys.exit(main())
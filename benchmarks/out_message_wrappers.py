@@ -0,0 +1,171 @@
+"""
+Micro-benchmarks of the out-message wrapper operations.
+
+For every (depth, list size) shape of a synthetic nested package, measures the
+time per operation (best of --repeat runs of --number calls) and, with tracemalloc:
+	- peak_b    peak of the memory allocated during one call (bytes)
+	- blocks    memory blocks still allocated after the call (retained per call)
+
+Operations:
+	spec.get_data           SpecOutMessageWrapper.get_data (deepest leaf)
+	spec.get_data_list      SpecOutMessageWrapper.get_data (innermost list, to_dict)
+	spec.update_data        SpecOutMessageWrapper.update_data (deepest leaf)
+	spec.add_items_to_list  SpecOutMessageWrapper.add_items_to_list (one item)
+	spec.serialize          SpecOutMessageWrapper.serialize
+	spec.update_serialize   update_data (deepest leaf) + serialize
+	patch.update_serialize  same with serialize-by-patch (patch: true)
+	patch.generate_serialize  generate (sine on the deepest leaf, '_generators') + serialize, by patch
+	zmq.update_data         ZMQOutMessageWrapper.update_data (deepest leaf)
+	network.update_data     RNetwork.update_data ('Message.child...value')
+	network.get_data        RNetwork.get_data ('Message.child...value')
+
+Usage:
+	python benchmarks/out_message_wrappers.py [--depths 1 4 8] [--list-sizes 4 64 512]
+		[--number 2000] [--repeat 5] [--json]
+"""
+import argparse
+import itertools
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+import types
+
+BENCHMARKS = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCHMARKS))
+sys.path.insert(0, BENCHMARKS)
+
+import _synthetic
+
+NODE_NAME = 'bench'
+
+
+def time_per_call(operation, number, repeat, setup=None):
+	"""Best time of `repeat` runs of `number` calls, in ns per call."""
+	best = float('inf')
+	for _ in range(repeat):
+		if setup:
+			setup()
+		start = time.perf_counter_ns()
+		for _ in range(number):
+			operation()
+		best = min(best, time.perf_counter_ns() - start)
+	return best / number
+
+
+def allocations_per_call(operation, number, setup=None):
+	"""Return (peak bytes of one call, blocks retained per call)."""
+	if setup:
+		setup()
+	operation()
+	ignore = [tracemalloc.Filter(False, tracemalloc.__file__)]
+	tracemalloc.start()
+	try:
+		peaks = list()
+		before = tracemalloc.take_snapshot().filter_traces(ignore)
+		for _ in range(number):
+			current, _ = tracemalloc.get_traced_memory()
+			tracemalloc.reset_peak()
+			operation()
+			peaks.append(tracemalloc.get_traced_memory()[1] - current)
+		after = tracemalloc.take_snapshot().filter_traces(ignore)
+	finally:
+		tracemalloc.stop()
+	retained = sum(stat.count_diff for stat in after.compare_to(before, 'filename'))
+	return sorted(peaks)[len(peaks) // 2], retained / number
+
+
+def create_network(shapes, workdir):
+	"""Return the RNetwork with one (not started) node holding a message per shape."""
+	import yaml
+	from rsimulator import network as rn
+
+	package = _synthetic.nested_package(shapes)
+	network_file = os.path.join(workdir, 'network.yaml')
+	with open(network_file, 'w') as stream:
+		yaml.safe_dump({NODE_NAME: dict(
+			protocol='spec_tcp', role='server', host='127.0.0.1', port=1, log_level='warning',
+			messages={name: dict(direction='out') for name in vars(package) if name.startswith('Depth')},
+		)}, stream)
+	rn.set_network_file(network_file)
+	rn.add_node_interface_pkg(NODE_NAME, package)
+	return rn.get_network()
+
+
+def operations(network, depth, list_size):
+	"""Return {name: (operation, setup)} for a shape."""
+	from rsimulator.network.wrappers.out_message_wrapper import SpecOutMessageWrapper, ZMQOutMessageWrapper
+
+	name = f'Depth{depth}List{list_size}'
+	leaf, items = _synthetic.nested_paths(depth)
+	wrap = network.get_message_wrap(name, node_name=NODE_NAME)
+	patch_wrap = SpecOutMessageWrapper(parent_node=network.get_node_wrap(NODE_NAME), name=name, patch=True)
+	generated_wrap = SpecOutMessageWrapper(
+		parent_node=network.get_node_wrap(NODE_NAME), name=name, patch=True,
+		default_data={'_generators': {'.'.join(map(str, leaf)): {'sine': {'amplitude': 100, 'offset': 100}}}})
+	zmq_wrap = ZMQOutMessageWrapper(
+		parent_node=types.SimpleNamespace(interface_pkg=_synthetic.zmq_package([name])), name=name)
+	zmq_wrap.set_payload(_synthetic.nested_payload(depth, list_size))
+	path = '.'.join([name] + leaf)
+	return {
+		'spec.get_data': (lambda: wrap.get_data(leaf), None),
+		'spec.get_data_list': (lambda: wrap.get_data(items), None),
+		'spec.update_data': (lambda: wrap.update_data(leaf, 7), None),
+		# The list grows at each call: every run starts from the default data
+		'spec.add_items_to_list': (lambda: wrap.add_items_to_list(items, [7]), wrap.reset_data),
+		'spec.serialize': (wrap.serialize, wrap.reset_data),
+		'spec.update_serialize': (lambda: (wrap.update_data(leaf, 7), wrap.serialize()), wrap.reset_data),
+		'patch.update_serialize': (lambda: (patch_wrap.update_data(leaf, 7), patch_wrap.serialize()), None),
+		'patch.generate_serialize': (lambda: (generated_wrap.generate(), generated_wrap.serialize()), None),
+		'zmq.update_data': (lambda: zmq_wrap.update_data(leaf, 7), None),
+		'network.update_data': (lambda: network.update_data(path, 7, node_name=NODE_NAME), None),
+		'network.get_data': (lambda: network.get_data(path, node_name=NODE_NAME), None),
+	}
+
+
+def main():
+	parser = argparse.ArgumentParser(description='rsimulator out-message wrapper micro-benchmarks')
+	parser.add_argument('--depths', nargs='+', type=int, default=[1, 4, 8])
+	parser.add_argument('--list-sizes', nargs='+', type=int, default=[4, 64, 512])
+	parser.add_argument('--number', type=int, default=2000, help='calls per timed run')
+	parser.add_argument('--repeat', type=int, default=5, help='timed runs (the best is kept)')
+	parser.add_argument('--json', action='store_true', help='print the results as JSON')
+	args = parser.parse_args()
+
+	shapes = list(itertools.product(args.depths, args.list_sizes))
+	workdir = tempfile.mkdtemp(prefix='rsim_wrapper_bench_')
+	cwd = os.getcwd()
+	results = list()
+	try:
+		# The network log is created in the working directory
+		os.chdir(workdir)
+		network = create_network(shapes, workdir)
+		for depth, list_size in shapes:
+			for name, (operation, setup) in operations(network, depth, list_size).items():
+				peak, blocks = allocations_per_call(operation, min(args.number, 500), setup)
+				results.append(dict(
+					operation=name,
+					depth=depth,
+					list_size=list_size,
+					ns_op=round(time_per_call(operation, args.number, args.repeat, setup)),
+					peak_b=peak,
+					blocks=round(blocks, 2),
+				))
+	finally:
+		os.chdir(cwd)
+		shutil.rmtree(workdir, ignore_errors=True)
+
+	if args.json:
+		print(json.dumps(results, indent=2))
+		return
+	print(f'{"operation":<24}{"depth":>6}{"list":>6}{"ns/op":>10}{"peak_b":>9}{"blocks":>8}')
+	for result in sorted(results, key=lambda result: (result['operation'], result['depth'], result['list_size'])):
+		print(f'{result["operation"]:<24}{result["depth"]:>6}{result["list_size"]:>6}'
+			  f'{result["ns_op"]:>10}{result["peak_b"]:>9}{result["blocks"]:>8}')
+
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,108 @@
+"""
+Throughput benchmark for the traffic recorder.
+
+Several threads record frames concurrently (as the node threads do), then the
+capture is read back and replayed at max speed into counting nodes.
+Every recorded frame must be found in the capture.
+
+Usage:
+	python benchmarks/recorder.py [--frames 200000] [--threads 4] [--size 64] [--target 50000] [--json]
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from rsimulator.network.recorder import Recorder, Replayer, IN, OUT
+
+
+class CountingNode:
+	def __init__(self):
+		self.sent = 0
+
+	def send_buffer(self, buffer):
+		self.sent += 1
+
+
+class CountingNetwork:
+	def __init__(self):
+		self.nodes = dict()
+
+	def get_node_wrap(self, node_name):
+		return self.nodes.setdefault(node_name, CountingNode())
+
+
+def main():
+	parser = argparse.ArgumentParser(description='rsimulator recorder benchmark')
+	parser.add_argument('--frames', type=int, default=200000, help='total number of recorded frames')
+	parser.add_argument('--threads', type=int, default=4)
+	parser.add_argument('--size', type=int, default=64, help='payload size in bytes')
+	parser.add_argument('--target', type=int, default=50000, help='required frames/s')
+	parser.add_argument('--json', action='store_true', help='print the results as JSON')
+	args = parser.parse_args()
+
+	workdir = tempfile.mkdtemp(prefix='rsim_recorder_bench_')
+	try:
+		path = os.path.join(workdir, 'capture.rec')
+		payload = bytes(range(256)) * (args.size // 256 + 1)
+		payload = payload[:args.size]
+		per_thread = args.frames // args.threads
+
+		def produce(recorder, index):
+			node_name = f'node{index}'
+			for frame in range(per_thread):
+				recorder.record(node_name, OUT if frame % 2 else IN, payload, f'Message{frame % 8}')
+
+		# Small initial size to include the growth of the files in the measure
+		recorder = Recorder(path, initial_size=1024 * 1024)
+		threads = [threading.Thread(target=produce, args=(recorder, index)) for index in range(args.threads)]
+		start = time.perf_counter()
+		for thread in threads:
+			thread.start()
+		for thread in threads:
+			thread.join()
+		record_s = time.perf_counter() - start
+		recorder.close()
+
+		with Replayer(path) as replayer:
+			start = time.perf_counter()
+			read_bytes = sum(len(frame.buffer) for frame in replayer.frames())
+			read_s = time.perf_counter() - start
+			network = CountingNetwork()
+			start = time.perf_counter()
+			replayed = replayer.replay(network, speed=None)
+			replay_s = time.perf_counter() - start
+			recorded = len(replayer)
+
+		expected = per_thread * args.threads
+		assert recorded == expected, f'{expected - recorded} frames dropped'
+		assert read_bytes == expected * args.size
+		summary = dict(
+			frames=recorded,
+			payload_bytes=args.size,
+			threads=args.threads,
+			record_frames_s=round(recorded / record_s),
+			read_frames_s=round(recorded / read_s),
+			replay_max_frames_s=round(replayed / replay_s),
+			capture_mb=round(os.path.getsize(path) / 1024 / 1024, 2),
+		)
+		summary['target_met'] = summary['record_frames_s'] >= args.target
+	finally:
+		shutil.rmtree(workdir, ignore_errors=True)
+
+	if args.json:
+		print(json.dumps(summary, indent=2))
+	else:
+		for key, value in summary.items():
+			print(f'{key:>20}: {value}')
+	return 0 if summary['target_met'] else 1
+
+
+if __name__ == '__main__':
+	sys.exit(main())
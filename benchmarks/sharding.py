@@ -0,0 +1,137 @@
+"""
+Scaling benchmark for the worker processes.
+
+Each case runs P loopback pairs (server srvN + client cliN) of the given protocol.
+Every client sends Sample messages as fast as its periodic sender can (SEND_INTERVAL)
+and the aggregate reception rate of the servers is measured from their counters.
+	local     every node in the main process
+	sharded   every pair in its own worker process ('worker' key in the network YAML)
+
+Usage:
+	python benchmarks/sharding.py [--pairs 1 2 4] [--protocol spec_tcp] [--duration 3] [--json]
+"""
+import argparse
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCHMARKS = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCHMARKS))
+sys.path.insert(0, BENCHMARKS)
+
+MODES = ('local', 'sharded')
+CONNECT_TIMEOUT = 10  # seconds
+WARMUP = 0.5          # seconds
+SEND_INTERVAL = 1e-6  # seconds (0 would select the message interval)
+
+
+def free_port():
+	with socket.socket() as _socket:
+		_socket.bind(('127.0.0.1', 0))
+		return _socket.getsockname()[1]
+
+
+def network_definition(case):
+	network = dict()
+	for index in range(case['pairs']):
+		node = dict(protocol=case['protocol'], host='127.0.0.1', port=free_port(), log_level='warning')
+		if case['mode'] == 'sharded':
+			node['worker'] = f'pair{index}'
+		network[f'srv{index}'] = dict(node, role='server', messages=dict(Sample=dict(direction='in')))
+		network[f'cli{index}'] = dict(node, role='client', messages=dict(Sample=dict(direction='out')))
+	return network
+
+
+def run_case(case):
+	import yaml
+	import _synthetic
+	import rsimulator
+	from rsimulator import network as rn
+
+	_synthetic.install()
+	network = network_definition(case)
+	with open('network.yaml', 'w') as stream:
+		yaml.safe_dump(network, stream)
+	rn.set_network_file('network.yaml')
+	for node_name in network:
+		rn.add_node_interface_pkg(node_name, _synthetic)
+
+	net = rn.get_network()
+	rsimulator.start()
+	try:
+		if not rn.wait_for_connections(timeout=CONNECT_TIMEOUT):
+			raise TimeoutError(f'network not connected within {CONNECT_TIMEOUT}s')
+		servers = [net.get_node_wrap(f'srv{index}') for index in range(case['pairs'])]
+		for index in range(case['pairs']):
+			net.start_periodic('Sample', f'cli{index}', interval=SEND_INTERVAL)
+		time.sleep(WARMUP)
+		start_counts = [server.get_message('Sample').counter for server in servers]
+		start = time.perf_counter()
+		time.sleep(case['duration'])
+		counts = [server.get_message('Sample').counter for server in servers]
+		elapsed = time.perf_counter() - start
+		for index in range(case['pairs']):
+			net.stop_periodic('Sample', f'cli{index}')
+		rates = [(count - start_count) / elapsed for count, start_count in zip(counts, start_counts)]
+		return dict(case, msgs_s=round(sum(rates)), per_pair_msgs_s=[round(rate) for rate in rates])
+	finally:
+		rsimulator.stop()
+
+
+def run_in_process(case):
+	workdir = tempfile.mkdtemp(prefix='rsim_sharding_bench_')
+	command = [sys.executable, os.path.abspath(__file__), '--case', json.dumps(case)]
+	try:
+		completed = subprocess.run(command, cwd=workdir, capture_output=True, text=True,
+			timeout=case['duration'] + 60)
+	finally:
+		shutil.rmtree(workdir, ignore_errors=True)
+	for line in reversed(completed.stdout.splitlines()):
+		if line.startswith('{'):
+			return json.loads(line)
+	errors = completed.stderr.strip()
+	return dict(case, error=errors.splitlines()[-1] if errors else 'no result')
+
+
+def main():
+	parser = argparse.ArgumentParser(description='rsimulator worker process scaling benchmark')
+	parser.add_argument('--pairs', nargs='+', type=int, default=[1, 2, 4])
+	parser.add_argument('--protocol', default='spec_tcp', choices=('spec_tcp', 'spec_udp'))
+	parser.add_argument('--duration', type=float, default=3, help='measure time in seconds')
+	parser.add_argument('--json', action='store_true', help='print the results as JSON')
+	parser.add_argument('--case', help=argparse.SUPPRESS)
+	args = parser.parse_args()
+
+	if args.case:
+		print(json.dumps(run_case(json.loads(args.case))), flush=True)
+		os._exit(0)
+
+	results = list()
+	for pairs in args.pairs:
+		for mode in MODES:
+			results.append(run_in_process(dict(mode=mode, pairs=pairs, protocol=args.protocol,
+				duration=args.duration)))
+
+	if args.json:
+		print(json.dumps(dict(cpus=os.cpu_count(), results=results), indent=2))
+		return
+	print(f'cpus: {os.cpu_count()}')
+	print(f'{"pairs":>6}{"mode":>9}{"msgs/s":>12}{"speedup":>9}')
+	local = dict()
+	for result in results:
+		if 'error' in result:
+			print(f'{result["pairs"]:>6}{result["mode"]:>9}  ERROR: {result["error"]}')
+			continue
+		if result['mode'] == 'local':
+			local[result['pairs']] = result['msgs_s']
+		speedup = result['msgs_s'] / local[result['pairs']] if local.get(result['pairs']) else float('nan')
+		print(f'{result["pairs"]:>6}{result["mode"]:>9}{result["msgs_s"]:>12}{speedup:>9.2f}')
+
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,296 @@
+"""
+Transport benchmark suite.
+
+Every case stands up a loopback network (one server node and N client nodes)
+from a generated network YAML, in its own process, and measures:
+	- throughput (msgs/s, MB/s) of the messages sent by the clients
+	- latency percentiles in microseconds:
+		spec_tcp, spec_udp  one way, client send_buffer -> server signal
+		unix_tcp, unix_udp  same as spec_tcp, spec_udp over a Unix domain socket
+		zmq                 round trip, client send_buffer -> reply future done
+
+Cases are the product of --protocols, --runtimes, --sizes and --clients.
+Combinations not supported by the tree are reported with an 'error' entry.
+
+Usage:
+	python benchmarks/transport.py [--protocols spec_tcp spec_udp unix_tcp unix_udp zmq] [--runtimes sync async]
+		[--sizes 64 1024 4096] [--clients 1 4] [--messages 10000] [--rate 0]
+		[--output results.json] [--compare baseline.json]
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+BENCHMARKS = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCHMARKS))
+sys.path.insert(0, BENCHMARKS)
+
+PROTOCOLS = ('spec_tcp', 'spec_udp', 'unix_tcp', 'unix_udp', 'zmq')
+# Benchmark protocols run by a protocol of the tree over a Unix domain socket
+UNIX_PROTOCOLS = dict(unix_tcp='spec_tcp', unix_udp='spec_udp')
+RUNTIMES = ('sync', 'async')
+CONNECT_TIMEOUT = 10   # seconds
+IDLE_TIMEOUT = 2       # seconds without receptions ending a case
+CASE_TIMEOUT = 120     # seconds
+CASE_KEYS = ('protocol', 'runtime', 'size', 'clients')
+
+
+# Case runner (executed in a child process)
+
+class Stats:
+	def __init__(self):
+		self.lock = threading.Lock()
+		self.latencies = list()
+		self.bytes = 0
+		self.first_send = None
+		self.last_receive = None
+
+	def sent(self, timestamp):
+		if self.first_send is None:
+			self.first_send = timestamp
+
+	def received(self, latency_ns, size):
+		with self.lock:
+			self.last_receive = time.perf_counter_ns()
+			self.latencies.append(latency_ns)
+			self.bytes += size
+
+	@property
+	def count(self):
+		return len(self.latencies)
+
+
+def free_port():
+	with socket.socket() as _socket:
+		_socket.bind(('127.0.0.1', 0))
+		return _socket.getsockname()[1]
+
+
+def network_definition(case):
+	"""Return the network YAML data of a case: node 'srv' and clients 'cli0'...'cliN'."""
+	zmq = case['protocol'] == 'zmq'
+	unix = case['protocol'] in UNIX_PROTOCOLS
+	asynchronous = case['runtime'] == 'async'
+	protocols = ('zmq_rep', 'zmq_req') if zmq and asynchronous else \
+				('zmq', 'zmq') if zmq else \
+				(UNIX_PROTOCOLS[case['protocol']],) * 2 if unix else (case['protocol'], case['protocol'])
+	# The case runs in its own working directory
+	node = dict(path=os.path.abspath('srv.sock'), log_level='warning') if unix else \
+		dict(host='127.0.0.1', port=free_port(), log_level='warning')
+	network = dict(srv=dict(node, protocol=protocols[0], role='server'))
+	if not zmq:
+		network['srv']['messages'] = dict(Sample=dict(direction='in'))
+	for index in range(case['clients']):
+		network[f'cli{index}'] = dict(node, protocol=protocols[1], role='client')
+		if not zmq:
+			network[f'cli{index}']['messages'] = dict()
+	return network
+
+
+def percentile(values, percent):
+	return values[min(len(values) - 1, int(len(values) * percent / 100))]
+
+
+def run_case(case):
+	import yaml
+	import _synthetic
+	import rsimulator
+	from rsimulator import network as rn
+	from rsimulator.utils.rsignal import signal_instance
+
+	zmq = case['protocol'] == 'zmq'
+	_synthetic.install()
+	if case['runtime'] == 'async':
+		rn.set_asynchronous()
+	network = network_definition(case)
+	with open('network.yaml', 'w') as stream:
+		yaml.safe_dump(network, stream)
+	# Each case runs in a temporary directory: its files are not worth caching
+	rn.disable_yaml_cache()
+	rn.set_network_file('network.yaml')
+	if not zmq:
+		for node_name in network:
+			rn.add_node_interface_pkg(node_name, _synthetic)
+
+	stats = Stats()
+	padding = b'x' * _synthetic.sample_size(case['size'])
+	if zmq:
+		def on_sample(payload, logger):
+			return dict(type='Sample', payload=payload)
+	else:
+		def on_sample(data, logger):
+			stats.received(time.perf_counter_ns() - data['sent_ns'], case['size'])
+	signal_instance.connect(('srv', 'Sample'), on_sample)
+
+	net = rn.get_network()
+	rsimulator.start()
+	try:
+		if not rn.wait_for_connections(timeout=CONNECT_TIMEOUT):
+			raise TimeoutError(f'network not connected within {CONNECT_TIMEOUT}s')
+		per_client = case['messages'] // case['clients']
+		interval = 1 / case['rate'] if case['rate'] else 0
+
+		def send(node_name):
+			node = net.get_node_wrap(node_name)
+			start = time.perf_counter()
+			for sequence in range(per_client):
+				if interval:
+					delay = start + sequence * interval - time.perf_counter()
+					if delay > 0:
+						time.sleep(delay)
+				sent_ns = time.perf_counter_ns()
+				stats.sent(sent_ns)
+				if zmq:
+					buffer = json.dumps(dict(type='Sample', payload=dict(
+						sent_ns=sent_ns, data=padding.decode()))).encode('utf-8')
+					future = node.send_buffer(buffer)
+					future.add_done_callback(lambda _future, _sent_ns=sent_ns, _size=len(buffer): stats.received(
+						time.perf_counter_ns() - _sent_ns, _size))
+				else:
+					node.send_buffer(_synthetic.timestamped(sequence, padding))
+
+		senders = [threading.Thread(target=send, args=(f'cli{index}',)) for index in range(case['clients'])]
+		for sender in senders:
+			sender.start()
+		for sender in senders:
+			sender.join()
+
+		expected = per_client * case['clients']
+		last_count, last_change = -1, time.monotonic()
+		while stats.count < expected and time.monotonic() - last_change < IDLE_TIMEOUT:
+			if stats.count != last_count:
+				last_count, last_change = stats.count, time.monotonic()
+			time.sleep(0.01)
+
+		with stats.lock:
+			latencies = sorted(stats.latencies)
+			received_bytes = stats.bytes
+		duration = (stats.last_receive - stats.first_send) / 1e9 if latencies else None
+		result = dict(
+			case,
+			sent=expected,
+			received=len(latencies),
+			lost=expected - len(latencies),
+			duration_s=round(duration, 4) if duration else None,
+			msgs_s=round(len(latencies) / duration) if duration else 0,
+			mb_s=round(received_bytes / duration / 1e6, 3) if duration else 0,
+			latency_kind='round_trip' if zmq else 'one_way',
+		)
+		if latencies:
+			result['latency_us'] = dict(
+				p50=round(percentile(latencies, 50) / 1e3, 1),
+				p90=round(percentile(latencies, 90) / 1e3, 1),
+				p99=round(percentile(latencies, 99) / 1e3, 1),
+				max=round(latencies[-1] / 1e3, 1),
+			)
+		return result
+	finally:
+		rsimulator.stop()
+
+
+# Suite driver
+
+def run_in_process(case):
+	"""Run a case in a child process (the network is a singleton) and return its result."""
+	workdir = tempfile.mkdtemp(prefix='rsim_transport_bench_')
+	command = [sys.executable, os.path.abspath(__file__), '--case', json.dumps(case)]
+	try:
+		completed = subprocess.run(command, cwd=workdir, capture_output=True, text=True, timeout=CASE_TIMEOUT)
+		output, errors = completed.stdout, completed.stderr
+	except subprocess.TimeoutExpired as e:
+		output, errors = e.stdout or '', f'case timed out after {CASE_TIMEOUT}s'
+		output = output.decode() if isinstance(output, bytes) else output
+	finally:
+		shutil.rmtree(workdir, ignore_errors=True)
+	for line in reversed(output.splitlines()):
+		if line.startswith('{'):
+			return json.loads(line)
+	detail = errors.strip().splitlines()[-1] if errors.strip() else 'no result'
+	return dict(case, error=detail)
+
+
+def case_key(result):
+	return tuple(result[key] for key in CASE_KEYS)
+
+
+def compare(results, baseline_file):
+	with open(baseline_file, 'r') as stream:
+		baseline = {case_key(result): result for result in json.load(stream)['results']}
+	print(f'\nComparison with {baseline_file} (ratio current / baseline)')
+	print(f'{"case":<32}{"msgs/s":>10}{"p99 latency":>14}')
+	for result in results:
+		previous = baseline.get(case_key(result))
+		if previous is None or 'error' in result or 'error' in previous:
+			continue
+		throughput = result['msgs_s'] / previous['msgs_s'] if previous['msgs_s'] else float('nan')
+		latency = result['latency_us']['p99'] / previous['latency_us']['p99'] \
+			if previous.get('latency_us') and result.get('latency_us') else float('nan')
+		print(f'{"/".join(map(str, case_key(result))):<32}{throughput:>10.2f}{latency:>14.2f}')
+
+
+def print_result(result):
+	name = '/'.join(map(str, case_key(result)))
+	if 'error' in result:
+		print(f'{name:<32} ERROR: {result["error"]}')
+		return
+	latency = result.get('latency_us', dict())
+	print(f'{name:<32}{result["msgs_s"]:>10} msg/s {result["mb_s"]:>9.3f} MB/s  '
+		  f'p50 {latency.get("p50")} p99 {latency.get("p99")} us ({result["latency_kind"]})  '
+		  f'lost {result["lost"]}')
+
+
+def main():
+	parser = argparse.ArgumentParser(description='rsimulator transport benchmark suite')
+	parser.add_argument('--protocols', nargs='+', choices=PROTOCOLS, default=list(PROTOCOLS))
+	parser.add_argument('--runtimes', nargs='+', choices=RUNTIMES, default=list(RUNTIMES))
+	parser.add_argument('--sizes', nargs='+', type=int, default=[64, 1024, 4096], help='message sizes in bytes')
+	parser.add_argument('--clients', nargs='+', type=int, default=[1, 4], help='client node counts')
+	parser.add_argument('--messages', type=int, default=10000, help='messages per case (all clients)')
+	parser.add_argument('--rate', type=float, default=0, help='messages/s per client (0 for unlimited)')
+	parser.add_argument('--output', help='write the results to this JSON file')
+	parser.add_argument('--compare', help='JSON results of a previous run to compare with')
+	parser.add_argument('--case', help=argparse.SUPPRESS)
+	args = parser.parse_args()
+
+	if args.case:
+		print(json.dumps(run_case(json.loads(args.case))), flush=True)
+		# Do not wait for lingering node threads
+		os._exit(0)
+
+	results = list()
+	for protocol in args.protocols:
+		for runtime in args.runtimes:
+			for size in args.sizes:
+				for clients in args.clients:
+					case = dict(protocol=protocol, runtime=runtime, size=size, clients=clients,
+								messages=args.messages, rate=args.rate)
+					result = run_in_process(case)
+					print_result(result)
+					results.append(result)
+
+	report = dict(
+		meta=dict(
+			timestamp=time.strftime('%Y-%m-%dT%H:%M:%S'),
+			python=platform.python_version(),
+			platform=platform.platform(),
+			cpus=os.cpu_count(),
+		),
+		results=results,
+	)
+	if args.output:
+		with open(args.output, 'w') as stream:
+			json.dump(report, stream, indent=2)
+	if args.compare:
+		compare(results, args.compare)
+
+
+if __name__ == '__main__':
+	main()
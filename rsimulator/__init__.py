@@ -1,17 +1,19 @@
-import yaml
 from .conf.network import network_config
 from .conf.statemachine import sm_config
 
 from .utils import error
 from .utils import enums
 from .utils import rlogging
+from .utils import rclock
 
 from .network import get_network
 from .statemachine import get_sm_manager
+from .statemachine import get_requirement_manager
 
 def start():
 	get_network().start()
 	get_sm_manager().start()
+	get_requirement_manager().start()
 
 def stop(signum=None, frame=None):
 	get_network().stop()
@@ -24,6 +26,7 @@ def greeting():
 	print('Ciao da Riccardo!')
 
 def create_default_yaml(interface_pkg, output_path='output.yaml'):
+	import yaml
 	output_path += '' if output_path.endswith('.yaml') else '.yaml'
 	data = {Message.__name__: Message().to_dict() for Message in interface_pkg.message_map.values()}
 	with open(output_path, 'w') as file:
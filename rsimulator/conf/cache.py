@@ -0,0 +1,78 @@
+import hashlib
+import os
+import pickle
+
+# Bump to invalidate the cache files written by previous versions
+CACHE_VERSION = 1
+# Entries kept in the cache directory: the oldest are removed when an entry is written
+MAX_ENTRIES = 128
+
+
+def default_cache_dir():
+	"""Cache directory: $RSIMULATOR_CACHE_DIR or ~/.cache/rsimulator"""
+	return os.environ.get('RSIMULATOR_CACHE_DIR') or \
+		os.path.join(os.path.expanduser('~'), '.cache', 'rsimulator')
+
+
+def parse_yaml(path):
+	"""Parse a YAML file with the C loader when libyaml is available."""
+	import yaml
+	Loader = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+	with open(path, 'r') as stream:
+		return yaml.load(stream, Loader=Loader)
+
+
+def prune(cache_dir, max_entries=MAX_ENTRIES):
+	"""Remove the least recently written entries beyond max_entries."""
+	entries = list()
+	for entry in os.scandir(cache_dir):
+		if entry.name.endswith('.pickle'):
+			try:
+				entries.append((entry.stat().st_mtime_ns, entry.path))
+			except OSError:
+				pass
+	for _mtime, path in sorted(entries, reverse=True)[max_entries:]:
+		try:
+			os.remove(path)
+		except OSError:
+			# Removed by another process
+			pass
+
+
+def load_yaml(path, cache_dir=None):
+	"""
+	Load a YAML file through the on-disk cache.
+	The cache entry is keyed by path, mtime and size: any change of the file is a miss.
+	On a miss the file is parsed and the result is pickled for the next run.
+	One entry is written per distinct path: the directory keeps the MAX_ENTRIES newest.
+	:param path: YAML file path
+	:param cache_dir: Cache directory (default_cache_dir() if None)
+	:return: The parsed structure
+	"""
+	path = os.path.abspath(path)
+	stat = os.stat(path)
+	key = (CACHE_VERSION, path, stat.st_mtime_ns, stat.st_size)
+	cache_dir = cache_dir or default_cache_dir()
+	cache_file = os.path.join(cache_dir, hashlib.sha1(path.encode('utf-8')).hexdigest() + '.pickle')
+
+	try:
+		with open(cache_file, 'rb') as stream:
+			if pickle.load(stream) == key:
+				return pickle.load(stream)
+	except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ValueError):
+		pass
+
+	data = parse_yaml(path)
+	try:
+		os.makedirs(cache_dir, exist_ok=True)
+		tmp_file = f'{cache_file}.{os.getpid()}.tmp'
+		with open(tmp_file, 'wb') as stream:
+			pickle.dump(key, stream, protocol=pickle.HIGHEST_PROTOCOL)
+			pickle.dump(data, stream, protocol=pickle.HIGHEST_PROTOCOL)
+		# Atomic swap: concurrent processes never read a partial entry
+		os.replace(tmp_file, cache_file)
+		prune(cache_dir)
+	except OSError:
+		# A read-only cache directory only costs the parsing time
+		pass
+	return data
@@ -1,6 +1,5 @@
 import os
-import yaml
-import pkgutil
+import functools
 
 class Config:
 
@@ -12,6 +11,8 @@ class Config:
 	_default_zmq_handlers_enabled = True
 
 	_zmq_messages = dict()
+	_zmq_descriptor = None
+	_zmq_validators = None
 
 	_uploaded_packages = dict()
 	_uploaded_default_data = dict()
@@ -20,13 +21,28 @@ class Config:
 
 	_asynchronous_network = False
 
+	_yaml_cache_enabled = True
+	_yaml_cache_dir = None  # None: default_cache_dir()
+
 	_network_log_file = 'network.log'
 
 	ZMQ_CONNECTION_REQUEST = '__ping__'
 	ZMQ_CONNECTION_REPLY = '__pong__'
 	MAX_LENGTH_IN_MESSAGES_DEQUE = 10
 	CLIENT_CONNECTION_ATTEMPTS = 50
+	CLIENT_BACKOFF_INITIAL = 0.05  # seconds
+	CLIENT_BACKOFF_MAX = 2.0       # seconds
+	CLIENT_BACKOFF_FACTOR = 2.0
+	CLIENT_BACKOFF_JITTER = 0.2    # +/-20% of each delay
+	CLIENT_RECONNECT = True
+	CLIENT_OUTBOUND_BUFFER_SIZE = 1000
+	CLIENT_OUTBOUND_POLICY = 'replay'  # 'replay' or 'conflate'
+	CONNECTION_HISTORY_LENGTH = 100
+	SHARED_STATE_SIZE = 64 * 1024  # bytes, default segment size of the shared out messages
+	SHAPING_BURST_TIME = 0.05  # seconds of rate in a default token bucket burst (covers the sender wake-up latency)
+	SHAPING_MIN_SLEEP = 0.001  # seconds, shorter shaping waits are carried over to the next buffers
 	SERVER_SOCKET_TIMEOUT = 0.5
+	ASYNC_STOP_TIMEOUT = 5
 
 
 
@@ -97,26 +113,44 @@ class Config:
 		self._uploaded_packages[interface_alias] = package
 
 	def add_node_default_data(self, node_name, default_data_file):
-		with open(default_data_file, 'r') as stream:
-			default_data = yaml.safe_load(stream)
+		default_data = self.load_yaml(default_data_file)
 		self._uploaded_default_data.__setitem__(node_name, default_data)
 
 	def add_node_glitch_data(self, node_name, glitch_data_file):
-		with open(glitch_data_file, 'r') as stream:
-			glitch_data = yaml.safe_load(stream)
+		glitch_data = self.load_yaml(glitch_data_file)
 		self._uploaded_glitch_data.__setitem__(node_name, glitch_data)
 
 	def add_node_dispatcher(self, node_name, dispatcher):
 		self._uploaded_dispatchers.__setitem__(node_name, dispatcher)
 
 	def set_network_data(self):
-		with open(self.network_file, 'r') as file:
-			self._network_data = yaml.safe_load(file)
+		self._network_data = self.load_yaml(self.network_file)
+
+	# YAML cache
+
+	def enable_yaml_cache(self, cache_dir=None):
+		"""
+		Cache the parsed YAML files (on by default, in ~/.cache/rsimulator).
+		Each distinct file path adds an entry; the oldest are removed beyond cache.MAX_ENTRIES.
+		Callers loading files from temporary directories should pass a throwaway cache_dir
+		or disable the cache.
+		"""
+		self._yaml_cache_enabled = True
+		self._yaml_cache_dir = cache_dir
+
+	def disable_yaml_cache(self):
+		self._yaml_cache_enabled = False
+
+	def load_yaml(self, file):
+		from . import cache
+		if self._yaml_cache_enabled:
+			return cache.load_yaml(file, self._yaml_cache_dir)
+		return cache.parse_yaml(file)
 
 	@staticmethod
 	def network_log_path():
+		# The log directory is created by the file handler on the first record
 		_path = os.path.join(os.getcwd(), 'log/')
-		os.makedirs(_path, exist_ok=True)
 		return os.path.join(_path, Config._network_log_file)
 
 	# ZMQ
@@ -124,27 +158,46 @@ class Config:
 	def disable_default_zmq_interface(self):
 		self._default_zmq_interface_enabled = False
 		self._default_zmq_handlers_enabled= False
+		self._invalidate_zmq_descriptor()
 
 	def enable_default_zmq_interface(self, handlers=True):
 		self._default_zmq_interface_enabled = True
 		self._default_zmq_handlers_enabled = handlers
+		self._invalidate_zmq_descriptor()
 
 	def disable_default_zmq_handlers(self):
 		self._default_zmq_handlers_enabled = False
 
 	def upload_zmq_messages(self, descriptor_file):
-		with open(descriptor_file, 'r') as stream:
-			new_messages = yaml.safe_load(stream)
+		new_messages = self.load_yaml(descriptor_file)
 		self._zmq_messages = {**self._zmq_messages, **new_messages}
+		self._invalidate_zmq_descriptor()
 
 	def get_zmq_messages(self):
-		if self._default_zmq_interface_enabled:
-			default_messages = self.get_zmq_default_descriptor()
-			return {**self._zmq_messages, **default_messages}
-		return self._zmq_messages
+		if self._zmq_descriptor is None:
+			if self._default_zmq_interface_enabled:
+				default_messages = self.get_zmq_default_descriptor()
+				self._zmq_descriptor = {**self._zmq_messages, **default_messages}
+			else:
+				self._zmq_descriptor = self._zmq_messages
+		return self._zmq_descriptor
+
+	def get_zmq_validators(self):
+		"""Return the payload validators compiled from the current descriptor."""
+		if self._zmq_validators is None:
+			from ..network.interface.zmq.validator import compile_descriptor
+			self._zmq_validators = compile_descriptor(self.get_zmq_messages())
+		return self._zmq_validators
+
+	def _invalidate_zmq_descriptor(self):
+		self._zmq_descriptor = None
+		self._zmq_validators = None
 
 	@staticmethod
+	@functools.lru_cache(maxsize=None)
 	def get_zmq_default_descriptor():
+		import pkgutil
+		import yaml
 		data = pkgutil.get_data('rsimulator', "network/interface/zmq/descriptor.yaml")
 		return yaml.safe_load(data.decode("utf-8"))
 
@@ -6,6 +6,8 @@ class Config:
 
 	_sm_log_file = 'statemachine.log'
 
+	SCHEDULER_WORKERS = 1  # Threads running the loops of the state machines
+
 	def __new__(cls, *args, **kwargs):
 		"""
 		Singleton implementation for STateMachine Config.
@@ -20,8 +22,8 @@ class Config:
 		pass
 
 	def sm_log_path(self):
+		# The log directory is created by the file handler on the first record
 		_path = os.path.join(os.getcwd(), 'log/')
-		os.makedirs(_path, exist_ok=True)
 		return os.path.join(_path, self._sm_log_file)
 
 # Configuration Manager instance
@@ -15,6 +15,12 @@ def set_network_file(file):
 	network_config.network_file = file
 	network_config.set_network_data()
 
+def enable_yaml_cache(cache_dir=None):
+	network_config.enable_yaml_cache(cache_dir)
+
+def disable_yaml_cache():
+	network_config.disable_yaml_cache()
+
 def set_network_log_file_name(file_name):
 	network_config._network_log_file = file_name
 
@@ -0,0 +1,180 @@
+import json
+import time
+
+from ..utils import enums
+from .recorder import MAGIC, FRAME_HEADER, UNKNOWN_MESSAGE
+
+# Offline generation of serialized messages with NumPy (optional dependency).
+#
+# The default message is serialized once and tiled into a (count, size) uint8 array,
+# then every generated field is written for all the messages at once through a
+# structured view using the offsets of Message.layout() (see serialize-by-patch).
+#
+# fields = {
+#     'sequence':   {'counter': [0, 1]},           # start, step
+#     'speed':      {'ramp': [0, 100]},            # start, stop (included)
+#     'mode':       {'sweep': [1, 2, 3]},          # values repeated
+#     'position.x': {'uniform': [-10, 10]},        # seeded random: uniform, normal, randint, choice
+#     'status':     {'constant': 1},
+#     'level':      numpy_array,                   # count values
+# }
+
+_NUMPY_TYPES = {
+	'b': 'i1', 'B': 'u1', '?': 'b1',
+	'h': 'i2', 'H': 'u2',
+	'i': 'i4', 'I': 'u4', 'l': 'i4', 'L': 'u4',
+	'q': 'i8', 'Q': 'u8',
+	'e': 'f2', 'f': 'f4', 'd': 'f8',
+}
+
+
+def _numpy():
+	try:
+		import numpy
+	except ImportError as e:
+		raise ImportError('Batch generation requires numpy (pip install rsimulator[batch])') from e
+	return numpy
+
+
+def _field_values(np, path, spec, count, rng):
+	if not isinstance(spec, dict):
+		values = np.asarray(spec)
+		if values.ndim == 0:
+			return np.full(count, values)
+		if len(values) != count:
+			raise ValueError(f'{path}: {len(values)} values for {count} messages')
+		return values
+	if len(spec) != 1:
+		raise ValueError(f'{path}: a generator spec has a single key, got {list(spec)}')
+	(kind, params), = spec.items()
+	if kind == 'constant':
+		return np.full(count, params)
+	if kind == 'counter':
+		start, step = params if isinstance(params, (list, tuple)) else (params, 1)
+		return start + step * np.arange(count)
+	if kind == 'ramp':
+		return np.linspace(params[0], params[1], count)
+	if kind == 'sweep':
+		return np.resize(np.asarray(params), count)
+	if kind == 'uniform':
+		return rng.uniform(params[0], params[1], count)
+	if kind == 'normal':
+		return rng.normal(params[0], params[1], count)
+	if kind == 'randint':
+		return rng.integers(params[0], params[1], count, endpoint=True)
+	if kind == 'choice':
+		return rng.choice(np.asarray(params), count)
+	raise ValueError(f'{path}: unknown generator {kind!r}')
+
+
+class Batch:
+	"""Serialized messages of the same type, one per row of a uint8 array."""
+
+	def __init__(self, message_name, data):
+		self.message_name = message_name
+		self.data = data
+
+	def __len__(self):
+		return len(self.data)
+
+	def __getitem__(self, position):
+		return self.data[position].tobytes()
+
+	@property
+	def message_size(self):
+		return self.data.shape[1]
+
+	def tobytes(self):
+		"""All the messages back to back (e.g. for a stream socket)."""
+		return self.data.tobytes()
+
+	def save(self, path, node_name, rate=None):
+		"""
+		Write the batch as a capture, replayable with RNetwork.replay(path, speed=1.0).
+		:param node_name: Node sending the messages on replay
+		:param rate: Messages per second on replay (None for as fast as possible)
+		"""
+		np = _numpy()
+		count, size = self.data.shape
+		frame_size = FRAME_HEADER.size + size
+		frames = np.zeros((count, frame_size), dtype=np.uint8)
+		# Same fields as FRAME_HEADER: timestamp, length, node id, message id, direction
+		header = np.dtype(dict(
+			names=['timestamp', 'length', 'node', 'message', 'direction'],
+			formats=['<u8', '<u4', '<u2', '<u2', 'u1'],
+			offsets=[0, 8, 12, 14, 16],
+			itemsize=frame_size))
+		view = frames.view(header).reshape(count)
+		view['timestamp'] = np.arange(count, dtype=np.uint64) * np.uint64(int(1e9 / rate) if rate else 0)
+		view['length'] = size
+		view['node'] = 0
+		view['message'] = UNKNOWN_MESSAGE + 1
+		view['direction'] = enums.MessageDirectionType.OUT.value
+		frames[:, FRAME_HEADER.size:] = self.data
+		with open(path, 'wb') as stream:
+			stream.write(MAGIC)
+			frames.tofile(stream)
+		(len(MAGIC) + np.arange(count, dtype='<u8') * frame_size).tofile(f'{path}.idx')
+		meta = dict(version=1, frames=count, start_ns=0, nodes=[node_name], messages=[None, self.message_name])
+		with open(f'{path}.meta', 'w') as stream:
+			json.dump(meta, stream)
+
+	def send(self, network, node_name, rate=None):
+		"""
+		Send the messages from memory through a node.
+		:param rate: Messages per second (None for as fast as possible)
+		:return: Number of messages sent
+		"""
+		node_wrap = network.get_node_wrap(node_name)
+		start = time.perf_counter()
+		for position in range(len(self)):
+			if rate:
+				delay = start + position / rate - time.perf_counter()
+				if delay > 0:
+					time.sleep(delay)
+			node_wrap.send_buffer(self.data[position].tobytes())
+		return len(self)
+
+
+def generate(interface_pkg, message, count, fields=None, seed=None, default_data=None):
+	"""
+	Generate `count` serialized messages whose fields follow arrays or generator specs.
+	The message class must describe its fixed layout with layout(): {'path.to.leaf': (offset, struct format)}.
+	:param interface_pkg: Interface package of the message
+	:param message: Message name or class (e.g. from interface_pkg.message_map)
+	:param fields: {'path.to.leaf': array of count values, scalar or generator spec}
+	:param seed: Seed of the random generators
+	:param default_data: Data of the other fields (as in the default data YAML)
+	:return: Batch
+	"""
+	np = _numpy()
+	Message = getattr(interface_pkg, message) if isinstance(message, str) else message
+	if not hasattr(Message, 'layout'):
+		raise TypeError(f'{Message.__name__} has no layout(): its fields cannot be generated in bulk')
+	layout = Message.layout()
+	fields = fields or dict()
+	if unknown := [path for path in fields if path not in layout]:
+		raise KeyError(f'{Message.__name__} has no fixed field {", ".join(unknown)}')
+
+	template = np.frombuffer(Message.from_dict(default_data).serialize(), dtype=np.uint8)
+	data = np.tile(template, (count, 1))
+	if fields:
+		byte_order = '>' if interface_pkg.BYTE_ORDER.upper() == 'BIG' else '<'
+		formats = list()
+		for path in fields:
+			fmt = layout[path][1]
+			if fmt not in _NUMPY_TYPES:
+				raise ValueError(f'{path}: format {fmt!r} cannot be generated')
+			formats.append(byte_order + _NUMPY_TYPES[fmt])
+		view = data.view(np.dtype(dict(
+			names=list(fields),
+			formats=formats,
+			offsets=[layout[path][0] for path in fields],
+			itemsize=len(template)))).reshape(count)
+		rng = np.random.default_rng(seed)
+		for path, spec in fields.items():
+			values = _field_values(np, path, spec, count, rng)
+			if view.dtype[path].kind in 'iu' and values.dtype.kind == 'f':
+				values = np.rint(values)
+			view[path] = values
+	return Batch(Message.__name__, data)
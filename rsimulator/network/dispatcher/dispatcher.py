@@ -19,9 +19,14 @@ class Dispatcher(ABC):
 		:param message: The message to process
 		:return: The result from the handler
 		"""
+		self.record(message)
 		self.parent_node.logger.debug(f"Message received! Buffer: {message}")
 		return "success".encode('utf-8')
 
+	def record(self, buffer, message_name=None):
+		"""Record a received buffer if the network is recording (to be called by custom dispatchers too)."""
+		self.parent_node.record(enums.MessageDirectionType.IN, buffer, message_name)
+
 
 class SpecDispatcher(Dispatcher):
 	def __init__(self, parent_node=None):
@@ -34,24 +39,27 @@ class SpecDispatcher(Dispatcher):
 		:return: The result from the handler
 		"""
 		try:
-			message_obj = self.parent_node.deserialize(message, toDict=False)
+			message_obj = self.parent_node.deserialize(message, to_dict=False)
 			if message_obj is None:
 				raise BufferError(f'{self.parent_node.name} dispatcher received a null message')
 		except Exception as e:
 			self.logger.critical(f'Exception (dispatcher: dispatch): {e}')
+			return list()
 
-		message_dict = message_obj.toDict()
+		message_dict = message_obj.to_dict()
 		message_name = message_obj.__class__.__name__
+		self.record(message, message_name)
 
+		self.logger.debug(f"Message {message_name} received: {message_dict}")
+		self.logger.only_info(f"Message {message_name} received!")
 
-		self.logger.only_debug(f"Message {message_obj.__class__.__name__} received: {message_dict}")
-		self.logger.only_info(f"Message {message_obj.__class__.__name__} received!")
-
-		# 1. Updated message counter
-		getattr(self.parent_node, message_name).increment()
+		message_wrap = self.parent_node.get_message(message_name)
+		if message_wrap is not None:
+			# 1. Updated message counter
+			message_wrap.increment()
 
-		# 2. Save last message
-		getattr(self.parent_node, message_name).append(message_dict)
+			# 2. Save last message
+			message_wrap.append(message_dict)
 
 		# 3. Emit signal
 		return signal_instance.emit((self.parent_node.name, message_name), data=message_dict, logger=self.logger)
@@ -69,6 +77,7 @@ class ZMQDispatcher(Dispatcher):
 		:return: The result from the handler
 		"""
 		message = self.parent_node.deserialize(buffer, to_dict=False)
+		self.record(buffer, message.type)
 		self.logger.debug(f"Message {message.type} received. Payload: {message.payload}")
 
 		results_dict_list = signal_instance.emit((self.parent_node.name, message.type),
@@ -91,5 +100,7 @@ def get_dispatcher(protocol: enums.ProtocolType, node_name=None):
 		Dispatcher if protocol is enums.ProtocolType.UDP else \
 		SpecDispatcher if protocol is enums.ProtocolType.SPEC_TCP else \
 		SpecDispatcher if protocol is enums.ProtocolType.SPEC_UDP else \
+		Dispatcher if protocol is enums.ProtocolType.INPROC else \
+		SpecDispatcher if protocol is enums.ProtocolType.SPEC_INPROC else \
 		ZMQDispatcher if 'zmq' in protocol.name.lower() else None
 
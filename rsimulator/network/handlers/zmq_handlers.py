@@ -1,6 +1,4 @@
 import functools
-import time
-import asyncio
 
 from ...utils import error
 from ...conf.network import network_config
@@ -15,26 +13,23 @@ from ...utils.rsignal import signal_instance
 
 
 
-descriptor = network_config.get_zmq_default_descriptor()
-
 def check_payload(message_type, payload, logger):
 	# Go in error if required key not present
-	for required_key in descriptor[message_type]['payload']['required']:
-		if required_key not in payload:
-			_error = f'{required_key} not included in {message_type} payload'
-			logger.error(_error)
-			return error_reply('RequiredKeyError', _error)
 	# Set default value if optional key not present
-	for optional_key, optional_value in descriptor[message_type]['payload']['optional'].items():
-		payload.setdefault(optional_key, optional_value)
+	missing_key = network_config.get_zmq_validators()[message_type].validate(payload)
+	if missing_key is not None:
+		_error = f'{missing_key} not included in {message_type} payload'
+		logger.error(_error)
+		return error_reply('RequiredKeyError', _error)
 
 def exception_handler(func):
+	message_name = func.__name__.replace('handle_', '')
+
 	@functools.wraps(func)
 	def wrapper(*args, **kwargs):
 		payload = kwargs.get("payload") if 'payload' in kwargs else args[0]
 		logger = kwargs.get("logger") or args[1]
-		message_name = func.__name__.replace('handle_', '')
-		if _check := check_payload(message_name, payload, logger) is not None:
+		if (_check := check_payload(message_name, payload, logger)) is not None:
 			return _check
 		try:
 			logger.debug(f'Handling {message_name}: {payload}')
@@ -149,12 +144,10 @@ def handle_ResetDataRequest(payload, logger):
 
 @exception_handler
 def handle_ConnectionRequest(payload, logger):
-	connected = False
-	for _ in range(60):
+	if payload['wait']:
+		connected = get_network().wait_for_connections(exclude_zmq=True, timeout=payload['timeout'])
+	else:
 		connected = get_network().get_connection_result()
-		if connected or not payload['wait']:
-			break
-		time.sleep(1)
 	return reply('ConnectionReply', connected=connected)
 
 @exception_handler
@@ -0,0 +1,82 @@
+import random
+
+# Transport impairments applied to the buffers sent by a node, before its socket.
+#
+# node:
+#   impairment: {drop: 0.01, delay: 0.05, jitter: 0.01, seed: 7}   # every message of the node
+#   messages:
+#     Status:
+#       direction: out
+#       impairment: {duplicate: 0.1, corrupt: 0.001}               # merged over the node impairment
+#
+# drop       probability of losing a buffer
+# delay      seconds added to every buffer
+# jitter     +/- seconds added to the delay (uniform), buffers may be reordered by it
+# duplicate  probability of sending a buffer twice
+# reorder    probability of holding a buffer back for reorder_gap seconds, so that the next ones overtake it
+# corrupt    probability of flipping a random bit of corrupt_bytes random bytes
+# seed       seed of the random generator (None: not reproducible)
+
+
+class Impairment:
+	"""Decide the fate of each buffer: lost, or sent after a delay, possibly twice or corrupted."""
+
+	def __init__(self, drop=0.0, delay=0.0, jitter=0.0, duplicate=0.0, reorder=0.0, reorder_gap=0.01,
+				 corrupt=0.0, corrupt_bytes=1, seed=None):
+		for name, probability in dict(drop=drop, duplicate=duplicate, reorder=reorder, corrupt=corrupt).items():
+			if not 0.0 <= probability <= 1.0:
+				raise ValueError(f'Impairment {name} is a probability, got {probability}')
+		if delay < 0 or jitter < 0 or reorder_gap < 0:
+			raise ValueError('Impairment delay, jitter and reorder_gap cannot be negative')
+		self.drop = drop
+		self.delay = delay
+		self.jitter = jitter
+		self.duplicate = duplicate
+		self.reorder = reorder
+		self.reorder_gap = reorder_gap
+		self.corrupt = corrupt
+		self.corrupt_bytes = corrupt_bytes
+		self.seed = seed
+		self._random = random.Random(seed)
+		self.reset_stats()
+
+	def reset_stats(self):
+		self.stats = dict(buffers=0, dropped=0, delayed=0, duplicated=0, reordered=0, corrupted=0)
+
+	def apply(self, buffer):
+		"""Return the [(delay in seconds, buffer)] to send instead of the buffer (empty if dropped)."""
+		stats = self.stats
+		stats['buffers'] += 1
+		_random = self._random.random
+		if self.drop and _random() < self.drop:
+			stats['dropped'] += 1
+			return []
+		copies = 2 if self.duplicate and _random() < self.duplicate else 1
+		if copies == 2:
+			stats['duplicated'] += 1
+		sends = list()
+		for _ in range(copies):
+			delay = self.delay
+			if self.jitter:
+				delay = max(delay + self._random.uniform(-self.jitter, self.jitter), 0.0)
+			if self.reorder and _random() < self.reorder:
+				stats['reordered'] += 1
+				delay += self.reorder_gap
+			if delay:
+				stats['delayed'] += 1
+			sends.append((delay, self._corrupted(buffer) if self.corrupt and _random() < self.corrupt else buffer))
+		return sends
+
+	def _corrupted(self, buffer):
+		if not buffer:
+			return buffer
+		self.stats['corrupted'] += 1
+		data = bytearray(buffer)
+		for _ in range(self.corrupt_bytes):
+			data[self._random.randrange(len(data))] ^= 1 << self._random.randrange(8)
+		return bytes(data)
+
+	def params(self):
+		return dict(drop=self.drop, delay=self.delay, jitter=self.jitter, duplicate=self.duplicate,
+					reorder=self.reorder, reorder_gap=self.reorder_gap, corrupt=self.corrupt,
+					corrupt_bytes=self.corrupt_bytes, seed=self.seed)
@@ -6,7 +6,7 @@ from ....conf.network import network_config as config
 
 
 class Message:
-    logger = rlogging.RLogger("ZmqInterface", log_level=logging.INFO, file_name=config.network_log_path())
+    logger = rlogging.RLogger("ZmqInterface", log_level=logging.INFO, file_name=config.network_log_path)
 
     def __init__(self, message_type, payload=None):
         """
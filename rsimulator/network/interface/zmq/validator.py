@@ -0,0 +1,54 @@
+from copy import deepcopy
+
+
+class PayloadValidator:
+	"""
+	Compiled form of a descriptor entry.
+	Holds the required keys and the default payload template of a message type.
+	"""
+	__slots__ = ('message_type', 'required', 'defaults', '_mutable_keys')
+
+	def __init__(self, message_type, payload_descriptor=None):
+		self.message_type = message_type
+		if isinstance(payload_descriptor, dict):
+			required = payload_descriptor.get('required') or list()
+			optional = payload_descriptor.get('optional') or dict()
+		else:
+			# Replies only list their payload keys
+			required = payload_descriptor or list()
+			optional = dict()
+		self.required = tuple(required)
+		self.defaults = dict(optional)
+		# Mutable defaults are copied so that requests never share them
+		self._mutable_keys = frozenset(key for key, value in self.defaults.items()
+			if isinstance(value, (dict, list, set)))
+
+	def validate(self, payload):
+		"""
+		Check the required keys and fill in the missing optional keys in place.
+		:param payload: The payload to validate
+		:return: The first missing required key, None if the payload is valid
+		"""
+		for key in self.required:
+			if key not in payload:
+				return key
+		if self.defaults:
+			for key in self.defaults.keys() - payload.keys():
+				value = self.defaults[key]
+				payload[key] = deepcopy(value) if key in self._mutable_keys else value
+		return None
+
+	def default_payload(self):
+		"""Return a new payload filled with the default values."""
+		return {key: deepcopy(value) if key in self._mutable_keys else value
+			for key, value in self.defaults.items()}
+
+
+def compile_descriptor(descriptor):
+	"""
+	Compile a ZMQ descriptor into a validator per message type.
+	:param descriptor: The parsed descriptor ({message_type: {'payload': ...}})
+	:return: Dict {message_type: PayloadValidator}
+	"""
+	return {message_type: PayloadValidator(message_type, (structure or dict()).get('payload'))
+		for message_type, structure in descriptor.items()}
@@ -0,0 +1,41 @@
+import threading
+
+# Event loop shared by the nodes of an asynchronous network.
+# It runs in a dedicated thread so that the network API stays synchronous.
+
+_loop = None
+_thread = None
+_lock = threading.Lock()
+
+
+def get_event_loop():
+	"""Return the network event loop, started on first use."""
+	global _loop, _thread
+	with _lock:
+		if _loop is None:
+			import asyncio
+			_loop = asyncio.new_event_loop()
+			_thread = threading.Thread(target=_loop.run_forever, name='network_event_loop', daemon=True)
+			_thread.start()
+	return _loop
+
+
+def run_coroutine(coroutine):
+	"""
+	Schedule a coroutine on the network event loop from any thread.
+	:return: concurrent.futures.Future of the coroutine result
+	"""
+	import asyncio
+	return asyncio.run_coroutine_threadsafe(coroutine, get_event_loop())
+
+
+def stop_event_loop():
+	"""Stop the network event loop and wait for its thread."""
+	global _loop, _thread
+	with _lock:
+		if _loop is None:
+			return
+		_loop.call_soon_threadsafe(_loop.stop)
+		_thread.join()
+		_loop.close()
+		_loop, _thread = None, None
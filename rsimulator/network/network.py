@@ -1,15 +1,17 @@
 import logging
 import threading
-import time
 import json
-import asyncio
 
 from ..utils import enums
 from ..utils import error
 from ..utils import rlogging
+from ..utils import rclock
 from ..conf.network import network_config as config
 
 
+from ..utils.rsignal import signal_instance
+from .loop import stop_event_loop
+from .sharding import NodeProxy, start_workers, stop_workers
 from .dispatcher import get_dispatcher
 from .wrappers import get_node_wrapper
 from .interface import get_interface_pkg
@@ -22,8 +24,15 @@ class RNetwork:
 	_node_ref = dict()      # Associate the node_name to the message_name(s)
 	_running = False
 	_tasks = list()
+	_recorder = None
+	_recording_workers = list()  # Workers recording their sharded nodes
+	_worker_groups = dict()  # Associate the worker name to its node_name(s)
+	_workers = list()
+	_connection_lock = threading.Lock()
+	# Set when every node is connected, keyed by the exclude_zmq flag
+	_connection_events = {True: threading.Event(), False: threading.Event()}
 
-	logger = rlogging.RLogger("RNetwork", log_level=logging.INFO, file_name=config.network_log_path())
+	logger = rlogging.RLogger("RNetwork", log_level=logging.INFO, file_name=config.network_log_path)
 
 	def __new__(cls, *args, **kwargs):
 		"""
@@ -50,15 +59,21 @@ class RNetwork:
 			role = enums.NodeRoleType[data.get('role', 'unknown').upper()]
 			host = data.get('host')
 			port = data.get('port')
+			path = data.get('path')  # Unix domain socket, in place of host and port
 			log_level = data.get('log_level', logging.INFO)
+			backoff = data.get('backoff')
+			reconnect = data.get('reconnect')
+			worker = data.get('worker')
+			impairment = data.get('impairment')
+			shaping = data.get('shaping')
 			messages = data.get('messages', dict())
 			if 'zmq' in protocol.name.lower():
 				messages = config.get_zmq_messages()
 
-			if None in (protocol, role, host, port):
+			if None in (protocol, role) or path is None and None in (host, port):
 				raise EnvironmentError(
 					f'Definition error. protocol: {protocol.__repr__}, '
-					f'role:{role.__repr__}, host:{host}, port:{port}')
+					f'role:{role.__repr__}, host:{host}, port:{port}, path:{path}')
 
 			Wrapper = get_node_wrapper(protocol)
 			Dispatcher = get_dispatcher(protocol, node_name)
@@ -76,17 +91,32 @@ class RNetwork:
 				protocol=protocol,
 				host=host,
 				port=port,
+				path=path,
 				interface_pkg=interface_pkg,
 				dispatcher=Dispatcher,
 				default_data=default_data,
 				glitch_data=glitch_data,
 				messages=messages,
-				log_level=log_level
+				log_level=log_level,
+				backoff=backoff,
+				reconnect=reconnect,
+				impairment=impairment,
+				shaping=shaping
 			))
 
+			if worker is not None:
+				self._worker_groups.setdefault(str(worker), list()).append(node_name)
+
+			# Nodes without messages are started too
+			self._node_ref.setdefault(node_name, list())
 			for message_name in messages.keys():
 				self.add_ref(message_name, node_name)
 
+			signal_instance.connect(f'{node_name}_connected', self._update_connection_events)
+			signal_instance.connect(f'{node_name}_disconnected', self._update_connection_events)
+
+		self._update_connection_events()
+
 	def add_ref(self, message_name, node_name):
 		# from message name to node name
 		self._messages_ref.setdefault(message_name, list())
@@ -96,16 +126,128 @@ class RNetwork:
 		self._node_ref[node_name].append(message_name)
 
 	def start(self):
+		# Starting a node does not block: synchronous nodes run in their own thread,
+		# asynchronous nodes as tasks of the network event loop.
+		# The network_ready signal is emitted once every node is connected.
 		self.logger.info(f'Starting network activities...')
+		if self._worker_groups:
+			# Workers are forked before the local nodes start their threads
+			self._workers = start_workers(self, self._worker_groups)
 		for node_name in self._node_ref.keys():
 			self.get_node_wrap(node_name).running = True
 
 	def stop(self):
 		self.logger.info(f'Stopping network activities...')
+		self.stop_recording()
 		for node_name in self._node_ref.keys():
-			if self.get_node_wrap(node_name).running:
-				self.get_node_wrap(node_name).running = False
+			node_wrap = self.get_node_wrap(node_name)
+			if node_wrap.running and not isinstance(node_wrap, NodeProxy):
+				node_wrap.running = False
 				self.logger.info(f'{node_name} status: CLOSED')
+		if self._workers:
+			workers, self._workers = self._workers, list()
+			stop_workers(self, workers)
+		if config.asynchronous_network:
+			stop_event_loop()
+
+	# Traffic Recording Support
+
+	def start_recording(self, path, nodes=None):
+		"""
+		Record the buffers sent and received by the nodes in a memory mapped capture.
+		The nodes of a worker are recorded by the worker, in the capture '{path}.{worker name}'.
+		:param path: Capture file (the index and the name tables are written next to it)
+		:param nodes: Names of the nodes to record (None for all)
+		:return: The Recorder of the nodes of this process
+		"""
+		from .recorder import Recorder
+		if self._recorder is not None or self._recording_workers:
+			self.stop_recording()
+		local_nodes, worker_nodes = list(), dict()
+		for node_name in nodes or self._node_ref.keys():
+			node_wrap = self.get_node_wrap(node_name)
+			if isinstance(node_wrap, NodeProxy):
+				worker_nodes.setdefault(node_wrap.worker, list()).append(node_name)
+			else:
+				local_nodes.append(node_name)
+		self._recorder = Recorder(path)
+		for node_name in local_nodes:
+			self.get_node_wrap(node_name).recorder = self._recorder
+		for worker, node_names in worker_nodes.items():
+			worker.call(None, '_start_worker_recording', f'{path}.{worker.name}', node_names)
+			self._recording_workers.append(worker)
+			self.logger.info(f'Worker {worker.name} recording {", ".join(node_names)} to {path}.{worker.name}')
+		self.logger.info(f'Recording network traffic to {path}')
+		return self._recorder
+
+	def _start_worker_recording(self, path, nodes):
+		# Called in a worker: the Recorder cannot be returned to the main process
+		self.start_recording(path, nodes)
+
+	def stop_recording(self):
+		"""Stop the recording and close the captures. Return the number of recorded frames."""
+		frames = 0
+		workers, self._recording_workers = self._recording_workers, list()
+		for worker in workers:
+			frames += worker.call(None, 'stop_recording')
+		if self._recorder is None:
+			return frames
+		for node_name in self._node_ref.keys():
+			node_wrap = self.get_node_wrap(node_name)
+			if not isinstance(node_wrap, NodeProxy):
+				node_wrap.recorder = None
+		recorder, self._recorder = self._recorder, None
+		recorder.close()
+		self.logger.info(f'Recording stopped: {recorder.frames} frames saved to {recorder.path}')
+		return frames + recorder.frames
+
+	def replay(self, path, speed=1.0, nodes=None):
+		"""
+		Send again the buffers sent by the nodes in a capture.
+		:param speed: 1.0 for the recorded timing, N for N times faster, None for as fast as possible
+		:param nodes: Names of the nodes to replay (None for all)
+		:return: Number of frames sent
+		"""
+		from .recorder import Replayer
+		with Replayer(path) as replayer:
+			sent = replayer.replay(self, speed=speed, nodes=nodes)
+		self.logger.info(f'Replayed {sent} frames from {path}')
+		return sent
+
+	def startup_report(self):
+		"""Return {node_name: seconds from start to first connection} (None if not connected)."""
+		return {node_name: self.get_node_wrap(node_name).time_to_connected for node_name in self._node_ref}
+
+	# Impairment Support
+
+	def set_impairment(self, node_name, message_name=None, **params):
+		"""
+		Impair the buffers sent by a node (drop, delay, jitter, duplicate, reorder, corrupt).
+		:param message_name: Impair only this message (None for every message of the node)
+		"""
+		self.get_node_wrap(node_name).set_impairment(message_name, **params)
+
+	def clear_impairment(self, node_name, message_name=None):
+		self.get_node_wrap(node_name).clear_impairment(message_name)
+
+	def get_impairment_stats(self, node_name):
+		return self.get_node_wrap(node_name).get_impairment_stats()
+
+	# Shaping Support
+
+	def set_shaping(self, node_name, message_name=None, **params):
+		"""
+		Cap the rate of the buffers sent by a node with token buckets.
+		:param message_name: Shape only this message, on top of the node shaping (None for the node)
+		:param params: bytes_rate, bytes_burst, messages_rate, messages_burst
+		"""
+		self.get_node_wrap(node_name).set_shaping(message_name, **params)
+
+	def clear_shaping(self, node_name, message_name=None):
+		self.get_node_wrap(node_name).clear_shaping(message_name)
+
+	def get_shaping_stats(self, node_name):
+		return self.get_node_wrap(node_name).get_shaping_stats()
 
 	# Send Message Support
 
@@ -150,17 +292,17 @@ class RNetwork:
 		if isinstance(node_name := node_name or self.get_node_name_from_message_name(message_name), error.ErrorType):
 			return node_name
 		if not path_list:
+			return self.get_node_wrap(node_name).get_message_data(
+				message_name=message_name,
+				to_dict=to_dict,
+				glitch=glitch)
+		else:
 			return self.get_node_wrap(node_name).get_data(
 				message_name=message_name,
-				path=path_list,
+				path_list=path_list,
 				glitch=glitch,
 				to_dict=to_dict,
 				copy=copy)
-		else:
-			return self.get_node_wrap(node_name).get_message_data(
-				message_name=message_name,
-				to_dict=True,
-				glitch=glitch)
 
 	def reset_data(self, node_name, messages=None):
 		if not messages:
@@ -172,7 +314,7 @@ class RNetwork:
 				return self.get_node_wrap(node_name).reset_data(
 					message_name=message_name)
 
-	def get_connection_result(self, exclude_zmq=True):
+	def _update_connection_events(self, **kwargs):
 		# A TCP client node is considered connected if is connected to a server
 		# A TCP server node is considered connected if at least one client is connected
 		# A ZMQ client node is considered connected if is connected to a server
@@ -180,11 +322,39 @@ class RNetwork:
 		# A UDP client node is considered connected on ZMQ_CONNECTION_REPLY reception
 		# A UDP server node is considered connected on start
 		# A RNetwork is considered connected if each node is connected
-		for node_name in self._node_ref:
-			if exclude_zmq and 'zmq' in node_name.lower():
-				continue
-			if not self.get_node_wrap(node_name).connected:
-				return False
+		with self._connection_lock:
+			was_ready = self._connection_events[False].is_set()
+			for exclude_zmq, event in self._connection_events.items():
+				connected = all(self.get_node_wrap(node_name).connected for node_name in self._node_ref
+					if not (exclude_zmq and 'zmq' in node_name.lower()))
+				if connected:
+					event.set()
+				else:
+					event.clear()
+			ready = not was_ready and self._connection_events[False].is_set()
+		if ready and self._node_ref:
+			report = self.startup_report()
+			self.logger.info(f'Network ready. Time to connected: ' + ', '.join(
+				f'{node_name}={elapsed:.3f}s' for node_name, elapsed in report.items() if elapsed is not None))
+			signal_instance.emit('network_ready', report=report, logger=self.logger)
+
+	def get_connection_result(self, exclude_zmq=True):
+		return self._connection_events[exclude_zmq].is_set()
+
+	def wait_for_connections(self, exclude_zmq=False, timeout=None):
+		"""
+		Block until every node of the network is connected.
+		:param exclude_zmq: True to ignore the ZMQ nodes
+		:param timeout: Maximum time to wait in seconds (None waits forever)
+		:return: True if the network is connected, False on timeout
+		"""
+		if self.get_connection_result(exclude_zmq=exclude_zmq):
+			return True
+		self.logger.info("simulator waiting for connections...")
+		if not self._connection_events[exclude_zmq].wait(timeout):
+			self.logger.warning(f"Connections not completed within {timeout}s")
+			return False
+		self.logger.info("Connections Done!")
 		return True
 
 	def get_node_name_from_message_name(self, message_name):
@@ -213,18 +383,25 @@ class RNetwork:
 	def _send_periodically(self, message_name, node_name, interval):
 		"""Internal method to send the message at regular intervals."""
 		while self.is_periodic_active(message_name=message_name, node_name=node_name):
-			self.send_message(message_name, node_name)
-			time.sleep(interval)
+			try:
+				self.send_message(message_name, node_name)
+			except Exception as e:
+				# A failed send must not end the sender while the message stays active
+				self.logger.error(f"Periodic message '{message_name}' not sent", exc=e)
+			rclock.sleep(interval)
 
 	def start_periodic(self, message_name, node_name=None, interval=None):
 		"""Start sending the periodic message."""
 		# If the message is already being sent, then do nothing
 		if not node_name:
 			node_name = self.get_node_name_from_message_name(message_name)
+		node_wrap = getattr(self, node_name)
+		if isinstance(node_wrap, NodeProxy):
+			# The periodic sender runs in the worker of the node
+			return node_wrap.worker.call(None, 'start_periodic', message_name, node_name, interval)
 		if self.is_periodic_active(message_name=message_name, node_name=node_name):
 			self.logger.error(f"Message '{message_name}' is already sent periodically.")
 			return
-		node_wrap = getattr(self, node_name)
 		if not interval:
 			interval = node_wrap.get_message(message_name).interval
 		self.get_node_wrap(node_name).activate_periodic_message(message_name)
@@ -238,6 +415,9 @@ class RNetwork:
 		"""Stop sending the periodic message."""
 		if not node_name:
 			node_name = self.get_node_name_from_message_name(message_name)
+		node_wrap = self.get_node_wrap(node_name)
+		if isinstance(node_wrap, NodeProxy):
+			return node_wrap.worker.call(None, 'stop_periodic', message_name, node_name)
 		if self.is_periodic_active(message_name=message_name, node_name=node_name):
 			self.get_node_wrap(node_name).deactivate_periodic_message(message_name)
 			self.logger.info(f"Stopping periodic message: {message_name}")
@@ -264,19 +444,13 @@ def get_network() -> RNetwork:
 		create_network()
 	return networks[0]
 
-def wait_for_connections(exclude_zmq=False):
-	network = get_network()
-	while True:
-		network.logger.info("simulator waiting for connections...")
-		if network.get_connection_result(exclude_zmq=exclude_zmq):
-			network.logger.info("Connections Done!")
-			break
-		time.sleep(1)
-
-def wait_for_connection(node_name):
+def wait_for_connections(exclude_zmq=False, timeout=None):
+	return get_network().wait_for_connections(exclude_zmq=exclude_zmq, timeout=timeout)
+
+def wait_for_connection(node_name, timeout=None):
 	network = get_network()
-	while True:
-		if getattr(network, node_name).connected:
-			network.logger.info(f"Connection with {node_name} Done!")
-			break
-		time.sleep(1)
+	if not network.get_node_wrap(node_name).wait_connected(timeout):
+		network.logger.warning(f"Connection with {node_name} not completed within {timeout}s")
+		return False
+	network.logger.info(f"Connection with {node_name} Done!")
+	return True
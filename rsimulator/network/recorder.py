@@ -0,0 +1,221 @@
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+
+from ..utils import enums
+
+# Capture format
+#
+# <path>        magic + frames, each frame is FRAME_HEADER followed by the raw buffer
+# <path>.idx    offset (u64) of each frame in <path>
+# <path>.meta   JSON with the node and message name tables
+#
+# Both binary files are memory mapped and grow by doubling, so recording a frame
+# costs two pack_into and one slice assignment under a lock.
+
+MAGIC = b'RSIMREC1'
+# timestamp (monotonic ns), length, node id, message id, direction
+FRAME_HEADER = struct.Struct('<QIHHB')
+INDEX_ENTRY = struct.Struct('<Q')
+INITIAL_SIZE = 16 * 1024 * 1024
+UNKNOWN_MESSAGE = 0  # Message id of the buffers recorded without a message name
+
+IN = enums.MessageDirectionType.IN
+OUT = enums.MessageDirectionType.OUT
+
+
+def _mapped_file(path, size):
+	file = open(path, 'w+b')
+	file.truncate(size)
+	return file, mmap.mmap(file.fileno(), size)
+
+
+class Frame:
+	__slots__ = 'timestamp_ns', 'node', 'direction', 'message', 'buffer'
+
+	def __init__(self, timestamp_ns, node, direction, message, buffer):
+		self.timestamp_ns = timestamp_ns
+		self.node = node
+		self.direction = direction
+		self.message = message
+		self.buffer = buffer  # memoryview on the capture file
+
+	def __repr__(self):
+		return (f'Frame({self.timestamp_ns}, {self.node}, {self.direction.name}, '
+				f'{self.message}, {len(self.buffer)} bytes)')
+
+
+class Recorder:
+	"""Append-only recorder of the buffers sent and received by the network nodes."""
+
+	def __init__(self, path, initial_size=INITIAL_SIZE):
+		self.path = path
+		self.frames = 0
+		self.start_ns = time.monotonic_ns()
+		self._lock = threading.Lock()
+		self._nodes = dict()
+		self._messages = {None: UNKNOWN_MESSAGE}
+		self._data_file, self._data = _mapped_file(path, max(initial_size, len(MAGIC)))
+		self._index_file, self._index = _mapped_file(f'{path}.idx', max(initial_size // 64, INDEX_ENTRY.size))
+		self._data[:len(MAGIC)] = MAGIC
+		self._offset = len(MAGIC)
+		self.closed = False
+
+	def _node_id(self, node_name):
+		if (node_id := self._nodes.get(node_name)) is None:
+			node_id = self._nodes[node_name] = len(self._nodes)
+		return node_id
+
+	def _message_id(self, message_name):
+		if (message_id := self._messages.get(message_name)) is None:
+			message_id = self._messages[message_name] = len(self._messages)
+		return message_id
+
+	def record(self, node_name, direction, buffer, message_name=None):
+		"""
+		Append a frame to the capture.
+		:param direction: enums.MessageDirectionType.IN or OUT
+		:param buffer: Raw bytes (any bytes-like object)
+		"""
+		timestamp = time.monotonic_ns()
+		if isinstance(buffer, str):
+			buffer = buffer.encode('utf-8')
+		length = len(buffer)
+		with self._lock:
+			if self.closed:
+				return
+			offset = self._offset
+			end = offset + FRAME_HEADER.size + length
+			if end > len(self._data):
+				self._data.resize(max(2 * len(self._data), end))
+			index_end = (self.frames + 1) * INDEX_ENTRY.size
+			if index_end > len(self._index):
+				self._index.resize(2 * len(self._index))
+			FRAME_HEADER.pack_into(self._data, offset, timestamp, length,
+				self._node_id(node_name), self._message_id(message_name), direction.value)
+			self._data[offset + FRAME_HEADER.size:end] = buffer
+			INDEX_ENTRY.pack_into(self._index, index_end - INDEX_ENTRY.size, offset)
+			self._offset = end
+			self.frames += 1
+
+	def close(self):
+		"""Trim the files to the recorded size and write the name tables."""
+		with self._lock:
+			if self.closed:
+				return
+			self.closed = True
+			for mapped, file, size in ((self._data, self._data_file, self._offset),
+									   (self._index, self._index_file, self.frames * INDEX_ENTRY.size)):
+				mapped.flush()
+				mapped.close()
+				file.truncate(size)
+				file.close()
+			meta = dict(
+				version=1,
+				frames=self.frames,
+				start_ns=self.start_ns,
+				nodes=sorted(self._nodes, key=self._nodes.get),
+				messages=sorted(self._messages, key=self._messages.get),
+			)
+			with open(f'{self.path}.meta', 'w') as stream:
+				json.dump(meta, stream)
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *exc):
+		self.close()
+
+
+class Replayer:
+	"""
+	Reader of a capture made by Recorder.
+	Frames are memoryviews on the mapped file: nothing is copied until a socket sends them.
+	"""
+
+	def __init__(self, path):
+		self.path = path
+		with open(f'{path}.meta', 'r') as stream:
+			meta = json.load(stream)
+		self.nodes = meta['nodes']
+		self.messages = meta['messages']
+		self._data, self._data_view = self._map(path)
+		self._index, _ = self._map(f'{path}.idx')
+		if bytes(self._data_view[:len(MAGIC)]) != MAGIC:
+			raise ValueError(f'{path} is not an rsimulator capture')
+		self._frames = len(self._index) // INDEX_ENTRY.size if self._index is not None else 0
+
+	@staticmethod
+	def _map(path):
+		with open(path, 'rb') as file:
+			if not os.fstat(file.fileno()).st_size:
+				return None, None
+			mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+		return mapped, memoryview(mapped)
+
+	def __len__(self):
+		return self._frames
+
+	def frame(self, position):
+		offset, = INDEX_ENTRY.unpack_from(self._index, position * INDEX_ENTRY.size)
+		timestamp, length, node, message, direction = FRAME_HEADER.unpack_from(self._data, offset)
+		start = offset + FRAME_HEADER.size
+		return Frame(timestamp, self.nodes[node], enums.MessageDirectionType(direction),
+			self.messages[message], self._data_view[start:start + length])
+
+	def frames(self, nodes=None, direction=None):
+		"""
+		Yield the recorded frames in order.
+		:param nodes: Node names to keep (None for all)
+		:param direction: enums.MessageDirectionType to keep (None for all)
+		"""
+		for position in range(len(self)):
+			frame = self.frame(position)
+			if nodes is not None and frame.node not in nodes:
+				continue
+			if direction is not None and frame.direction is not direction:
+				continue
+			yield frame
+
+	def replay(self, network, speed=1.0, nodes=None, direction=OUT):
+		"""
+		Send the recorded frames again through the node send path.
+		:param network: RNetwork whose nodes send the frames
+		:param speed: 1.0 for the recorded timing, N for N times faster, None for as fast as possible
+		:return: Number of frames sent
+		"""
+		sent = 0
+		start_ns = first_ns = None
+		for frame in self.frames(nodes, direction):
+			if speed:
+				if first_ns is None:
+					first_ns, start_ns = frame.timestamp_ns, time.monotonic_ns()
+				delay = (start_ns + (frame.timestamp_ns - first_ns) / speed - time.monotonic_ns()) / 1e9
+				if delay > 0:
+					time.sleep(delay)
+			network.get_node_wrap(frame.node).send_buffer(frame.buffer)
+			sent += 1
+		return sent
+
+	def close(self):
+		self._frames = 0
+		self._data_view.release()
+		for mapped in (self._data, self._index):
+			if mapped is None:
+				continue
+			try:
+				mapped.close()
+			except BufferError:
+				# Frames still referenced (e.g. waiting in a node queue):
+				# the map is released with the last of them
+				pass
+		self._data_view = None
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *exc):
+		self.close()
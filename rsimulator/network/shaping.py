@@ -0,0 +1,113 @@
+import threading
+import time
+
+from ..conf.network import network_config as config
+
+# Token-bucket shaping of the buffers sent by a node, applied by its sender.
+#
+# node:
+#   shaping: {bytes_rate: 8000, bytes_burst: 1500, messages_rate: 1000}   # e.g. a 64 kbit/s link
+#   messages:
+#     Status:
+#       direction: out
+#       shaping: {messages_rate: 50, messages_burst: 5}                   # on top of the node shaping
+#
+# Rates are per second, bursts default to SHAPING_BURST_TIME seconds of rate (at least one unit).
+# A bucket can go into debt: the sender waits until the debt is paid back, but waits shorter than
+# SHAPING_MIN_SLEEP are carried over to the next buffers, so at high rates the sender sleeps once
+# every few buffers instead of spinning, and the average rate stays exact.
+
+
+class TokenBucket:
+	__slots__ = 'rate', 'burst', 'tokens', 'last'
+
+	def __init__(self, rate, burst=None):
+		if rate <= 0:
+			raise ValueError(f'Shaping rate must be positive, got {rate}')
+		self.rate = rate
+		self.burst = burst if burst is not None else max(rate * config.SHAPING_BURST_TIME, 1)
+		self.tokens = self.burst
+		self.last = time.monotonic()
+
+	def reserve(self, amount, now):
+		"""Take amount tokens, return the seconds until the bucket is out of debt."""
+		self.tokens = min(self.burst, self.tokens + (now - self.last) * self.rate) - amount
+		self.last = now
+		return -self.tokens / self.rate if self.tokens < 0 else 0.0
+
+
+def _buckets(bytes_rate=None, bytes_burst=None, messages_rate=None, messages_burst=None):
+	"""Return (bytes bucket, messages bucket), None where no rate is given."""
+	return (TokenBucket(bytes_rate, bytes_burst) if bytes_rate else None,
+			TokenBucket(messages_rate, messages_burst) if messages_rate else None)
+
+
+def _new_stats():
+	return dict(buffers=0, bytes=0, delayed=0, waited=0.0, max_wait=0.0)
+
+
+class Shaper:
+	"""Token buckets of a node and of its messages. Thread safe (servers have a sender per client)."""
+
+	def __init__(self, params=None, messages=None, name_of=None):
+		"""
+		:param params: Node shaping (bytes_rate, bytes_burst, messages_rate, messages_burst)
+		:param messages: {message_name: shaping of the message}
+		:param name_of: Function returning the message name of a buffer (needed by the message shaping)
+		"""
+		self.params = params or dict()
+		self.message_params = messages or dict()
+		self._node = _buckets(**self.params)
+		self._messages = {name: _buckets(**params) for name, params in self.message_params.items()}
+		self._name_of = name_of if self._messages else None
+		self._lock = threading.Lock()
+		self.reset_stats()
+
+	def reset_stats(self):
+		self.started = time.monotonic()
+		self.stats = {None: _new_stats(), **{name: _new_stats() for name in self._messages}}
+
+	def reserve(self, buffer):
+		"""Take the tokens of a buffer about to be sent. Return the seconds to wait before sending it."""
+		size = len(buffer)
+		name = None
+		if self._name_of is not None:
+			try:
+				name = self._name_of(buffer)
+			except Exception:
+				name = None
+		with self._lock:
+			now = time.monotonic()
+			bytes_bucket, messages_bucket = self._node
+			wait = 0.0
+			if bytes_bucket is not None:
+				wait = bytes_bucket.reserve(size, now)
+			if messages_bucket is not None:
+				wait = max(wait, messages_bucket.reserve(1, now))
+			stats = self.stats[None]
+			self._count(stats, size)
+			if name in self._messages:
+				bytes_bucket, messages_bucket = self._messages[name]
+				if bytes_bucket is not None:
+					wait = max(wait, bytes_bucket.reserve(size, now))
+				if messages_bucket is not None:
+					wait = max(wait, messages_bucket.reserve(1, now))
+				self._count(self.stats[name], size)
+			if wait < config.SHAPING_MIN_SLEEP:
+				return 0.0
+			stats['delayed'] += 1
+			stats['waited'] += wait
+			stats['max_wait'] = max(stats['max_wait'], wait)
+			return wait
+
+	@staticmethod
+	def _count(stats, size):
+		stats['buffers'] += 1
+		stats['bytes'] += size
+
+	def get_stats(self):
+		"""Return {message_name (None for the node): counters and achieved rates since the start}."""
+		with self._lock:
+			elapsed = max(time.monotonic() - self.started, 1e-9)
+			return {name: dict(stats, messages_per_s=stats['buffers'] / elapsed, bytes_per_s=stats['bytes'] / elapsed)
+					for name, stats in self.stats.items()}
@@ -0,0 +1,391 @@
+import itertools
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from ..utils.rsignal import signal_instance
+
+# Nodes with a 'worker' key in the network YAML run in a worker process per group.
+# The worker is forked from the main process when the network starts, so it inherits
+# the network configuration, the interface packages and the connected signal slots:
+# decoding, dispatch and handlers of its nodes run there, outside the main GIL.
+# In the main process the nodes are replaced by NodeProxy objects and RNetwork keeps
+# working as the single facade.
+#
+# Node state lives in the worker and is reached only through the proxies:
+#   - traffic recording: start_recording forwards to the workers, each writes its own capture
+#   - shared states: segments are created by the worker (readers attach by name as usual)
+#   - impairment and shaping: set and read through RNetwork, which calls the worker
+#   - message counters and last messages: read through MessageProxy
+# Attributes set on a NodeProxy (e.g. recorder) do not reach the worker.
+#
+# Slots connected with connect_main (requirement rules, state machine handlers) run in the
+# main process only: the worker disconnects its copies and forwards the signals of its nodes,
+# (node, message), {node}.{message}_sent and {node}.{message}_timeout, with their arguments.
+# Their return values are not sent back as replies.
+# The global variables changed in the worker are set in the main process too.
+#
+# IPC uses a multiprocessing Pipe per worker:
+#   main -> worker   (request_id, target, method, args, kwargs)   request_id None: no reply
+#   worker -> main   ('reply', request_id, ok, result)
+#                    ('event', node_name, connected)
+#                    ('signal', signal, kwargs)
+#                    ('global', [(name, value)])
+
+STOP_TIMEOUT = 10  # seconds
+
+_running_workers = list()  # Workers started by the main process
+
+
+def signal_node(signal):
+	"""Name of the node of a forwardable signal, None for the other signals."""
+	if isinstance(signal, tuple):
+		return signal[0]
+	if isinstance(signal, str) and '.' in signal and not signal.startswith('global.'):
+		return signal.split('.', 1)[0]
+	return None
+
+
+def connect_main(signal, slot):
+	"""
+	Connect a slot that must run in the main process.
+	The workers do not run it: they forward the signal to the main process instead.
+	"""
+	slot.main_process = True
+	signal_instance.connect(signal, slot)
+	node_name = signal_node(signal)
+	for worker in list(_running_workers):
+		if node_name in worker.node_names:
+			worker.post(None, '_forward', signal)
+
+
+def _serve(connection, node_names):
+	"""Main of a worker process: start its nodes and execute the requests of the main process."""
+	from ..statemachine.rglobal import get_global_manager
+	from .network import get_network
+	network = get_network()
+	send_lock = threading.Lock()
+	forwarded = set()
+
+	def post(message):
+		with send_lock:
+			connection.send(message)
+
+	def connection_slot(node_name, connected):
+		def slot(**kwargs):
+			post(('event', node_name, connected))
+		return slot
+
+	def forward_slot(signal):
+		def slot(logger=None, **kwargs):
+			try:
+				post(('signal', signal, kwargs))
+			except Exception as e:
+				network.logger.error(f'Signal {signal} not forwarded', exc=e)
+		return slot
+
+	def forward(signal):
+		if signal not in forwarded and signal_node(signal) in node_names:
+			forwarded.add(signal)
+			signal_instance.connect(signal, forward_slot(signal))
+
+	# The slots of the main process are inherited: they run there, not here
+	for signal, slots in list(signal_instance.listeners.items()):
+		for slot in [slot for slot in slots if getattr(slot, 'main_process', False)]:
+			signal_instance.disconnect(signal, slot)
+			forward(signal)
+	get_global_manager()._forward = lambda changes: post(('global', [change[:2] for change in changes]))
+
+	for node_name in node_names:
+		signal_instance.connect(f'{node_name}_connected', connection_slot(node_name, True))
+		signal_instance.connect(f'{node_name}_disconnected', connection_slot(node_name, False))
+		network.get_node_wrap(node_name).running = True
+
+	while True:
+		try:
+			request = connection.recv()
+		except EOFError:
+			break
+		if request is None:
+			break
+		request_id, target, method, args, kwargs = request
+		if method == '_forward':
+			forward(*args)
+			continue
+		try:
+			if target is None:
+				obj = network
+			elif isinstance(target, tuple):
+				obj = network.get_node_wrap(target[0]).get_message(target[1])
+			else:
+				obj = network.get_node_wrap(target)
+			result = getattr(obj, method)
+			if callable(result):
+				result = result(*args, **kwargs)
+			ok = True
+		except Exception as e:
+			network.logger.error(f'Worker request {method} failed', exc=e)
+			result, ok = e, False
+		if request_id is not None:
+			try:
+				post(('reply', request_id, ok, result))
+			except Exception as e:
+				post(('reply', request_id, False, RuntimeError(f'{method} result not transferable: {e!r}')))
+
+	network.stop()
+	post(None)
+
+
+class Worker:
+	"""Main process side of a worker process."""
+
+	def __init__(self, name, node_names, logger):
+		self.name = name
+		self.node_names = node_names
+		self.logger = logger
+		self.process = None
+		self.connection = None
+		self.proxies = dict()
+		self.wrappers = dict()  # Node wrappers replaced by the proxies in the main process
+		self._send_lock = threading.Lock()
+		self._pending = dict()
+		self._request_ids = itertools.count()
+		self._reader = None
+		self._events = queue.Queue()
+		self._event_thread = None
+
+	def fork(self):
+		import multiprocessing
+		context = multiprocessing.get_context('fork')
+		self.connection, child_connection = context.Pipe()
+		self.process = context.Process(target=_serve, args=(child_connection, self.node_names),
+			name=f'rsimulator_worker_{self.name}', daemon=True)
+		self.process.start()
+		child_connection.close()
+
+	def listen(self):
+		self._reader = threading.Thread(target=self._read, name=f'worker_{self.name}_reader', daemon=True)
+		self._reader.start()
+		# Slots may call the worker: they do not run in the reader thread
+		self._event_thread = threading.Thread(target=self._dispatch_events, name=f'worker_{self.name}_events',
+			daemon=True)
+		self._event_thread.start()
+
+	def _read(self):
+		while True:
+			try:
+				message = self.connection.recv()
+			except (EOFError, OSError):
+				message = None
+			if message is None:
+				break
+			if message[0] == 'event':
+				_, node_name, connected = message
+				self.proxies[node_name].connected = connected
+				continue
+			if message[0] in ('signal', 'global'):
+				self._events.put(message)
+				continue
+			_, request_id, ok, result = message
+			future = self._pending.pop(request_id, None)
+			if future is None:
+				continue
+			if ok:
+				future.set_result(result)
+			else:
+				future.set_exception(result)
+		for future in self._pending.values():
+			future.set_exception(ConnectionError(f'Worker {self.name} stopped'))
+		self._pending.clear()
+		self._events.put(None)
+
+	def _dispatch_events(self):
+		"""Run the main process slots of the signals forwarded by the worker."""
+		from ..statemachine.rglobal import get_global_manager
+		while True:
+			message = self._events.get()
+			if message is None:
+				break
+			if message[0] == 'global':
+				get_global_manager().set_global_variables(dict(message[1]))
+				continue
+			_, signal, kwargs = message
+			for slot in list(signal_instance.listeners.get(signal, ())):
+				if not getattr(slot, 'main_process', False):
+					continue
+				try:
+					slot(logger=self.logger, **kwargs)
+				except Exception as e:
+					self.logger.error(f'Slot of {signal} forwarded by worker {self.name} failed', exc=e)
+
+	def post(self, target, method, *args, **kwargs):
+		"""Send a request without waiting for its result."""
+		with self._send_lock:
+			self.connection.send((None, target, method, args, kwargs))
+
+	def call(self, target, method, *args, **kwargs):
+		"""Send a request and return its result (exceptions are raised again here)."""
+		future = Future()
+		with self._send_lock:
+			request_id = next(self._request_ids)
+			self._pending[request_id] = future
+			self.connection.send((request_id, target, method, args, kwargs))
+		return future.result()
+
+	def stop(self):
+		with self._send_lock:
+			try:
+				self.connection.send(None)
+			except OSError:
+				pass
+		if self._reader is not None:
+			self._reader.join(STOP_TIMEOUT)
+		if self._event_thread is not None:
+			self._event_thread.join(STOP_TIMEOUT)
+		self.process.join(STOP_TIMEOUT)
+		if self.process.is_alive():
+			self.logger.warning(f'Worker {self.name} not stopped within {STOP_TIMEOUT}s: terminating it')
+			self.process.terminate()
+		self.connection.close()
+
+
+class MessageProxy:
+	"""Read-only access to a message of a node running in a worker process."""
+
+	def __init__(self, worker, node_name, message_name):
+		self._worker = worker
+		self._target = (node_name, message_name)
+		self.name = message_name
+
+	@property
+	def counter(self):
+		return self._worker.call(self._target, 'counter')
+
+	@property
+	def last_time(self):
+		return self._worker.call(self._target, 'last_time')
+
+	@property
+	def interval(self):
+		return self._worker.call(self._target, 'interval')
+
+	def last(self, number=None):
+		return self._worker.call(self._target, 'last', number)
+
+	def reset(self):
+		return self._worker.call(self._target, 'reset')
+
+	def get_message_data(self, to_dict=False):
+		return self._worker.call(self._target, 'get_message_data', to_dict)
+
+
+class NodeProxy:
+	"""Stands for a node running in a worker process: calls are forwarded to the worker."""
+
+	def __init__(self, worker, node_wrap):
+		self.worker = worker
+		self.name = node_wrap.name
+		self.role = node_wrap.role
+		self.protocol = node_wrap.protocol
+		self.host = node_wrap.host
+		self.port = node_wrap.port
+		self.path = node_wrap.path
+		self.logger = node_wrap.logger
+		self.recorder = None
+		self.start_time = time.monotonic()
+		self.connected_time = None
+		self._connected = False
+		self._connected_event = threading.Event()
+
+	def __repr__(self):
+		return f'NodeProxy({self.name}, worker={self.worker.name})'
+
+	# Sending does not wait for the worker
+	def send_message(self, message_name):
+		self.worker.post(self.name, 'send_message', message_name)
+
+	def send_buffer(self, buffer):
+		self.worker.post(self.name, 'send_buffer', bytes(buffer))
+
+	def get_message(self, message_name):
+		return MessageProxy(self.worker, self.name, message_name)
+
+	def __getattr__(self, method):
+		# update_message, update_data, get_message_data, get_data, reset_data,
+		# is_periodic_active, ... are executed by the worker
+		if method.startswith('_'):
+			raise AttributeError(method)
+
+		def remote(*args, **kwargs):
+			return self.worker.call(self.name, method, *args, **kwargs)
+		return remote
+
+	@property
+	def running(self):
+		return self.worker.process.is_alive()
+
+	@running.setter
+	def running(self, value):
+		# The worker owns the life cycle of its nodes
+		pass
+
+	@property
+	def connected(self):
+		return self._connected
+
+	@connected.setter
+	def connected(self, value):
+		was_connected = self._connected
+		self._connected = value
+		if value:
+			if self.connected_time is None:
+				self.connected_time = time.monotonic()
+			self._connected_event.set()
+			signal_instance.emit(f'{self.name}_connected', logger=self.logger)
+		else:
+			self._connected_event.clear()
+			if was_connected:
+				signal_instance.emit(f'{self.name}_disconnected', logger=self.logger)
+
+	def wait_connected(self, timeout=None):
+		return self._connected_event.wait(timeout)
+
+	@property
+	def time_to_connected(self):
+		if self.connected_time is None:
+			return None
+		return self.connected_time - self.start_time
+
+
+def start_workers(network, groups):
+	"""
+	Fork a worker per group and replace its nodes with proxies.
+	:param groups: {worker name: [node names]}
+	:return: The started workers
+	"""
+	workers = [Worker(name, node_names, network.logger) for name, node_names in groups.items()]
+	# Every process is forked before any thread of the main process is started
+	for worker in workers:
+		worker.fork()
+	for worker in workers:
+		for node_name in worker.node_names:
+			worker.wrappers[node_name] = network.get_node_wrap(node_name)
+			proxy = NodeProxy(worker, worker.wrappers[node_name])
+			worker.proxies[node_name] = proxy
+			setattr(network, node_name, proxy)
+		worker.listen()
+		_running_workers.append(worker)
+		network.logger.info(f'Worker {worker.name} (pid {worker.process.pid}) running {", ".join(worker.node_names)}')
+	return workers
+
+
+def stop_workers(network, workers):
+	"""Stop the workers and put the node wrappers back in place of the proxies."""
+	for worker in workers:
+		if worker in _running_workers:
+			_running_workers.remove(worker)
+		worker.stop()
+		for node_name, node_wrap in worker.wrappers.items():
+			setattr(network, node_name, node_wrap)
+		network.logger.info(f'Worker {worker.name} stopped')
@@ -0,0 +1,121 @@
+import os
+import struct
+import threading
+import time
+from multiprocessing import resource_tracker, shared_memory
+
+# Out messages with 'shared: true' in the network YAML publish their serialized state
+# in a shared memory segment named by shared_state_name(node, message):
+#
+#   sequence  u64
+#   length    u32
+#   payload   the serialized message, `length` bytes
+#
+# The sequence is a seqlock: the writer makes it odd before changing the payload and
+# even again once it is complete, so a reader retries while the sequence is odd or
+# changed during its copy. Readers never take a lock nor make an IPC call.
+# Fields are written with slice assignments: pack_into clears the bytes before packing
+# them, which a reader in another process could see.
+
+SEQUENCE = struct.Struct('<Q')
+LENGTH = struct.Struct('<I')
+HEADER_SIZE = SEQUENCE.size + LENGTH.size
+READ_ATTEMPTS = 1000
+
+_created = set()  # Names of the segments created by this process
+
+
+def shared_state_name(node_name, message_name):
+	return f'rsim_{node_name}_{message_name}'
+
+
+class SharedState:
+	"""Writer side of the shared state of an out message."""
+
+	def __init__(self, name, size):
+		self.name = name
+		self.size = size
+		self._sequence = 0
+		self._lock = threading.Lock()
+		self._owner = os.getpid()
+		try:
+			self._memory = shared_memory.SharedMemory(name=name, create=True, size=HEADER_SIZE + size)
+		except FileExistsError:
+			# Left over by a previous run that did not stop cleanly
+			stale = shared_memory.SharedMemory(name=name)
+			stale.close()
+			stale.unlink()
+			self._memory = shared_memory.SharedMemory(name=name, create=True, size=HEADER_SIZE + size)
+		self._buffer = self._memory.buf
+		_created.add(name)
+
+	def publish(self, payload):
+		"""Write the serialized state. Raise ValueError if it does not fit in the segment."""
+		length = len(payload)
+		if length > self.size:
+			raise ValueError(f'{self.name}: {length} bytes do not fit in the {self.size} bytes segment')
+		with self._lock:
+			self._sequence += 1
+			self._buffer[:SEQUENCE.size] = SEQUENCE.pack(self._sequence)
+			self._buffer[SEQUENCE.size:HEADER_SIZE] = LENGTH.pack(length)
+			self._buffer[HEADER_SIZE:HEADER_SIZE + length] = payload
+			self._sequence += 1
+			self._buffer[:SEQUENCE.size] = SEQUENCE.pack(self._sequence)
+
+	@property
+	def version(self):
+		"""Number of publications."""
+		return self._sequence // 2
+
+	def close(self):
+		"""Release the segment. It is removed only by the process which created it (not by forked workers)."""
+		self._buffer = None
+		self._memory.close()
+		if os.getpid() == self._owner:
+			_created.discard(self.name)
+			try:
+				self._memory.unlink()
+			except FileNotFoundError:
+				pass
+
+
+class SharedStateReader:
+	"""
+	Reader of the shared state of an out message, usable from any process of the host.
+	reader = SharedStateReader('node_name', 'message_name')
+	message = interface_pkg.deserialize(reader.read())
+	"""
+
+	def __init__(self, node_name, message_name):
+		self.name = shared_state_name(node_name, message_name)
+		self._memory = shared_memory.SharedMemory(name=self.name)
+		# The segment belongs to the simulator: it must not be removed when the reader exits
+		if self.name not in _created:
+			resource_tracker.unregister(self._memory._name, 'shared_memory')
+		self._buffer = self._memory.buf
+		self.version = None  # Version of the last read snapshot
+
+	def read(self):
+		"""Return a consistent copy of the serialized message."""
+		for attempt in range(READ_ATTEMPTS):
+			sequence, = SEQUENCE.unpack_from(self._buffer)
+			# 0: not published yet
+			if sequence and not sequence & 1:
+				length, = LENGTH.unpack_from(self._buffer, SEQUENCE.size)
+				payload = bytes(self._buffer[HEADER_SIZE:HEADER_SIZE + length])
+				if SEQUENCE.unpack_from(self._buffer)[0] == sequence:
+					self.version = sequence // 2
+					return payload
+			if attempt:
+				time.sleep(0)
+		raise TimeoutError(f'{self.name}: no consistent snapshot after {READ_ATTEMPTS} attempts')
+
+	def close(self):
+		self._buffer = None
+		self._memory.close()
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *exc_info):
+		self.close()
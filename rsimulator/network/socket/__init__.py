@@ -1,4 +1,30 @@
-from .client import get_client
-from .server import get_server
-from .async_client import get_async_client
-from .async_server import get_async_server
+import os
+import stat
+
+# The socket modules import zmq and asyncio, so they are loaded on first use
+
+
+def get_client(protocol):
+	from .client import get_client
+	return get_client(protocol)
+
+def get_server(protocol):
+	from .server import get_server
+	return get_server(protocol)
+
+def get_async_client(protocol):
+	from .async_client import get_async_client
+	return get_async_client(protocol)
+
+def get_async_server(protocol):
+	from .async_server import get_async_server
+	return get_async_server(protocol)
+
+
+def remove_socket_file(path):
+	"""Remove the Unix socket file of a path (left by a server which did not stop), if any."""
+	try:
+		if stat.S_ISSOCK(os.stat(path).st_mode):
+			os.unlink(path)
+	except FileNotFoundError:
+		pass
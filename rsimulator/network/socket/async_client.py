@@ -1,27 +1,40 @@
 import asyncio
+import socket
 import zmq
 import zmq.asyncio
 import time
 
 from ...utils import enums
+from . import inproc
 from ...conf.network import network_config as config
 
 
 class BaseClient:
     def __init__(self, parent_node):
         self.pn = parent_node
-        self.message_queue = None
+        self.message_queue = asyncio.Queue()
 
     async def add(self, buffer):
         await self.message_queue.put(buffer)
 
+    async def stop(self):
+        await self.add("EXIT")
+
     async def handle_queue(self):
-        self.message_queue = asyncio.Queue()
         while self.pn.running:
             buffer = await self.message_queue.get()
             if buffer == "EXIT":
                 break
-            await self.send(buffer)
+            shaper = self.pn.shaper
+            if shaper is not None:
+                wait = shaper.reserve(buffer)
+                if wait:
+                    await asyncio.sleep(wait)
+            await self.deliver(buffer)
+
+    async def deliver(self, buffer):
+        """Send a buffer taken from the node queue."""
+        await self.send(buffer)
 
     async def send(self, buffer):
         raise NotImplementedError("")
@@ -36,13 +49,33 @@ class TCPClient(BaseClient):
         super().__init__(parent_node)
         self.reader = None
         self.writer = None
+        # While the connection is down the sent messages are kept in the outbound buffer
+        # and replayed (or conflated) once the reconnection succeeds
+        self.outbound = parent_node.outbound_buffer() if parent_node.reconnect_enabled else None
 
     async def connect(self):
-        self.reader, self.writer = await asyncio.open_connection(self.pn.host, self.pn.port)
-        self.pn.logger.info(f"Client {self.pn.name} connected to {self.pn.host}:{self.pn.port}")
+        for delay in self.pn.connection_backoff():
+            if not self.pn.running:
+                return
+            try:
+                self.reader, self.writer = await self.open_connection()
+            except OSError as e:
+                self.pn.logger.warning(f'Client status: Retrying to connect to {self.pn.endpoint} '
+                                       f'in {delay:.3f}s ({e})')
+                await asyncio.sleep(delay)
+                continue
+            self.pn.logger.info(f"Client {self.pn.name} connected to {self.pn.endpoint}")
+            self.pn.connected = True
+            return
+        raise ConnectionError(f'Connection failed (node: {self.pn.name})')
+
+    async def open_connection(self):
+        if self.pn.path is not None:
+            return await asyncio.open_unix_connection(self.pn.path)
+        return await asyncio.open_connection(self.pn.host, self.pn.port)
 
     async def read_full_message(self):
-        buffer = self.reader.read(4096)
+        buffer = await self.reader.read(4096)
         if not buffer:
             return
         message = self.pn.deserialize(buffer, to_dict=False)
@@ -52,22 +85,79 @@ class TCPClient(BaseClient):
     async def send(self, buffer):
         if self.writer.is_closing():
             self.pn.logger.error(f"Cannot send messages: Not connected to server!")
+            return
         if buffer is None:
             return
         self.writer.write(buffer)
         await self.writer.drain()
 
-    async def receive(self):
+    async def deliver(self, buffer):
+        if self.outbound is None:
+            return await self.send(buffer)
+        if not self.pn.connected:
+            self.outbound.append(buffer)
+            return
+        try:
+            await self.send(buffer)
+        except OSError as e:
+            self.outbound.append(buffer)
+            self.connection_lost(e)
+
+    def connection_lost(self, reason):
+        """Mark the node as disconnected, the receiver then takes care of the reconnection."""
+        if self.pn.connected:
+            self.pn.connected = False
+            self.pn.logger.warning(f'Client status: DISCONNECTED from {self.pn.endpoint} ({reason})')
+        self.writer.close()
+
+    async def reconnect(self):
+        for delay in self.pn.connection_backoff(attempts=None):
+            if not self.pn.running:
+                return False
+            try:
+                self.reader, self.writer = await self.open_connection()
+                sent = 0
+                # Messages buffered during the replay are sent in the next round
+                while len(self.outbound):
+                    pending = self.outbound.drain()
+                    for buffer in pending:
+                        self.writer.write(buffer)
+                    await self.writer.drain()
+                    sent += len(pending)
+            except OSError as e:
+                self.pn.logger.debug(f'Client status: Retrying to reconnect in {delay:.3f}s ({e})')
+                await asyncio.sleep(delay)
+                continue
+            self.pn.logger.info(f"Client status: RECONNECTED to {self.pn.endpoint} "
+                                f"({sent} buffered messages sent, {self.outbound.dropped} dropped)")
+            self.pn.connected = True
+            return True
+        return False
+
+    async def receive_messages(self):
         while self.pn.running:
             try:
                 buffer = await self.read_full_message()
                 if not buffer:
+                    if self.reader.at_eof():
+                        break
                     continue
             except asyncio.CancelledError:
                 self.pn.logger.error(f"asyncio.CancelledError")
+                raise
             except Exception as e:
                 self.pn.logger.error(f"", exc=e)
 
+    async def receive(self):
+        while self.pn.running:
+            await self.receive_messages()
+            # The server closed the connection
+            if not self.pn.running or self.outbound is None:
+                break
+            self.connection_lost('connection closed by the server')
+            if not await self.reconnect():
+                break
+
     async def run(self):
 
         await self.connect()
@@ -82,6 +172,40 @@ class TCPClient(BaseClient):
         await self.writer.wait_closed()
 
 
+class SpecTCPClient(TCPClient):
+
+    async def read_full_message(self):
+        """Read exactly one message using the length field of its header and dispatch it."""
+        [start, end] = self.pn.get_message_length_start_end_bytes()
+        try:
+            header = await self.reader.readexactly(end)
+            message_length = int.from_bytes(header[start:end], self.pn.interface_pkg.BYTE_ORDER.lower())
+            buffer = header + await self.reader.readexactly(message_length - end)
+        except asyncio.IncompleteReadError:
+            return
+        self.pn.dispatcher.dispatch(buffer)
+        return buffer
+
+
+class InprocClient(TCPClient):
+    """TCPClient over an in-process link: the link end is both the reader and the writer."""
+
+    async def open_connection(self):
+        end = inproc.connect((self.pn.host, self.pn.port))
+        return end, end
+
+
+class SpecInprocClient(InprocClient):
+
+    async def read_full_message(self):
+        """Every buffer of the link is a whole message: dispatch it."""
+        buffer = await self.reader.read()
+        if not buffer:
+            return
+        self.pn.dispatcher.dispatch(buffer)
+        return buffer
+
+
 class UDPClient(BaseClient, asyncio.DatagramProtocol):
 
     def __init__(self, parent_node):
@@ -91,10 +215,32 @@ class UDPClient(BaseClient, asyncio.DatagramProtocol):
 
     async def connect(self):
         loop = asyncio.get_running_loop()
-        self.transport, _ = await loop.create_datagram_endpoint(
-            lambda: self, remote_addr=(self.pn.host, self.pn.port)
-        )
-        self.pn.logger.info(f"{self.pn.name} connected to {self.pn.host}:{self.pn.port}")
+        if self.pn.path is not None:
+            # Unnamed Unix datagram sockets cannot be answered: autobind to an abstract address
+            _socket = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+            _socket.bind('')
+            # The server socket file may not exist yet
+            for delay in self.pn.connection_backoff():
+                if not self.pn.running:
+                    _socket.close()
+                    return
+                try:
+                    _socket.connect(self.pn.path)
+                    break
+                except OSError as e:
+                    self.pn.logger.warning(f'Client status: Retrying to connect to {self.pn.endpoint} '
+                                           f'in {delay:.3f}s ({e})')
+                    await asyncio.sleep(delay)
+            else:
+                _socket.close()
+                raise ConnectionError(f'Connection failed (node: {self.pn.name})')
+            self.transport, _ = await loop.create_datagram_endpoint(lambda: self, sock=_socket)
+        else:
+            self.transport, _ = await loop.create_datagram_endpoint(
+                lambda: self, remote_addr=(self.pn.host, self.pn.port)
+            )
+        self.pn.logger.info(f"{self.pn.name} connected to {self.pn.endpoint}")
+        self.pn.connected = True
 
     def datagram_received(self, data, addr):
         message = data.decode()
@@ -103,7 +249,7 @@ class UDPClient(BaseClient, asyncio.DatagramProtocol):
     async def send(self, buffer):
         try:
             self.pn.logger.debug(f"Sending message: {buffer}")
-            self.transport.sendto(buffer, (self.pn.host, self.pn.port))
+            self.transport.sendto(buffer)
         except Exception as e:
             self.pn.logger.error(f"Cannot send message!", exc=e)
 
@@ -113,6 +259,24 @@ class UDPClient(BaseClient, asyncio.DatagramProtocol):
         self.transport.close()
 
 
+class SpecUDPClient(UDPClient):
+
+    def datagram_received(self, data, addr):
+        """Every datagram is a whole message: dispatch it."""
+        self.pn.dispatcher.dispatch(data)
+
+    async def send(self, buffer):
+        message_name = self.pn.get_message_name_from_buffer(buffer)
+        try:
+            self.transport.sendto(buffer)
+            # Datagrams are not flow controlled: let the local receivers (same loop) read
+            await asyncio.sleep(0)
+            if message_name not in self.pn._exclude_from_log:
+                self.pn.logger.debug(f"Message {message_name} sent: {self.pn.deserialize(buffer)}")
+        except Exception as e:
+            self.pn.logger.error(f"Cannot send message {message_name}!", exc=e)
+
+
 class ZMQReqClient(BaseClient):
 
     def __init__(self, parent_node):
@@ -124,26 +288,32 @@ class ZMQReqClient(BaseClient):
         self.socket = self.context.socket(zmq.REQ)
         self.socket.connect(f"tcp://{self.pn.host}:{self.pn.port}")
 
-        # while self.pn.running:
-        #     try:
-        #         await self.socket.send_string(config.ZMQ_CONNECTION_REQUEST)
-        #         self.pn.logger.info(f"Client status: {self.pn.name} is waiting for connection...")
-        #         response = await asyncio.wait_for(self.socket.recv_string(), 1)
-        #         if response == config.ZMQ_CONNECTION_REPLY:
-        #             self.pn.logger.info(f"Client status: {self.pn.name} CONNECTED")
-        #             self.pn.connected = True
-        #             return
-        #     except zmq.error.ZMQError as e:
-        #         self.pn.logger.info(f"Retrying... {e}")
-        #         await asyncio.sleep(1)
-        #     except asyncio.TimeoutError as e:
-        #         self.pn.logger.info(f"Timeout... {e}")
-        #         await asyncio.sleep(1)
-        #     except Exception as e:
-        #         self.pn.logger.warning(f'Client status: {self.pn.name} retrying to connect', exc=e)
-        #         await asyncio.sleep(1)
-
-    async def send(self, buffer):
+        # The ping is resent on a new socket when the reply does not arrive in time,
+        # waiting longer at each attempt
+        for timeout in self.pn.connection_backoff(initial=config.SERVER_SOCKET_TIMEOUT, attempts=None):
+            if not self.pn.running:
+                return
+            try:
+                await self.socket.send_string(config.ZMQ_CONNECTION_REQUEST)
+                self.pn.logger.info(f"Client status: {self.pn.name} is waiting for connection...")
+                response = await asyncio.wait_for(self.socket.recv_string(), timeout)
+                if response == config.ZMQ_CONNECTION_REPLY:
+                    self.pn.logger.info(f"Client status: {self.pn.name} CONNECTED")
+                    self.pn.connected = True
+                    return
+            except asyncio.TimeoutError:
+                pass
+            except Exception as e:
+                self.pn.logger.warning(f'Client status: {self.pn.name} retrying to connect ({e})')
+            self.socket.close(linger=0)
+            self.socket = self.context.socket(zmq.REQ)
+            self.socket.connect(f"tcp://{self.pn.host}:{self.pn.port}")
+
+    async def send(self, request):
+        # Requests are (buffer, future) pairs queued by ZMQNodeWrapper
+        buffer, future = request
+        if not future.set_running_or_notify_cancel():
+            return
         try:
             await self.socket.send(buffer)
             message = self.pn.deserialize(buffer, to_dict=False)
@@ -152,9 +322,11 @@ class ZMQReqClient(BaseClient):
             response = await self.socket.recv()
             response = self.pn.deserialize(response, to_dict=False)
             self.pn.logger.debug(f"Response for {message.type} received: {response.payload}")
-            self.pn.response = response
         except Exception as e:
             self.pn.logger.error(f"Cannot send message!", exc=e)
+            future.set_exception(e)
+        else:
+            future.set_result(response)
 
     async def run(self):
         await self.connect()
@@ -165,7 +337,7 @@ class ZMQReqClient(BaseClient):
         if self.socket:
             self.socket.close()
         self.context.term()
-        self.pn.logger(f"{self.pn.name} client disconnected.")
+        self.pn.logger.info(f"{self.pn.name} client disconnected.")
 
 
 class ZMQPushClient(BaseClient):
@@ -199,13 +371,21 @@ class ZMQPushClient(BaseClient):
                 self.pn.logger.warning(f'Client status: {self.pn.name} retrying to connect', exc=e)
                 await asyncio.sleep(1)
 
-    async def send(self, buffer):
+    async def send(self, request):
+        # Requests are (buffer, future) pairs queued by ZMQNodeWrapper
+        buffer, future = request
+        if not future.set_running_or_notify_cancel():
+            return
         try:
             await self.socket.send(buffer)
             message = self.pn.deserialize(buffer, to_dict=False)
             self.pn.logger.debug(f"Message {message.type} sent: {message.payload}")
         except Exception as e:
             self.pn.logger.error(f"Cannot send message!", exc=e)
+            future.set_exception(e)
+        else:
+            # No reply on a PUSH socket
+            future.set_result(None)
 
     async def run(self):
         await self.connect()
@@ -216,11 +396,15 @@ class ZMQPushClient(BaseClient):
         if self.socket:
             self.socket.close()
         self.context.term()
-        self.pn.logger(f"{self.pn.name} client disconnected.")
+        self.pn.logger.info(f"{self.pn.name} client disconnected.")
 
 
 def get_async_client(protocol: enums.ProtocolType):
     return TCPClient if protocol is enums.ProtocolType.TCP else \
+        SpecTCPClient if protocol is enums.ProtocolType.SPEC_TCP else \
         UDPClient if protocol is enums.ProtocolType.UDP else \
+        SpecUDPClient if protocol is enums.ProtocolType.SPEC_UDP else \
+        InprocClient if protocol is enums.ProtocolType.INPROC else \
+        SpecInprocClient if protocol is enums.ProtocolType.SPEC_INPROC else \
             ZMQReqClient if protocol is enums.ProtocolType.ZMQ_REQ else \
                 ZMQPushClient if protocol is enums.ProtocolType.ZMQ_PUSH else None
\ No newline at end of file
@@ -1,10 +1,13 @@
 import asyncio
+import socket
 from time import sleep
 
 import zmq
 import zmq.asyncio
 from ...conf.network import network_config as config
 from ...utils import enums
+from . import inproc
+from . import remove_socket_file
 
 class BaseServer:
     """ Classe base per tutti i server con gestione invio e ricezione """
@@ -12,8 +15,8 @@ class BaseServer:
     def __init__(self, parent_node):
         self.pn = parent_node
         self.clients = set()
-        self.shutdown_event = None
-        self.message_queue = None
+        self.shutdown_event = asyncio.Event()
+        self.message_queue = asyncio.Queue()
 
     async def start(self):
         raise NotImplementedError("start() must be implemented.")
@@ -29,15 +32,23 @@ class BaseServer:
                     await self.send(message_buffer)
     # Functions to send
 
-    async def add(self, message, addr):
-        await self.message_queue.put((message, addr))
+    async def add(self, message):
+        await self.message_queue.put(message)
+
+    async def stop(self):
+        self.shutdown_event.set()
+        await self.add("EXIT")
 
     async def handle_queue(self):
-        self.message_queue = asyncio.Queue()
         while self.pn.running:
             buffer = await self.message_queue.get()
             if buffer  == "EXIT":
                 break
+            shaper = self.pn.shaper
+            if shaper is not None:
+                wait = shaper.reserve(buffer)
+                if wait:
+                    await asyncio.sleep(wait)
             await self.send(buffer)
 
 
@@ -53,25 +64,32 @@ class TCPServer(BaseServer):
         self.tasks = list()
 
     async def start(self):
-        self.shutdown_event = asyncio.Event()
         task = asyncio.create_task(self.handle_queue())
         self.tasks.append(task)
-        self.pn.logger.info(f"TCP Server {self.pn.name} listening on {self.pn.host}:{self.pn.port}")
-        self.server = await asyncio.start_server(self.handle_client, self.pn.host, self.pn.port)
-        async with self.server:
-            await self.server.serve_forever()
+        self.server = await self.create_server()
+        self.pn.logger.info(f"TCP Server {self.pn.name} listening on {self.pn.endpoint}")
+        await self.server.start_serving()
+        await self.shutdown_event.wait()
         await self.close()
 
+    async def create_server(self):
+        if self.pn.path is not None:
+            return await asyncio.start_unix_server(self.handle_client, self.pn.path)
+        return await asyncio.start_server(self.handle_client, self.pn.host, self.pn.port)
+
     async def close(self):
         self.pn.logger.info(f"Shutdown event received! Closing server {self.pn.name}...")
         self.server.close()
         await self.server.wait_closed()
+        if self.pn.path is not None:
+            remove_socket_file(self.pn.path)
         await asyncio.gather(*self.tasks)
 
     async def handle_client(self, reader, writer):
         addr = writer.get_extra_info('peername')
         self.pn.logger.debug(f"{self.pn.name} connected to {addr}")
         self.clients.add(writer)
+        self.pn.connected = True
         try:
             while self.pn.running:
                 buffer = await self.read_full_message(reader)
@@ -86,7 +104,7 @@ class TCPServer(BaseServer):
             await writer.wait_closed()
 
     async def read_full_message(self, reader):
-        buffer = reader.read(4096)
+        buffer = await reader.read(4096)
         if not buffer:
             return
         self.pn.deserialize(buffer, to_dict=False)
@@ -102,6 +120,41 @@ class TCPServer(BaseServer):
                 # self.clients.remove(client)
 
 
+class SpecTCPServer(TCPServer):
+
+    async def read_full_message(self, reader):
+        """Read exactly one message using the length field of its header."""
+        [start, end] = self.pn.get_message_length_start_end_bytes()
+        try:
+            header = await reader.readexactly(end)
+            message_length = int.from_bytes(header[start:end], self.pn.interface_pkg.BYTE_ORDER.lower())
+            return header + await reader.readexactly(message_length - end)
+        except asyncio.IncompleteReadError:
+            return
+
+
+class InprocServer(TCPServer):
+    """TCPServer over in-process links: (host, port) is only the name of the listener."""
+
+    def __init__(self, parent_node):
+        super().__init__(parent_node)
+        self.links = set()  # handle_client tasks, not awaited on close like the TCP connections
+
+    async def create_server(self):
+        def on_connect(end):
+            task = asyncio.create_task(self.handle_client(end, end))
+            self.links.add(task)
+            task.add_done_callback(self.links.discard)
+        return inproc.listen((self.pn.host, self.pn.port), asyncio.Queue, on_connect)
+
+
+class SpecInprocServer(InprocServer):
+
+    async def read_full_message(self, reader):
+        """Every buffer of the link is a whole message."""
+        return await reader.read()
+
+
 class UDPServer(BaseServer, asyncio.DatagramProtocol):
 
     def __init__(self, parent_node):
@@ -111,11 +164,18 @@ class UDPServer(BaseServer, asyncio.DatagramProtocol):
         self.tasks = set()
 
     async def start(self):
-        self.shutdown_event = asyncio.Event()
         loop = asyncio.get_running_loop()
-        self.transport, _ = await loop.create_datagram_endpoint(lambda: self, local_addr=(self.pn.host, self.pn.port))
-        self.pn.logger.info(f"UDP Server {self.pn.name} listening on {self.pn.host}:{self.pn.port}")
-        asyncio.create_task(self.handle_queue())
+        if self.pn.path is not None:
+            remove_socket_file(self.pn.path)
+            self.transport, _ = await loop.create_datagram_endpoint(lambda: self, local_addr=self.pn.path,
+                                                                    family=socket.AF_UNIX)
+        else:
+            self.transport, _ = await loop.create_datagram_endpoint(lambda: self, local_addr=(self.pn.host, self.pn.port))
+        self.pn.logger.info(f"UDP Server {self.pn.name} listening on {self.pn.endpoint}")
+        self.pn.connected = True
+        task = asyncio.create_task(self.handle_queue())
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
         await self.shutdown_event.wait()
         await self.close()
 
@@ -123,6 +183,8 @@ class UDPServer(BaseServer, asyncio.DatagramProtocol):
         self.pn.logger.info(f"Shutdown event received! Closing server {self.pn.name}...")
         if self.transport:
             self.transport.close()
+        if self.pn.path is not None:
+            remove_socket_file(self.pn.path)
         await asyncio.gather(*self.tasks, return_exceptions=True)
 
     def datagram_received(self, data, addr):
@@ -138,6 +200,23 @@ class UDPServer(BaseServer, asyncio.DatagramProtocol):
             self.transport.sendto(buffer, client)
 
 
+class SpecUDPServer(UDPServer):
+
+    def datagram_received(self, data, addr):
+        """Every datagram is a whole message: dispatch it and answer its sender."""
+        self.clients.add(addr)
+        try:
+            responses = self.pn.dispatcher.dispatch(data)
+        except Exception as e:
+            self.pn.logger.error(f"", exc=e)
+            return
+        for response in responses:
+            for message_name, message_buffer in response.items():
+                if message_buffer:
+                    self.pn.logger.debug(f'Response to {addr}: Sending {message_name}')
+                    self.transport.sendto(message_buffer, addr)
+
+
 class ZMQReplyServer(BaseServer):
 
     def __init__(self, parent_node):
@@ -147,29 +226,28 @@ class ZMQReplyServer(BaseServer):
         self.tasks = list()
 
     async def start(self):
-        self.shutdown_event = asyncio.Event()
         self.socket.bind(f"tcp://{self.pn.host}:{self.pn.port}")
-        self.pn.logger.info(f"Zmq Server listening on {self.pn.host}:{self.pn.port}...")
-        # task = asyncio.create_task(self.handle_requests())
-        # self.tasks.append(task)
-        await self.handle_requests()
+        self.pn.logger.info(f"Zmq Server listening on {self.pn.endpoint}...")
+        task = asyncio.create_task(self.handle_requests())
+        self.tasks.append(task)
         await self.shutdown_event.wait()
+        task.cancel()
         await self.close()
 
     async def handle_requests(self):
         while self.pn.running:
             request = await self.socket.recv()
-            # if request.decode('utf-8') == config.ZMQ_CONNECTION_REQUEST:
-            #     self.socket.send_string(config.ZMQ_CONNECTION_REPLY)
-            #     self.pn.connected = True
-            #     self.pn.logger.info('Zmq server connection success!')
-            #     continue
+            if request == config.ZMQ_CONNECTION_REQUEST.encode('utf-8'):
+                await self.socket.send_string(config.ZMQ_CONNECTION_REPLY)
+                self.pn.connected = True
+                self.pn.logger.info('Zmq server connection success!')
+                continue
             await self.handle_message(request, f'{self.pn.host}:{self.pn.port}')
 
 
     async def handle_message(self, buffer, addr):
         try:
-            buffer = self.pn.dispatcher.dispatch(buffer)[0]
+            buffer = self.pn.dispatcher.dispatch(buffer)
         except Exception as e:
             self.pn.logger.error('Reply needed in ZMQ REQ-REPLY', exc=e)
         else:
@@ -177,13 +255,20 @@ class ZMQReplyServer(BaseServer):
             self.pn.logger.debug(f'Responding {message.type}: {message.payload}')
             await self.send(buffer)
 
+    async def send(self, buffer):
+        await self.socket.send(buffer)
+
     async def close(self):
         self.pn.logger.info(f"Shutdown event received! Closing server {self.pn.name}...")
-        self.socket.close()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.socket.close(linger=0)
         self.context.term()
-        await asyncio.gather(*self.tasks)
 
 def get_async_server(protocol: enums.ProtocolType):
     return TCPServer if protocol is enums.ProtocolType.TCP else \
+           SpecTCPServer if protocol is enums.ProtocolType.SPEC_TCP else \
            UDPServer if protocol is enums.ProtocolType.UDP else \
+           SpecUDPServer if protocol is enums.ProtocolType.SPEC_UDP else \
+           InprocServer if protocol is enums.ProtocolType.INPROC else \
+           SpecInprocServer if protocol is enums.ProtocolType.SPEC_INPROC else \
            ZMQReplyServer if protocol is enums.ProtocolType.ZMQ_REP else None
\ No newline at end of file
@@ -7,6 +7,7 @@ import abc
 from ...utils import enums
 from ...conf.network import network_config as config
 from ...utils import rsignal
+from . import inproc
 
 
 class Client(abc.ABC):
@@ -24,12 +25,18 @@ class Client(abc.ABC):
 		pass
 
 	def stop(self):
+		if self.socket is None:
+			return
 		try:
 			self.socket.shutdown(socket.SHUT_RDWR)
 		except OSError:
 			pass
 		self.socket.close()
 
+	def deliver(self, buffer):
+		"""Send a buffer taken from the node queue."""
+		self.send_message(buffer)
+
 	def handle_queue(self):
 		try:
 			while self.pn.running:
@@ -37,7 +44,12 @@ class Client(abc.ABC):
 				if message == "EXIT":
 					self.pn.logger.info("Exiting message handling.")
 					break
-				self.send_message(message)
+				shaper = self.pn.shaper
+				if shaper is not None:
+					wait = shaper.reserve(message)
+					if wait:
+						time.sleep(wait)
+				self.deliver(message)
 		except Exception as e:
 			self.pn.logger.error(f"", exc=e)
 		finally:
@@ -48,28 +60,115 @@ class TCPClient(Client):
 
 	def __init__(self, parent_node):
 		super(TCPClient, self).__init__(parent_node)
+		# While the connection is down the sent messages are kept in the outbound buffer
+		# and replayed (or conflated) once the reconnection succeeds
+		self.outbound = parent_node.outbound_buffer() if parent_node.reconnect_enabled else None
+		self._link_lock = threading.Lock()
+		self._reconnecting = False
+
+	def open_socket(self):
+		"""Return a new socket connected to the server (raise OSError on failure)."""
+		_socket = socket.socket(self.pn.family, socket.SOCK_STREAM)
+		if self.pn.path is None:
+			_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+			_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+		_socket.settimeout(config.SERVER_SOCKET_TIMEOUT)
+		try:
+			_socket.connect(self.pn.address)
+		except OSError:
+			# A failed connect leaves the socket unusable: the next attempt uses a new one
+			_socket.close()
+			raise
+		return _socket
 
 	def connect(self):
-		self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-		self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-		self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
-		self.socket.settimeout(config.SERVER_SOCKET_TIMEOUT)
-		attempt = 0
-		while attempt < config.CLIENT_CONNECTION_ATTEMPTS:
-			try:
-				self.socket.connect((self.pn.host, self.pn.port))
-				self.pn.logger.info(f"Client status: CONNECTED to {self.pn.host}:{self.pn.port}")
-				self.pn.connected = True
-				threading.Thread(target=self.receive_message,
-					name=f'{self.pn.name}_receiver').start()
+		for delay in self.pn.connection_backoff():
+			if not self.pn.running:
 				return
-			except socket.timeout:
+			try:
+				self.socket = self.open_socket()
+			except OSError as e:
+				self.pn.logger.warning(f'Client status: Retrying to connect to {self.pn.endpoint} '
+									   f'in {delay:.3f}s ({e})')
+				time.sleep(delay)
 				continue
-			except Exception as e:
-				self.pn.logger.warning(f'Client status: Retrying to connect to {self.pn.host}:{self.pn.port} ({e})')
-				time.sleep(1)
+			self.pn.logger.info(f"Client status: CONNECTED to {self.pn.endpoint}")
+			self.pn.connected = True
+			self.start_receiver()
+			return
 		raise ConnectionError(f'Connection failed (node: {self.pn.name})')
 
+	def start_receiver(self):
+		threading.Thread(target=self.receive, args=(self.socket,),
+			name=f'{self.pn.name}_receiver').start()
+
+	def receive(self, _socket):
+		self.receive_message()
+		# The receiver exits when the server closes the connection
+		if self.pn.running and self.socket is _socket:
+			self.connection_lost('connection closed by the server')
+
+	def deliver(self, buffer):
+		if self.outbound is None:
+			return self.send_message(buffer)
+		with self._link_lock:
+			if not self.pn.connected:
+				self.outbound.append(buffer)
+				return
+			try:
+				self.send_message(buffer)
+			except OSError as e:
+				self.outbound.append(buffer)
+				lost = e
+			else:
+				return
+		self.connection_lost(lost)
+
+	def connection_lost(self, reason):
+		"""Mark the node as disconnected and start the reconnection (once per outage)."""
+		if self.outbound is None:
+			self.pn.connected = False
+			return
+		with self._link_lock:
+			if self._reconnecting or not self.pn.running:
+				return
+			self._reconnecting = True
+			self.pn.connected = False
+			Client.stop(self)
+		self.pn.logger.warning(f'Client status: DISCONNECTED from {self.pn.endpoint} ({reason})')
+		threading.Thread(target=self.reconnect, name=f'{self.pn.name}_reconnect').start()
+
+	def reconnect(self):
+		for delay in self.pn.connection_backoff(attempts=None):
+			if not self.pn.running:
+				break
+			try:
+				_socket = self.open_socket()
+			except OSError as e:
+				self.pn.logger.debug(f'Client status: Retrying to reconnect in {delay:.3f}s ({e})')
+				time.sleep(delay)
+				continue
+			with self._link_lock:
+				self.socket = _socket
+				pending = self.outbound.drain()
+				try:
+					for index, buffer in enumerate(pending):
+						self.send_message(buffer)
+				except OSError as e:
+					# Lost again while replaying: keep what was not sent and retry
+					for buffer in pending[index:]:
+						self.outbound.append(buffer)
+					Client.stop(self)
+					time.sleep(delay)
+					continue
+				self.pn.logger.info(f"Client status: RECONNECTED to {self.pn.endpoint} "
+									f"({len(pending)} buffered messages sent, {self.outbound.dropped} dropped)")
+				self.pn.connected = True
+				self._reconnecting = False
+			self.start_receiver()
+			return
+		self._reconnecting = False
+
 	def send_message(self, buffer):
 		if self.socket:
 			self.socket.sendall(buffer)
@@ -143,14 +242,17 @@ class UDPClient(Client):
 
 	def connect(self):
 		"""Initialize the UDP socket."""
-		self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+		self.socket = socket.socket(self.pn.family, socket.SOCK_DGRAM)
+		if self.pn.path is not None:
+			# Unnamed Unix datagram sockets cannot be answered: autobind to an abstract address
+			self.socket.bind('')
 		self.socket.settimeout(config.SERVER_SOCKET_TIMEOUT)
-		self.pn.logger.info(f"Client status: LINKED to {self.pn.host}:{self.pn.port}")
+		self.pn.logger.info(f"Client status: LINKED to {self.pn.endpoint}")
 		self.pn.connected = True
 
 	def send_message(self, buffer):
 		"""Send a serialized message to the server."""
-		self.socket.sendto(buffer, (self.pn.host, self.pn.port))
+		self.socket.sendto(buffer, self.pn.address)
 		self.pn.logger.debug(f"Message sent: {buffer.decode()}")
 
 	def receive_message(self):
@@ -175,7 +277,7 @@ class SpecUDPClient(UDPClient):
 		message_name = self.pn.get_message_name_from_buffer(buffer)
 
 		try:
-			self.socket.sendto(buffer, (self.pn.host, self.pn.port))
+			self.socket.sendto(buffer, self.pn.address)
 			if message_name not in self.pn._exclude_from_log:
 				self.pn.logger.debug(f"Message {message_name} sent: "
 									   f"{self.pn.deserialize(buffer)}")
@@ -211,51 +313,91 @@ class SpecUDPClient(UDPClient):
 				break
 
 
+class InprocClient(TCPClient):
+	"""TCPClient over an in-process link: same connection, reconnection and outbound buffer."""
+
+	def open_socket(self):
+		_socket = inproc.connect((self.pn.host, self.pn.port))
+		_socket.settimeout(config.SERVER_SOCKET_TIMEOUT)
+		return _socket
+
+
+class SpecInprocClient(InprocClient, SpecTCPClient):
+
+	def receive_message(self):
+		"""Receive messages from the server: every buffer of the link is a whole message."""
+		while self.pn.running:
+			try:
+				buffer = self.socket.recv()
+				if not buffer:
+					break
+				self.pn.dispatcher.dispatch(buffer)
+			except socket.timeout:
+				continue
+			except Exception as e:
+				self.pn.logger.error(f"", exc=e)
+				break
+
+
 class ZMQClient(Client):
 
 	def __init__(self, parent_node):
 		super(ZMQClient, self).__init__(parent_node)
 		self.address = f"tcp://{parent_node.host}:{parent_node.port}"
 		self.context = zmq.Context()
-		self.response = self.pn.response
 
 	def connect(self, wait_connection=True):
 		self.socket = self.context.socket(zmq.REQ)
 		self.socket.connect(self.address)
+		if not wait_connection:
+			return
 
-		if wait_connection:
-			while self.pn.running:
-				try:
-					self.socket.send_string(config.ZMQ_CONNECTION_REQUEST)
-					self.pn.logger.info(f"{self.pn.name} is waiting for connection to {self.address}...")
-
-					response = self.socket.recv_string()
-					if response == config.ZMQ_CONNECTION_REPLY:
-						self.pn.logger.info(f"Client status: CONNECTED to {self.address}")
-						self.pn.connected = True
-						return
-
-				except zmq.error.Again:
-					continue
-
-				except Exception as e:
-					self.pn.logger.warning(f'Client status: Retrying to connect to {self.address}', exc=e)
-					time.sleep(1)
-
-	def send_message(self, buffer):
+		# The ping is resent on a new socket when the reply does not arrive in time,
+		# waiting longer at each attempt
+		for timeout in self.pn.connection_backoff(initial=config.SERVER_SOCKET_TIMEOUT, attempts=None):
+			if not self.pn.running:
+				return
+			try:
+				self.socket.send_string(config.ZMQ_CONNECTION_REQUEST)
+				self.pn.logger.info(f"{self.pn.name} is waiting for connection to {self.address}...")
+				if self.socket.poll(timeout * 1000) and self.socket.recv_string() == config.ZMQ_CONNECTION_REPLY:
+					self.pn.logger.info(f"Client status: CONNECTED to {self.address}")
+					self.pn.connected = True
+					return
+			except Exception as e:
+				self.pn.logger.warning(f'Client status: Retrying to connect to {self.address} ({e})')
+			self.socket.close(linger=0)
+			self.socket = self.context.socket(zmq.REQ)
+			self.socket.connect(self.address)
+
+	def send_message(self, request):
+		# Requests are (buffer, future) pairs queued by ZMQNodeWrapper
+		buffer, future = request
+		if not future.set_running_or_notify_cancel():
+			return
 		try:
 			message = self.pn.deserialize(buffer, to_dict=False)
 			self.socket.send(buffer)
 			self.pn.logger.debug(f"Message {message.type} sent: {message.payload}")
 			response_buffer = self.socket.recv()
-			self.pn.response = self.pn.interface_pkg.deserialize(response_buffer, to_dict=False)
-			self.pn.logger.debug(f"Response for {message.type} received: {self.pn.response.payload}")
+			response = self.pn.interface_pkg.deserialize(response_buffer, to_dict=False)
+			self.pn.logger.debug(f"Response for {message.type} received: {response.payload}")
 		except Exception as e:
 			self.pn.logger.error(f"", exc=e)
+			future.set_exception(e)
+		else:
+			future.set_result(response)
 
 	def stop(self):
+		# Cancel the requests still waiting in the queue
+		while not self.pn.message_queue.empty():
+			request = self.pn.message_queue.get_nowait()
+			if isinstance(request, tuple):
+				request[1].cancel()
+		# The context can be terminated only once its sockets are closed
+		if self.socket:
+			self.socket.close(linger=0)
 		self.context.term()
-		super().stop()
 
 
 def get_client(protocol: enums.ProtocolType):
@@ -263,4 +405,6 @@ def get_client(protocol: enums.ProtocolType):
 		   UDPClient if protocol is enums.ProtocolType.UDP else \
 		   SpecTCPClient if protocol is enums.ProtocolType.SPEC_TCP else \
 		   SpecUDPClient if protocol is enums.ProtocolType.SPEC_UDP else \
+		   InprocClient if protocol is enums.ProtocolType.INPROC else \
+		   SpecInprocClient if protocol is enums.ProtocolType.SPEC_INPROC else \
 		   ZMQClient if 'zmq' in protocol.name.lower() else None
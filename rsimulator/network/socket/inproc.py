@@ -0,0 +1,153 @@
+import queue
+import socket
+import threading
+
+# In-process links (protocols INPROC and SPEC_INPROC) between nodes of the same process.
+# The server listens on its (host, port), used only as a name, and every client connecting
+# to it gets a link of two queues: each buffer is handed over as is, without syscalls,
+# framing or copies. The ends mimic the sockets (sync) and the stream reader/writer (async)
+# used by the TCP classes, which run unchanged on top of them.
+
+_listeners = dict()  # (host, port): Listener
+_lock = threading.Lock()
+
+CLOSED = None  # Put in the queue of the peer when an end is closed
+
+
+class InprocSocket:
+	"""One end of an in-process link."""
+
+	def __init__(self, inbox, outbox, peername):
+		self.inbox = inbox
+		self._outbox = outbox
+		self.peername = peername
+		self.timeout = None
+		self._closed = False
+		self._eof = False
+
+	# Socket
+
+	def settimeout(self, timeout):
+		self.timeout = timeout
+
+	def sendall(self, buffer):
+		if self._closed:
+			raise BrokenPipeError('In-process link closed')
+		self._outbox.put_nowait(buffer)
+
+	def recv(self, bufsize=None):
+		"""Return the next buffer (whole, whatever bufsize), b'' once the peer is closed."""
+		if self._eof:
+			return b''
+		try:
+			buffer = self.inbox.get(timeout=self.timeout)
+		except queue.Empty:
+			raise socket.timeout('timed out')
+		if buffer is CLOSED:
+			self._eof = True
+			return b''
+		return buffer
+
+	def shutdown(self, how):
+		pass
+
+	def close(self):
+		if not self._closed:
+			self._closed = True
+			self._outbox.put_nowait(CLOSED)
+
+	# Stream reader and writer (asyncio.Queue inbox)
+
+	async def read(self, n=-1):
+		if self._eof:
+			return b''
+		buffer = await self.inbox.get()
+		if buffer is CLOSED:
+			self._eof = True
+			return b''
+		return buffer
+
+	def at_eof(self):
+		return self._eof
+
+	def write(self, buffer):
+		self.sendall(buffer)
+
+	async def drain(self):
+		pass
+
+	def is_closing(self):
+		return self._closed
+
+	async def wait_closed(self):
+		pass
+
+	def get_extra_info(self, name, default=None):
+		return self.peername if name == 'peername' else default
+
+
+class Listener:
+	"""
+	Server side of the in-process links of an address.
+	The accepted ends are returned by accept() or, if given, passed to on_connect.
+	"""
+
+	def __init__(self, address, Queue, on_connect=None):
+		self.address = address
+		self.Queue = Queue
+		self.on_connect = on_connect
+		self.timeout = None
+		self._accepted = queue.Queue()
+		self._connections = 0
+
+	def settimeout(self, timeout):
+		self.timeout = timeout
+
+	def accept(self):
+		try:
+			return self._accepted.get(timeout=self.timeout)
+		except queue.Empty:
+			raise socket.timeout('timed out')
+
+	def _connect(self):
+		self._connections += 1
+		to_server, to_client = self.Queue(), self.Queue()
+		peername = f'inproc://{self.address[0]}:{self.address[1]}#{self._connections}'
+		client_end = InprocSocket(to_client, to_server, f'inproc://{self.address[0]}:{self.address[1]}')
+		server_end = InprocSocket(to_server, to_client, peername)
+		if self.on_connect is not None:
+			self.on_connect(server_end)
+		else:
+			self._accepted.put((server_end, peername))
+		return client_end
+
+	def close(self):
+		with _lock:
+			if _listeners.get(self.address) is self:
+				del _listeners[self.address]
+
+	# asyncio.Server
+
+	async def start_serving(self):
+		pass
+
+	async def wait_closed(self):
+		pass
+
+
+def listen(address, Queue=queue.SimpleQueue, on_connect=None):
+	"""Listen on an address. Raise OSError if it is taken by another listener."""
+	with _lock:
+		if address in _listeners:
+			raise OSError(f'In-process address {address[0]}:{address[1]} already in use')
+		_listeners[address] = Listener(address, Queue, on_connect)
+		return _listeners[address]
+
+
+def connect(address):
+	"""Return the client end of a new link. Raise ConnectionRefusedError if nobody listens."""
+	with _lock:
+		listener = _listeners.get(address)
+	if listener is None:
+		raise ConnectionRefusedError(f'No in-process listener on {address[0]}:{address[1]}')
+	return listener._connect()
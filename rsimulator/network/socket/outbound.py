@@ -0,0 +1,47 @@
+from collections import OrderedDict, deque
+
+
+class OutboundBuffer:
+	"""
+	Bounded buffer of the messages sent while a client is disconnected.
+
+	Policies:
+		replay    every message is kept and replayed in order; when full the oldest is dropped
+		conflate  only the last message of each kind is kept (key(buffer) gives the kind)
+	"""
+	REPLAY = 'replay'
+	CONFLATE = 'conflate'
+
+	def __init__(self, maxlen, policy=REPLAY, key=None):
+		if policy not in (self.REPLAY, self.CONFLATE):
+			raise ValueError(f'Unknown outbound buffer policy: {policy}')
+		self.maxlen = maxlen
+		self.policy = policy if key is not None else self.REPLAY
+		self.key = key
+		self.dropped = 0
+		self._buffer = deque() if self.policy == self.REPLAY else OrderedDict()
+
+	def __len__(self):
+		return len(self._buffer)
+
+	def append(self, buffer):
+		if self.policy == self.REPLAY:
+			self._buffer.append(buffer)
+		else:
+			key = self.key(buffer)
+			if key in self._buffer:
+				self.dropped += 1
+			self._buffer[key] = buffer
+			self._buffer.move_to_end(key)
+		if len(self._buffer) > self.maxlen:
+			self.dropped += 1
+			if self.policy == self.REPLAY:
+				self._buffer.popleft()
+			else:
+				self._buffer.popitem(last=False)
+
+	def drain(self):
+		"""Return the buffered messages in sending order and empty the buffer."""
+		buffers = list(self._buffer) if self.policy == self.REPLAY else list(self._buffer.values())
+		self._buffer.clear()
+		return buffers
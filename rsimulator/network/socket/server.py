@@ -9,6 +9,8 @@ import struct
 from ...utils import enums
 from ...conf.network import network_config as config
 from ...utils.rsignal import signal_instance
+from . import inproc
+from . import remove_socket_file
 
 BUFFER_SIZE = 4096
 
@@ -33,15 +35,29 @@ class Server(abc.ABC):
 				message = self.pn.message_queue.get()
 				if message == "EXIT":
 					self.pn.logger.info("Exiting message handling.")
+					# Every client has its own sender on the node queue: pass the EXIT on
+					self.pn.message_queue.put(message)
 					break
+				shaper = self.pn.shaper
+				if shaper is not None:
+					wait = shaper.reserve(message)
+					if wait:
+						time.sleep(wait)
 				self.send_message(client_socket, message)
 		except Exception as e:
 			self.pn.logger.error(f"", exc=e)
 		finally:
 			client_socket.close()
 
+	def bind(self):
+		if self.pn.path is not None:
+			remove_socket_file(self.pn.path)
+		self.server_socket.bind(self.pn.address)
+
 	def stop(self):
 		self.server_socket.close()
+		if self.pn.path is not None:
+			remove_socket_file(self.pn.path)
 		for thread in self.client_threads:
 			thread.join()
 
@@ -52,7 +68,7 @@ class TCPServer(Server):
 		super(TCPServer, self).__init__(parent_node)
 
 	def start(self):
-		self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+		self.server_socket = socket.socket(self.pn.family, socket.SOCK_STREAM)
 
 		# In questo modo evito "Address already in use"
 		self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
@@ -61,10 +77,10 @@ class TCPServer(Server):
 		linger = struct.pack('ii', 1, 0)
 		self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, linger)
 
-		self.server_socket.bind((self.pn.host, self.pn.port))
+		self.bind()
 		self.server_socket.listen(5)
 		self.server_socket.settimeout(config.SERVER_SOCKET_TIMEOUT)
-		self.pn.logger.info(f"{self.pn.name} status: LISTENING on {self.pn.host}:{self.pn.port}...")
+		self.pn.logger.info(f"{self.pn.name} status: LISTENING on {self.pn.endpoint}...")
 		self.accept_clients()
 
 	def accept_clients(self):
@@ -166,10 +182,10 @@ class UDPServer(Server):
 		super(UDPServer, self).__init__(parent_node)
 
 	def start(self):
-		self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-		self.server_socket.bind((self.pn.host, self.pn.port))
+		self.server_socket = socket.socket(self.pn.family, socket.SOCK_DGRAM)
+		self.bind()
 		self.server_socket.settimeout(config.SERVER_SOCKET_TIMEOUT)
-		self.pn.logger.info(f"{self.pn.name} status: LISTENING on {self.pn.host}:{self.pn.port}...")
+		self.pn.logger.info(f"{self.pn.name} status: LISTENING on {self.pn.endpoint}...")
 		self.pn.connected = True
 		self.receive_messages()
 
@@ -217,7 +233,7 @@ class SpecUDPServer(UDPServer):
 					for message_name, message_buffer in response.items():
 						message_dict = self.pn.deserialize(message_buffer)
 						self.pn.logger.debug(f'Response to {received_message_name}: Sending {message_name}: {message_dict}')
-					self.server_socket.sendto(response, addr)
+						self.server_socket.sendto(message_buffer, addr)
 
 			except socket.timeout:
 				continue
@@ -226,6 +242,65 @@ class SpecUDPServer(UDPServer):
 		self.stop()
 
 
+class InprocServer(TCPServer):
+	"""TCPServer over in-process links: (host, port) is only the name of the listener."""
+
+	def __init__(self, parent_node=None):
+		super(InprocServer, self).__init__(parent_node)
+
+	def start(self):
+		self.server_socket = inproc.listen((self.pn.host, self.pn.port))
+		self.server_socket.settimeout(config.SERVER_SOCKET_TIMEOUT)
+		self.pn.logger.info(f"{self.pn.name} status: LISTENING on inproc {self.pn.endpoint}...")
+		self.accept_clients()
+
+	def handle_client(self, client_socket, client_address):
+		while self.pn.running:
+			try:
+				data = client_socket.recv()
+				if not data:
+					break
+				# Dispatch message to appropriate handler
+				response_buffer = self.pn.dispatcher.dispatch(data)
+
+				if response_buffer:
+					client_socket.sendall(response_buffer)
+			except socket.timeout:
+				continue
+			except Exception as e:
+				self.pn.logger.error(f"", exc=e)
+				break
+		client_socket.close()
+
+
+class SpecInprocServer(InprocServer, SpecTCPServer):
+
+	def __init__(self, parent_node=None):
+		super(SpecInprocServer, self).__init__(parent_node)
+
+	def handle_client(self, client_socket, client_address):
+		while self.pn.running:
+			try:
+				# Every buffer of the link is a whole message
+				data = client_socket.recv()
+				if not data:
+					break
+
+				# Dispatch message to appropriate handler
+				responses = self.pn.dispatcher.dispatch(data)
+				received_message_name = self.pn.get_message_name_from_buffer(data)
+				for response in responses:
+					for message_name, message_buffer in response.items():
+						message_dict = self.pn.deserialize(message_buffer)
+						self.pn.logger.debug(f'Response to {received_message_name}: Sending {message_name}: {message_dict}')
+						client_socket.sendall(message_buffer)
+			except socket.timeout:
+				continue
+			except Exception as e:
+				self.pn.logger.error(f"", exc=e)
+		client_socket.close()
+
+
 class ZMQServer(Server):
 
 	def __init__(self, parent_node=None):
@@ -242,7 +317,9 @@ class ZMQServer(Server):
 	def handle_requests(self):
 		while self.pn.running:
 			try:
-				# Receive the request (blocking call)
+				# Wait for a request, waking up periodically to check the running flag
+				if not self.server_socket.poll(config.SERVER_SOCKET_TIMEOUT * 1000):
+					continue
 				request = self.server_socket.recv(flags=zmq.NOBLOCK)
 				if request.decode('utf-8') == config.ZMQ_CONNECTION_REQUEST:
 					self.server_socket.send_string(config.ZMQ_CONNECTION_REPLY)
@@ -253,7 +330,7 @@ class ZMQServer(Server):
 				response_buffer = self.pn.dispatcher.dispatch(request)
 				self.server_socket.send(response_buffer)
 			except zmq.Again:
-				time.sleep(0.1)
+				continue
 			except Exception as e:
 				self.pn.logger.error(f"Error (zmq handle_requests)", exc=e)
 				break
@@ -270,4 +347,6 @@ def get_server(protocol: enums.ProtocolType):
 		   UDPServer if protocol is enums.ProtocolType.UDP else \
 		   SpecTCPServer if protocol is enums.ProtocolType.SPEC_TCP else \
 		   SpecUDPServer if protocol is enums.ProtocolType.SPEC_UDP else \
+		   InprocServer if protocol is enums.ProtocolType.INPROC else \
+		   SpecInprocServer if protocol is enums.ProtocolType.SPEC_INPROC else \
 		   ZMQServer if 'zmq' in protocol.name.lower() else None
@@ -0,0 +1,106 @@
+import bisect
+import math
+import random
+
+from ...utils import rclock
+
+# Generated fields of an out message, declared in its default data:
+#
+# Status:
+#   speed: 0
+#   _generators:
+#     speed:      {sine: {amplitude: 10, frequency: 0.5, offset: 50, phase: 0}}
+#     level:      {square: {amplitude: 1, frequency: 2, offset: 1}}
+#     position.x: {ramp: {start: 0, slope: 1.5, min: 0, max: 100}}    # wraps from max to min
+#     noise:      {noise: {mean: 0, std: 1, seed: 3}}                  # gaussian
+#     jitter:     {uniform: {low: -1, high: 1, seed: 3}}
+#     mode:       {step: {profile: [[0, 1], [5, 2], [10, 3]], period: 15}}  # [time, value] from time
+#     sequence:   {counter: {start: 0, step: 1}}                       # per send
+#
+# Times are seconds from the first send of the message.
+
+GENERATORS_KEY = '_generators'
+
+
+def _sine(amplitude=1.0, frequency=1.0, offset=0.0, phase=0.0):
+	omega = 2 * math.pi * frequency
+	return lambda t, tick: offset + amplitude * math.sin(omega * t + phase)
+
+
+def _square(amplitude=1.0, frequency=1.0, offset=0.0, phase=0.0):
+	omega = 2 * math.pi * frequency
+	return lambda t, tick: offset + (amplitude if math.sin(omega * t + phase) >= 0 else -amplitude)
+
+
+def _ramp(start=0.0, slope=1.0, min=None, max=None):
+	if max is None:
+		return lambda t, tick: start + slope * t
+	low = start if min is None else min
+	span = max - low
+	return lambda t, tick: low + (start + slope * t - low) % span
+
+
+def _noise(mean=0.0, std=1.0, seed=None):
+	gauss = random.Random(seed).gauss
+	return lambda t, tick: gauss(mean, std)
+
+
+def _uniform(low=0.0, high=1.0, seed=None):
+	uniform = random.Random(seed).uniform
+	return lambda t, tick: uniform(low, high)
+
+
+def _step(profile, period=None):
+	times = [float(time) for time, _ in profile]
+	values = [value for _, value in profile]
+
+	def step(t, tick):
+		if period:
+			t %= period
+		return values[max(bisect.bisect_right(times, t) - 1, 0)]
+	return step
+
+
+def _counter(start=0, step=1):
+	return lambda t, tick: start + step * tick
+
+
+_generators = dict(sine=_sine, square=_square, ramp=_ramp, noise=_noise, uniform=_uniform, step=_step, counter=_counter)
+
+
+class FieldGenerators:
+	"""Evaluate all the generated fields of a message for the current send in one call."""
+
+	def __init__(self, specs):
+		self.keys = list()
+		self._generators = list()
+		for path, spec in specs.items():
+			if not isinstance(spec, dict) or len(spec) != 1:
+				raise ValueError(f'{path}: a generator is {{kind: parameters}}, got {spec!r}')
+			(kind, params), = spec.items()
+			if kind not in _generators:
+				raise ValueError(f'{path}: unknown generator {kind!r}, expected one of {", ".join(_generators)}')
+			self.keys.append([int(key) if key.isdigit() else key for key in path.split('.')])
+			self._generators.append(_generators[kind](**(params or dict())))
+		self._start = None
+		self._tick = 0
+
+	def reset(self):
+		self._start = None
+		self._tick = 0
+
+	def values(self):
+		now = rclock.monotonic()
+		if self._start is None:
+			self._start = now
+		t, tick = now - self._start, self._tick
+		self._tick += 1
+		return [generator(t, tick) for generator in self._generators]
+
+
+def split_generators(default_data):
+	"""Return (default data without the generators, FieldGenerators or None)."""
+	if not isinstance(default_data, dict) or GENERATORS_KEY not in default_data:
+		return default_data, None
+	data = {key: value for key, value in default_data.items() if key != GENERATORS_KEY}
+	return data, FieldGenerators(default_data[GENERATORS_KEY])
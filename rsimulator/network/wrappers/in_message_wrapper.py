@@ -1,8 +1,10 @@
 from collections import deque
 from threading import Lock
-import time
 
 from ...utils import enums
+from ...utils import rclock
+from ...utils.rsignal import signal_instance
+from ...utils.timers import get_timer_heap
 from ...conf.network import network_config as config
 
 class InMessageWrapper:
@@ -15,6 +17,13 @@ class InMessageWrapper:
 		self._last_time = -1
 		self._last_messages = deque(maxlen=config.MAX_LENGTH_IN_MESSAGES_DEQUE)
 		self._lock = Lock()
+		# Watchdog: the timeout signal is emitted after max_gap seconds without arrivals
+		self.max_gap = kwargs.get('max_gap')
+		self.timeouts = 0
+		self._watchdog = None  # Timer of the shared TimerHeap
+		self._watchdog_armed = False
+		self._last_arrival = None  # rclock.monotonic() of the last arrival
+		self._watchdog_lock = Lock()  # Between the dispatcher and the timer thread
 
 	def init(self):
 		pass
@@ -31,9 +40,56 @@ class InMessageWrapper:
 	def last_time(self):
 		return self._last_time
 
+	@property
+	def timeout_signal(self):
+		return f'{self.parent_node.name}.{self.name}_timeout'
+
 	def increment(self):
 		self._counter += 1
-		self._last_time = time.time()
+		self._last_time = rclock.time()
+		if self._watchdog_armed:
+			with self._watchdog_lock:
+				if not self._watchdog_armed:
+					return
+				self._last_arrival = rclock.monotonic()
+				watchdog = self._watchdog
+				if watchdog is not None:
+					watchdog.postpone(self._last_arrival + self.max_gap)
+				else:
+					# First arrival after a timeout
+					self._watchdog = get_timer_heap().call_at(self._last_arrival + self.max_gap, self._expire)
+
+	def start_watchdog(self):
+		"""Arm the arrival watchdog, if the message has a max_gap."""
+		if self.max_gap is None:
+			return
+		self.stop_watchdog()
+		with self._watchdog_lock:
+			self._watchdog_armed = True
+			self._last_arrival = rclock.monotonic()
+			self._watchdog = get_timer_heap().call_later(self.max_gap, self._expire)
+
+	def stop_watchdog(self):
+		with self._watchdog_lock:
+			self._watchdog_armed = False
+			watchdog, self._watchdog = self._watchdog, None
+		if watchdog is not None:
+			watchdog.cancel()
+
+	def _expire(self):
+		with self._watchdog_lock:
+			watchdog = self._watchdog
+			if watchdog is None or not self._watchdog_armed:
+				return
+			if rclock.monotonic() < watchdog.deadline:
+				# Postponed by an arrival while expiring
+				self._watchdog = get_timer_heap().call_at(watchdog.deadline, self._expire)
+				return
+			# An arrival now starts a new timer
+			self._watchdog = None
+			self.timeouts += 1
+			gap = rclock.monotonic() - self._last_arrival
+		signal_instance.emit(self.timeout_signal, gap=gap, logger=self.parent_node.logger)
 
 	def reset(self):
 		self._counter = 0
@@ -68,4 +124,6 @@ def get_in_message_wrapper(protocol: enums.ProtocolType):
 		InMessageWrapper if protocol is enums.ProtocolType.UDP else \
 		SpecInMessageWrapper if protocol is enums.ProtocolType.SPEC_TCP else \
 		SpecInMessageWrapper if protocol is enums.ProtocolType.SPEC_UDP else \
+		InMessageWrapper if protocol is enums.ProtocolType.INPROC else \
+		SpecInMessageWrapper if protocol is enums.ProtocolType.SPEC_INPROC else \
 		ZMQInMessageWrapper if protocol is enums.ProtocolType.ZMQ else None
@@ -1,17 +1,25 @@
 import logging
+import socket
 import threading
 import queue
 import abc
 import importlib
-import asyncio
 import time
+from collections import deque
+from concurrent.futures import Future
 
-from ..socket.client import Client
 from ...utils import enums
 from ...utils import error
 from ...utils import rlogging
+from ...utils.backoff import Backoff
 from ...conf.network import network_config as config
 from ..socket import get_client, get_server, get_async_client, get_async_server
+from ..loop import run_coroutine
+from ..socket.outbound import OutboundBuffer
+from ..shared import SharedState, shared_state_name
+from ..impairment import Impairment
+from ..shaping import Shaper
+from ...utils.timers import get_timer_heap
 from ...utils.rsignal import signal_instance
 
 from .in_message_wrapper import get_in_message_wrapper
@@ -19,6 +27,10 @@ from .out_message_wrapper import get_out_message_wrapper
 from .twoway_message_wrapper import get_two_way_message_wrapper
 
 
+# Protocols which run over a Unix domain socket when the node has a path
+UNIX_PROTOCOLS = (enums.ProtocolType.TCP, enums.ProtocolType.SPEC_TCP, enums.ProtocolType.UDP, enums.ProtocolType.SPEC_UDP)
+
+
 class NodeWrapper(abc.ABC):
 	"""
 	Implementation for InterfaceWrapper.
@@ -28,6 +40,7 @@ class NodeWrapper(abc.ABC):
 	def __init__(self, **kwargs):
 		self._running = False
 		self._connected = False
+		self._connected_event = threading.Event()
 		self._exclude_from_log = list()
 
 		self.messages = dict()
@@ -36,19 +49,37 @@ class NodeWrapper(abc.ABC):
 		self.name = kwargs.get('name')
 		self.host = kwargs.get('host')
 		self.port = kwargs.get('port')
+		self.path = kwargs.get('path')  # Unix domain socket path, in place of host and port
 		self.periodic_messages = set()
+		self.shared_messages = dict()  # Associate the shared out message_name to its segment size
 		self.thread = None
+		self.task = None
 		self.message_queue = None
 		self.socket = None
+		self.recorder = None  # Recorder of the traffic, set by RNetwork.start_recording
+		self.backoff = kwargs.get('backoff') or dict()
+		self.reconnect = kwargs.get('reconnect') or dict()
+		self.start_time = None
+		self.connected_time = None
+		self.connection_history = deque(maxlen=config.CONNECTION_HISTORY_LENGTH)  # (timestamp, connected)
+		self.outages = list()  # Duration in seconds of each outage
+		self._disconnected_at = None
+		self.impairment = kwargs.get('impairment') or dict()  # Impairment parameters of the node
+		self.impairments = dict()  # Associate the message_name (None for the node) to its Impairment
+		self.shaping = kwargs.get('shaping') or dict()  # Token-bucket shaping of the node
+		self.message_shaping = dict()  # Associate the message_name to its shaping
+		self.shaper = None  # Shaper applied by the sender, if any shaping
 
 		log_level = kwargs.get('log_level', 'INFO')
 		self.logger = rlogging.RLogger(f"Node.{self.name}",
-			file_name=config.network_log_path(), log_level=getattr(logging, log_level.upper()))
+			file_name=config.network_log_path, log_level=getattr(logging, log_level.upper()))
 
 
-		if None in (self.protocol, self.role, self.host, self.port, self.name):
+		if None in (self.protocol, self.role, self.name) or self.path is None and None in (self.host, self.port):
 			raise ValueError(f'Definition error. protocol: {self.protocol.__repr__}, role:{self.role.__repr__}, '
-							 f'host:{self.host}, port:{self.port}')
+							 f'host:{self.host}, port:{self.port}, path:{self.path}')
+		if self.path is not None and self.protocol not in UNIX_PROTOCOLS:
+			raise ValueError(f'Definition error. path: {self.path} not supported by {self.protocol.name}')
 
 		# Initialize data
 		self.interface_pkg = kwargs.get('interface_pkg')
@@ -67,6 +98,9 @@ class NodeWrapper(abc.ABC):
 		# dynamically as members of the class
 		kwargs.setdefault('messages', list())
 		self.init_messages(kwargs['messages'])
+		if self.impairment:
+			self.impairments[None] = Impairment(**self.impairment)
+		self._update_shaper()
 
 	def init_messages(self, messages):
 		def reply(message_name_in, message_name_out):
@@ -92,6 +126,7 @@ class NodeWrapper(abc.ABC):
 				self.messages[message_name] = MessageWrapper(
 					parent_node=self,
 					name=message_name,
+					max_gap=data.get('max_gap'),
 				)
 
 			elif direction is enums.MessageDirectionType.OUT:
@@ -106,7 +141,14 @@ class NodeWrapper(abc.ABC):
 					interval=data.get('interval', 1),
 					default_data=self.default_data.get(message_name, None),
 					glitch_data=self.glitch_data.get(message_name, None),
+					patch=data.get('patch', False),
 				)
+				if data.get('shared', False):
+					self.shared_messages[message_name] = data.get('shared_size', config.SHARED_STATE_SIZE)
+				if data.get('impairment'):
+					self.impairments[message_name] = Impairment(**{**self.impairment, **data['impairment']})
+				if data.get('shaping'):
+					self.message_shaping[message_name] = data['shaping']
 
 			elif direction is enums.MessageDirectionType.TWO_WAY:
 				MessageWrapper = get_two_way_message_wrapper(self.protocol)
@@ -115,11 +157,19 @@ class NodeWrapper(abc.ABC):
 				self.messages[message_name] = MessageWrapper(
 					parent_node=self,
 					name=message_name,
+					max_gap=data.get('max_gap'),
 					periodic=data.get('periodic', False),
 					interval=data.get('interval', 1),
 					default_data=self.default_data.get(message_name, None),
 					glitch_data=self.glitch_data.get(message_name, None),
+					patch=data.get('patch', False),
 				)
+				if data.get('shared', False):
+					self.shared_messages[message_name] = data.get('shared_size', config.SHARED_STATE_SIZE)
+				if data.get('impairment'):
+					self.impairments[message_name] = Impairment(**{**self.impairment, **data['impairment']})
+				if data.get('shaping'):
+					self.message_shaping[message_name] = data['shaping']
 
 
 	@abc.abstractmethod
@@ -148,48 +198,77 @@ class NodeWrapper(abc.ABC):
 			client.connect()
 			client.handle_queue()
 
-		async def start_async_server():
-			Server = get_async_server(self.protocol)
-			self.socket = Server(self)
-			await self.socket.start()
-
-		async def start_async_client():
-			Client = get_async_client(self.protocol)
-			self.socket = Client(self)
-			await self.socket.run()
-
-		async def async_start():
-			self.logger.debug(f'Starting node {self.name} activities...')
-			await getattr(self, f'start_async_{self.role.name.lower()}')()
-
+		self.start_time = time.monotonic()
+		self.connected_time = None
+		is_client = self.role is enums.NodeRoleType.CLIENT
 		if not config.asynchronous_network:
-			_start = start_client if self.role.name.lower() == 'client' else start_server
+			_start = start_client if is_client else start_server
 			self.message_queue = queue.Queue()
 			self.thread = threading.Thread(target=_start, name=f'{self.name}_thread')
 			self.thread.start()
 		else:
-			NotImplementedError('Non ho ancora configurato lo start di una rete asincrona')
+			# Every asynchronous node runs as a task of the shared network event loop
+			Socket = get_async_client(self.protocol) if is_client else get_async_server(self.protocol)
+			if Socket is None:
+				raise NotImplementedError(f'No asynchronous {self.role.name.lower()} for {self.protocol.name}')
+			self.socket = Socket(self)
+			self.logger.debug(f'Starting node {self.name} activities...')
+			self.task = run_coroutine(self.socket.run() if is_client else self.socket.start())
 
 	def stop(self):
+		for message_name in list(self.periodic_messages):
+			self.deactivate_periodic_message(message_name)
 		if not config.asynchronous_network:
-			for message_name in self.periodic_messages:
-				self.deactivate_periodic_message(message_name)
 			self.message_queue.put('EXIT')
 			self.thread.join()
 		else:
-			NotImplementedError('Non ho ancora configurato lo stop di una rete asincrona')
-
+			run_coroutine(self.socket.stop()).result(config.ASYNC_STOP_TIMEOUT)
+			try:
+				self.task.result(config.ASYNC_STOP_TIMEOUT)
+			except Exception as e:
+				self.logger.warning(f'{self.name} task not stopped cleanly ({e!r})')
+				self.task.cancel()
+
+	def _enqueue(self, buffer, message_name=None):
+		"""Hand a buffer over to the sender of the node, through its impairment (if any)."""
+		if self.impairments:
+			impairment = self.impairments.get(message_name) or self.impairments.get(None)
+			if impairment is not None:
+				for delay, _buffer in impairment.apply(buffer):
+					if delay:
+						get_timer_heap().call_later(delay, self._enqueue_delayed, _buffer)
+					else:
+						self._put(_buffer)
+				return
+		self._put(buffer)
+
+	def _enqueue_delayed(self, buffer):
+		# Called by the timer heap: the buffers delayed past the stop of the node are lost
+		if self._running:
+			self._put(buffer)
+
+	def _put(self, buffer):
+		if config.asynchronous_network:
+			run_coroutine(self.socket.add(buffer))
+		else:
+			self.message_queue.put(buffer)
 
+	def record(self, direction, buffer, message_name=None):
+		if self.recorder is not None:
+			self.recorder.record(self.name, direction, buffer, message_name)
 
 	def send_buffer(self, buffer):
-		self.message_queue.put(buffer)
+		self.record(enums.MessageDirectionType.OUT, buffer)
+		self._enqueue(buffer)
 
 	def send_message(self, message_name):
-		if config.asynchronous_network:
-			loop = asyncio.get_event_loop()
-			loop.run_until_complete(self.socket.add(self.serialize(message_name)))
-		else:
-			self.message_queue.put(self.serialize(message_name))
+		message_wrap = self.messages.get(message_name)
+		if getattr(message_wrap, 'generators', None) is not None:
+			message_wrap.generate()
+		buffer = self.serialize(message_name)
+		self.record(enums.MessageDirectionType.OUT, buffer, message_name)
+		self._enqueue(buffer, message_name)
+		signal_instance.emit(f'{self.name}.{message_name}_sent', logger=self.logger)
 
 	def activate_periodic_message(self, message_name):
 		self.get_message(message_name).periodic = True
@@ -205,9 +284,161 @@ class NodeWrapper(abc.ABC):
 
 	@connected.setter
 	def connected(self, value):
+		was_connected = self._connected
 		self._connected = value
+		if value != was_connected:
+			self.connection_history.append((time.time(), value))
 		if value:
+			if self.connected_time is None and self.start_time is not None:
+				self.connected_time = time.monotonic()
+			if self._disconnected_at is not None:
+				self.outages.append(time.monotonic() - self._disconnected_at)
+				self._disconnected_at = None
+				self.logger.info(f'{self.name} reconnected after {self.outages[-1]:.3f}s')
+			self._connected_event.set()
 			signal_instance.emit(f'{self.name}_connected', logger=self.logger)
+		else:
+			self._connected_event.clear()
+			if was_connected:
+				self._disconnected_at = time.monotonic()
+				signal_instance.emit(f'{self.name}_disconnected', logger=self.logger)
+
+	def wait_connected(self, timeout=None):
+		"""
+		Block until the node is connected.
+		:param timeout: Maximum time to wait in seconds (None waits forever)
+		:return: True if the node is connected, False on timeout
+		"""
+		return self._connected_event.wait(timeout)
+
+	@property
+	def time_to_connected(self):
+		"""Seconds between the node start and its first connection (None if not connected yet)."""
+		if self.start_time is None or self.connected_time is None:
+			return None
+		return self.connected_time - self.start_time
+
+	def connection_backoff(self, **kwargs):
+		"""
+		Return the Backoff of the connection attempts.
+		Defaults come from the network config, overridden by the 'backoff' node
+		definition and then by kwargs.
+		"""
+		params = dict(
+			initial=config.CLIENT_BACKOFF_INITIAL,
+			maximum=config.CLIENT_BACKOFF_MAX,
+			factor=config.CLIENT_BACKOFF_FACTOR,
+			jitter=config.CLIENT_BACKOFF_JITTER,
+			attempts=config.CLIENT_CONNECTION_ATTEMPTS,
+		)
+		params.update(self.backoff)
+		params.update(kwargs)
+		return Backoff(**params)
+
+	@property
+	def address(self):
+		"""Socket address of the node: its Unix socket path, or (host, port)."""
+		return self.path if self.path is not None else (self.host, self.port)
+
+	@property
+	def family(self):
+		return socket.AF_UNIX if self.path is not None else socket.AF_INET
+
+	@property
+	def endpoint(self):
+		"""Address of the node for the logs."""
+		return f'unix:{self.path}' if self.path is not None else f'{self.host}:{self.port}'
+
+	@property
+	def reconnect_enabled(self):
+		return self.reconnect.get('enabled', config.CLIENT_RECONNECT)
+
+	def outbound_buffer(self):
+		"""
+		Return the OutboundBuffer holding the messages sent during an outage.
+		Size and policy come from the 'reconnect' node definition or from the network config.
+		"""
+		policy = self.reconnect.get('policy', config.CLIENT_OUTBOUND_POLICY)
+		key = getattr(self, 'get_message_name_from_buffer', None) if policy == OutboundBuffer.CONFLATE else None
+		if policy == OutboundBuffer.CONFLATE and key is None:
+			self.logger.warning(f'{self.name} cannot conflate raw buffers: replaying them instead')
+		return OutboundBuffer(
+			maxlen=self.reconnect.get('buffer_size', config.CLIENT_OUTBOUND_BUFFER_SIZE),
+			policy=policy,
+			key=key)
+
+	def set_impairment(self, message_name=None, **params):
+		"""
+		Impair the buffers of a message (merged over the node impairment) or of the whole node.
+		See network/impairment.py for the parameters. Return the Impairment.
+		"""
+		if message_name is not None:
+			params = {**self.impairment, **params}
+		else:
+			self.impairment = params
+		self.impairments[message_name] = Impairment(**params)
+		return self.impairments[message_name]
+
+	def clear_impairment(self, message_name=None):
+		"""Remove the impairment of a message, or every impairment of the node if message_name is None."""
+		if message_name is None:
+			self.impairment = dict()
+			self.impairments.clear()
+		else:
+			self.impairments.pop(message_name, None)
+
+	def get_impairment_stats(self):
+		"""Return {message_name (None for the node): impairment counters}."""
+		return {message_name: dict(impairment.stats) for message_name, impairment in self.impairments.items()}
+
+	def _update_shaper(self):
+		if self.message_shaping and not hasattr(self, 'get_message_name_from_buffer'):
+			self.logger.warning(f'{self.name} cannot tell the messages of raw buffers: message shaping ignored')
+			self.message_shaping = dict()
+		if not self.shaping and not self.message_shaping:
+			self.shaper = None
+			return
+		self.shaper = Shaper(self.shaping, self.message_shaping, getattr(self, 'get_message_name_from_buffer', None))
+
+	def set_shaping(self, message_name=None, **params):
+		"""
+		Shape the buffers of the node, or of a message on top of the node shaping.
+		:param params: bytes_rate, bytes_burst, messages_rate, messages_burst (see network/shaping.py)
+		"""
+		if message_name is None:
+			self.shaping = params
+		else:
+			self.message_shaping[message_name] = params
+		self._update_shaper()
+
+	def clear_shaping(self, message_name=None):
+		"""Remove the shaping of a message, or every shaping of the node if message_name is None."""
+		if message_name is None:
+			self.shaping = dict()
+			self.message_shaping = dict()
+		else:
+			self.message_shaping.pop(message_name, None)
+		self._update_shaper()
+
+	def get_shaping_stats(self):
+		"""Return {message_name (None for the node): shaping counters}, empty if not shaped."""
+		return self.shaper.get_stats() if self.shaper is not None else dict()
+
+	def open_shared_states(self):
+		"""Create the shared memory segments of the shared out messages and publish their state."""
+		for message_name, size in self.shared_messages.items():
+			message_wrap = self.get_message(message_name)
+			message_wrap.shared = SharedState(shared_state_name(self.name, message_name), size)
+			with message_wrap.lock:
+				message_wrap.publish()
+			self.logger.debug(f'{message_name} shared as {message_wrap.shared.name}')
+
+	def close_shared_states(self):
+		for message_name in self.shared_messages:
+			message_wrap = self.get_message(message_name)
+			shared, message_wrap.shared = message_wrap.shared, None
+			if shared is not None:
+				shared.close()
 
 	@property
 	def running(self):
@@ -218,10 +449,17 @@ class NodeWrapper(abc.ABC):
 		if self._running == value:
 			return
 		self._running = value
+		watchdogs = [message for message in self.messages.values() if getattr(message, 'max_gap', None) is not None]
 		if value:
+			self.open_shared_states()
 			self.start()
+			for message in watchdogs:
+				message.start_watchdog()
 		else:
+			for message in watchdogs:
+				message.stop_watchdog()
 			self.stop()
+			self.close_shared_states()
 
 
 class EnlargedNodeWrapper(NodeWrapper, abc.ABC):
@@ -319,7 +557,14 @@ class ZMQNodeWrapper(NodeWrapper):
 				'.handlers.zmq_handlers', package='rsimulator.network')
 			zmq_default_handlers.connect_handlers(self.name)
 		self.last_message_sent = None
-		self.response = None
+		self._last_future = None
+		if self.impairments:
+			# Requests and replies are in lockstep: a lost or reordered request stalls the node
+			self.logger.warning(f'{self.name}: impairments are not supported by ZMQ nodes')
+			self.clear_impairment()
+		if self.shaper is not None:
+			self.logger.warning(f'{self.name}: shaping is not supported by ZMQ nodes')
+			self.clear_shaping()
 
 	def init_messages(self, messages):
 		for name, structure in messages.items():
@@ -342,23 +587,43 @@ class ZMQNodeWrapper(NodeWrapper):
 		return self.interface_pkg.deserialize(buffer, to_dict)
 
 	def send_message(self, message_name):
-		self.response = None
 		self.last_message_sent = message_name
-		super().send_message(message_name)
+		buffer = self.serialize(message_name)
+		self.record(enums.MessageDirectionType.OUT, buffer, message_name)
+		return self._send_request(buffer)
 
 	def send_buffer(self, buffer):
-		self.response = None
 		self.last_message_sent = 'Generic buffer'
-		super().send_buffer(buffer)
-
+		self.record(enums.MessageDirectionType.OUT, buffer)
+		return self._send_request(buffer)
+
+	def _send_request(self, buffer):
+		"""
+		Queue a request and return the Future completed with its deserialized reply (None for ZMQ_PUSH).
+		The client sockets resolve the requests in queue order, which is also the
+		REQ/REP reply order, so any number of requests can be in flight.
+		"""
+		future = Future()
+		self._last_future = future
+		self._enqueue((buffer, future))
+		return future
 
-	def get_response(self):
-		for _ in range(60):
-			if self.response is not None:
-				return self.response
-			time.sleep(1)
-		self.logger.error(f'Response not received for {self.last_message_sent}')
-		return self.response
+	@property
+	def response(self):
+		"""Reply of the last request, None if not received yet."""
+		if self._last_future is None or not self._last_future.done() or self._last_future.exception():
+			return None
+		return self._last_future.result()
+
+	def get_response(self, timeout=60):
+		"""Wait for the reply of the last request sent."""
+		if self._last_future is None:
+			return None
+		try:
+			return self._last_future.result(timeout)
+		except Exception as e:
+			self.logger.error(f'Response not received for {self.last_message_sent}', exc=e)
+			return None
 
 
 def get_node_wrapper(protocol: enums.ProtocolType):
@@ -366,4 +631,6 @@ def get_node_wrapper(protocol: enums.ProtocolType):
 		NodeWrapper if protocol is enums.ProtocolType.UDP else \
 		SpecNodeWrapper if protocol is enums.ProtocolType.SPEC_TCP else \
 		SpecNodeWrapper if protocol is enums.ProtocolType.SPEC_UDP else \
+		NodeWrapper if protocol is enums.ProtocolType.INPROC else \
+		SpecNodeWrapper if protocol is enums.ProtocolType.SPEC_INPROC else \
 		ZMQNodeWrapper if 'zmq' in protocol.name.lower() else None
@@ -1,6 +1,8 @@
 from ...utils import enums
 from ...utils import error
+from .generators import split_generators
 
+import struct
 from collections.abc import MutableSequence
 from copy import deepcopy
 from threading import Lock
@@ -19,6 +21,8 @@ class OutMessageWrapper:
 		self.glitch_data = kwargs.get('glitch_data')
 		self._is_glitching = False
 		self._lock = Lock()
+		self.shared = None  # SharedState publishing the serialized message, if shared
+		self.generators = None  # FieldGenerators of the generated fields, if any
 		self.reset_data()
 
 	@property
@@ -56,11 +60,86 @@ class OutMessageWrapper:
 	def serialize(self):
 		pass
 
+	def generate(self):
+		pass
+
+	def publish(self):
+		"""
+		Publish the serialized message in its shared memory segment (if shared).
+		Called holding the lock, so the segment always ends on the last update.
+		"""
+		if self.shared is None:
+			return
+		try:
+			self.shared.publish(self.serialize())
+		except Exception as e:
+			self.parent_node.logger.error(f'{self.name} shared state not published', exc=e)
+
 
 class SpecOutMessageWrapper(OutMessageWrapper):
 
 	def __init__(self, **kwargs):
+		# Serialize-by-patch: the serialized message is kept in a template and
+		# update_data writes the leaf at its offset, given by Message.layout():
+		# {'path.to.leaf': (offset, struct format without byte order)}
+		self.patch = kwargs.get('patch', False)
+		self._template = None
+		self._layout = None
+		self._message_layout = None
+		# Live generators: the '_generators' key of the default data (see generators.py)
+		default_data, generators = split_generators(kwargs.get('default_data'))
+		kwargs['default_data'] = default_data
+		self._generated = dict()  # Generated values patched in the template only, by path
 		super(SpecOutMessageWrapper, self).__init__(**kwargs)
+		self.generators = generators
+		self._integer_fields = None
+		if self.patch:
+			self._init_template()
+
+	def _init_template(self):
+		layout = getattr(self.message.__class__, 'layout', None)
+		if layout is None:
+			self.parent_node.logger.warning(f'{self.name} has no layout(): serialize-by-patch disabled')
+			self.patch = False
+			return
+		byte_order = '>' if self.parent_node.interface_pkg.BYTE_ORDER.upper() == 'BIG' else '<'
+		self._message_layout = {
+			tuple(int(key) if key.isdigit() else key for key in path.split('.')): (offset, struct.Struct(byte_order + fmt))
+			for path, (offset, fmt) in layout().items()}
+		self._layout = self._message_layout
+		self._template = bytearray(self.message.serialize())
+		self._template_length = len(self._template)
+
+	def _rebuild_template(self):
+		"""Serialize the whole message again into the template (after a non-leaf change)."""
+		if self._template is None:
+			return
+		self._flush_generated()
+		self._template = bytearray(self.message.serialize())
+		if len(self._template) == self._template_length:
+			self._layout = self._message_layout
+		elif self._layout:
+			# The layout is valid only for the initial size (e.g. lists were resized)
+			self.parent_node.logger.warning(f'{self.name} size changed: every update serializes the whole message')
+			self._layout = dict()
+
+	def _flush_generated(self):
+		"""Set in the message the generated values written only in the template so far."""
+		if self._generated:
+			for keys, value in self._generated.values():
+				self._set_leaf(keys, value)
+			self._generated.clear()
+
+	def _patch_template(self, keys, value):
+		field = self._layout.get(tuple(keys))
+		if field is None:
+			self._rebuild_template()
+			return
+		offset, _struct = field
+		try:
+			_struct.pack_into(self._template, offset, value)
+		except struct.error:
+			self._rebuild_template()
 
 
 	def get_data(self, keys, glitch=False, to_dict=True, copy=False):
@@ -75,28 +154,32 @@ class SpecOutMessageWrapper(OutMessageWrapper):
 		"""
 		with self.lock:
 			if not glitch:
-				data = self.message
-				for key in keys:
-					if isinstance(data, object):
-						data = getattr(data, key)
-					elif isinstance(data, MutableSequence) and isinstance(key, int):
-						try:
-							data = data.__getitem__(key)
-						except IndexError:
-							return error.ErrorType.INDEX_OUT_OF_RANGE
-					else:
-						return error.ErrorType.NOT_FOUND
-					if data is None:
-						return error.ErrorType.NOT_FOUND
-					if to_dict:
-						data = data.to_dict()
-			else:
-				data = self.glitch_data
-				for key in keys:
-					data = data[key]
-			if copy:
-				return deepcopy(data)
-			return data
+				self._flush_generated()
+			return self._get_data(keys, glitch, to_dict, copy)
+
+	def _get_data(self, keys, glitch=False, to_dict=True, copy=False):
+		if not glitch:
+			data = self.message
+			for key in keys:
+				if isinstance(data, MutableSequence) and isinstance(key, int):
+					try:
+						data = data.__getitem__(key)
+					except IndexError:
+						return error.ErrorType.INDEX_OUT_OF_RANGE
+				else:
+					data = getattr(data, key, None)
+				if data is None:
+					return error.ErrorType.NOT_FOUND
+			# Only the requested value is converted, not every level of the path
+			if to_dict:
+				data = data.to_dict()
+		else:
+			data = self.glitch_data
+			for key in keys:
+				data = data[key]
+		if copy:
+			return deepcopy(data)
+		return data
 
 	def update_data(self, keys, value, glitch=False):
 		"""
@@ -107,32 +190,44 @@ class SpecOutMessageWrapper(OutMessageWrapper):
 		:param value: The value to set.
 		"""
 
-		if not glitch:
-			if not keys:
-				self.message = self.message.__class__.from_dict(value)
-				return
-			obj = self.message
-			for key in keys[:-1]:
-				if isinstance(obj, MutableSequence) and isinstance(key, int):
-					obj = obj.__getitem__(key)
+		with self.lock:
+			if not glitch:
+				self._flush_generated()
+				if not keys:
+					self.message = self.message.__class__.from_dict(value)
+					self._rebuild_template()
 				else:
-					if hasattr(obj, f'_{key}'):
-						obj = getattr(obj, f'_{key}')
-					else:
-						obj = getattr(obj, key)
-			value = getattr(obj, keys[-1]).__class__.from_dict(value)
-			if hasattr(obj, f'_{keys[-1]}'):
-				setattr(obj, f'_{keys[-1]}', value)
+					self._set_leaf(keys, value)
+					if self._template is not None:
+						self._patch_template(keys, value)
+				self.publish()
+			else:
+				# The glitch data is not published
+				if not keys:
+					self.glitch_data = value
+					return
+				obj = self.glitch_data
+				for key in keys[:-1]:
+					obj = obj[key]
+				obj[keys[-1]] = value
+
+	def _set_leaf(self, keys, value):
+		obj = self.message
+		for key in keys[:-1]:
+			if isinstance(obj, MutableSequence) and isinstance(key, int):
+				obj = obj.__getitem__(key)
 			else:
-				setattr(obj, keys[-1], value)
+				if hasattr(obj, f'_{key}'):
+					obj = getattr(obj, f'_{key}')
+				else:
+					obj = getattr(obj, key)
+		Leaf = getattr(obj, keys[-1]).__class__
+		# Plain Python leaves (int, float...) are set as is
+		value = Leaf.from_dict(value) if hasattr(Leaf, 'from_dict') else value
+		if hasattr(obj, f'_{keys[-1]}'):
+			setattr(obj, f'_{keys[-1]}', value)
 		else:
-			if not keys:
-				self.glitch_data = value
-				return
-			obj = self.glitch_data
-			for key in keys[:-1]:
-				obj = obj[key]
-			obj[keys[-1]] = value
+			setattr(obj, keys[-1], value)
 
 	def add_items_to_list(self, keys, items, glitch=False):
 		"""
@@ -146,7 +241,7 @@ class SpecOutMessageWrapper(OutMessageWrapper):
 		if not isinstance(items, list):
 			items = [items]
 		with self.lock:
-			_list = self.get_data(keys, glitch)
+			_list = self._get_data(keys, glitch, to_dict=False)
 
 			if not glitch:
 				if isinstance(_list, error.ErrorType):
@@ -156,6 +251,9 @@ class SpecOutMessageWrapper(OutMessageWrapper):
 				items = deepcopy(_list.__class__.from_dict(items)._list)
 
 			_list.extend(items)
+			if not glitch:
+				self._rebuild_template()
+				self.publish()
 
 	def remove_items_from_list(self, keys, indexes, glitch=False):
 		"""
@@ -168,16 +266,18 @@ class SpecOutMessageWrapper(OutMessageWrapper):
 		if not isinstance(indexes, list):
 			indexes = [indexes]
 		with self.lock:
-			_list = self.get_data(keys, glitch)
+			_list = self._get_data(keys, glitch, to_dict=False)
 			if isinstance(_list, error.ErrorType):
 				return _list
 			if not isinstance(_list, MutableSequence):
 				return error.ErrorType.NOT_A_LIST
-			for index in indexes:
-				if index < _list.__len__():
+			for index in sorted(indexes, reverse=True):
+				if index >= _list.__len__():
 					return error.ErrorType.INDEX_OUT_OF_RANGE
 				_list.pop(index)
-		return
+			if not glitch:
+				self._rebuild_template()
+				self.publish()
 
 	def reset_data(self):
 		"""
@@ -186,22 +286,80 @@ class SpecOutMessageWrapper(OutMessageWrapper):
 		with self.lock:
 			Message = getattr(self.parent_node.interface_pkg, self.name)
 			self.message = Message.from_dict(self.default_data)
+			# The generated fields restart from their initial values with the data
+			self._generated.clear()
+			if self.generators is not None:
+				self.generators.reset()
+			self._rebuild_template()
+			self.publish()
 
 	def get_message_data(self, to_dict=False, glitch=False):
+		if not glitch and self._generated:
+			with self.lock:
+				self._flush_generated()
 		message = self.message if not glitch else \
 			self.message.__class__.from_dict(self.glitch_data)
 		return message if not to_dict else message.to_dict()
 
 	def update_message(self, data, glitch=False):
-		if glitch:
-			self.glitch_data = data
-		else:
-			self.message = self.message.__class__.from_dict(data)
+		with self.lock:
+			if glitch:
+				self.glitch_data = data
+			else:
+				self._generated.clear()
+				self.message = self.message.__class__.from_dict(data)
+				self._rebuild_template()
+				self.publish()
 
 	def serialize(self):
 		if self.is_glitching:
 			return self.message.__class__.from_dict(self.glitch_data).serialize()
-		return self.get_message_data().serialize()
+		if self._template is not None:
+			return bytes(self._template)
+		return self.message.serialize()
+
+	def _is_integer(self, keys):
+		"""True if the leaf is an integer field (its layout format, else the type of its value)."""
+		if self._message_layout is not None and tuple(keys) in self._message_layout:
+			return self._message_layout[tuple(keys)][1].format[-1] in 'bBhHiIlLqQ?'
+		leaf = self._get_data(keys, to_dict=False)
+		if isinstance(leaf, error.ErrorType):
+			return False
+		value = leaf.to_dict() if hasattr(leaf, 'to_dict') else leaf
+		return isinstance(value, int)
+
+	def generate(self):
+		"""
+		Write the values of the generated fields for the current send.
+		With serialize-by-patch the values are packed in the template only and set in the
+		message on its next read (get_data, get_message_data), otherwise they are set in the message.
+		"""
+		if self.generators is None or self.is_glitching:
+			return
+		with self.lock:
+			# The generators are shared by the periodic sender and the on-demand sends
+			values = self.generators.values()
+			if self._integer_fields is None:
+				self._integer_fields = [self._is_integer(keys) for keys in self.generators.keys]
+			values = [round(value) if integer else value for value, integer in zip(values, self._integer_fields)]
+			if self._template is None:
+				for keys, value in zip(self.generators.keys, values):
+					self._set_leaf(keys, value)
+			else:
+				patches = list()
+				for keys, value in zip(self.generators.keys, values):
+					field = self._layout.get(tuple(keys))
+					if field is None:
+						self._set_leaf(keys, value)
+					else:
+						patches.append((field, value))
+						self._generated[tuple(keys)] = (keys, value)
+				if len(patches) < len(values):
+					# Fields outside the layout: the message is serialized again, then patched
+					self._rebuild_template()
+				for (offset, _struct), value in patches:
+					_struct.pack_into(self._template, offset, value)
+			self.publish()
 
 
 class ZMQOutMessageWrapper(OutMessageWrapper):
@@ -220,17 +378,20 @@ class ZMQOutMessageWrapper(OutMessageWrapper):
 	def update_data(self, keys, value, glitch=False):
 		if not self.message:
 			self.reset_message()
-		data = self.message.payload
-		for key in keys[:-1]:
-			data = data[key]
-		data[keys[-1]] = value
-		self.message = self.message.__class__.from_dict(data)
-
+		# The payload is updated in place
+		with self.lock:
+			data = self.message.payload
+			for key in keys[:-1]:
+				data = data[key]
+			data[keys[-1]] = value
+			self.publish()
 
 	def set_payload(self, payload):
 		if self.message is None:
 			self.reset_message()
-		self.message.payload = payload
+		with self.lock:
+			self.message.payload = payload
+			self.publish()
 
 	def serialize(self):
 		if self.is_glitching:
@@ -246,4 +407,6 @@ def get_out_message_wrapper(protocol: enums.ProtocolType):
 		OutMessageWrapper if protocol is enums.ProtocolType.UDP else \
 		SpecOutMessageWrapper if protocol is enums.ProtocolType.SPEC_TCP else \
 		SpecOutMessageWrapper if protocol is enums.ProtocolType.SPEC_UDP else \
+		OutMessageWrapper if protocol is enums.ProtocolType.INPROC else \
+		SpecOutMessageWrapper if protocol is enums.ProtocolType.SPEC_INPROC else \
 		ZMQOutMessageWrapper if protocol is enums.ProtocolType.ZMQ else None
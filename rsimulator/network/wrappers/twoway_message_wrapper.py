@@ -23,4 +23,6 @@ def get_two_way_message_wrapper(protocol: enums.ProtocolType):
 	return TwoWayMessageWrapper if protocol is enums.ProtocolType.TCP else \
 		TwoWayMessageWrapper if protocol is enums.ProtocolType.UDP else \
 		SpecTwoWayMessageWrapper if protocol is enums.ProtocolType.SPEC_TCP else \
-		SpecTwoWayMessageWrapper if protocol is enums.ProtocolType.SPEC_UDP else None
\ No newline at end of file
+		SpecTwoWayMessageWrapper if protocol is enums.ProtocolType.SPEC_UDP else \
+		TwoWayMessageWrapper if protocol is enums.ProtocolType.INPROC else \
+		SpecTwoWayMessageWrapper if protocol is enums.ProtocolType.SPEC_INPROC else None
\ No newline at end of file
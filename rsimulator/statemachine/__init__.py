@@ -1,9 +1,9 @@
-import yaml
-from .requirement import requirements
+from .requirement import requirements, get_requirement_manager
 from .rglobal import get_global_manager
 from .statemachine import get_sm_manager
 from .statemachine import create_machine
 from .statemachine import StateMachine
+from .statemachine import on_signal, on_message, on_connected, on_disconnected, on_global
 from importlib import import_module
 
 from .. import sm_config
@@ -11,7 +11,11 @@ from .. import sm_config
 def set_statemachine_log_file_name(filename):
 	sm_config._sm_log_file = filename
 
+def set_scheduler_workers(workers):
+	sm_config.SCHEDULER_WORKERS = workers
+
 def add_machines(filename):
+	import yaml
 	with open(filename, 'r') as stream:
 		machines = yaml.safe_load(stream)
 
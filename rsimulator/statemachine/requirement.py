@@ -2,13 +2,22 @@ import logging
 from .. import rlogging
 from .. import sm_config
 from .. import enums
+from ..utils.rsignal import signal_instance
+from ..utils import rclock
+from ..utils.timers import get_timer_heap
+from .rules import create_rule
 
 class RRequirementManager:
 	_instance = None
 	_requirements = dict()
-	logger = rlogging.RLogger(f"RSMManager", log_level=logging.INFO, file_name=sm_config.sm_log_path())
+	_rules = dict()          # name: Rule
+	_subscriptions = dict()  # name: [(signal, slot)]
+	_started = False
+	logger = rlogging.RLogger(f"RSMManager", log_level=logging.INFO, file_name=sm_config.sm_log_path)
 
 	# EACH REQUIREMENT CAN HAVE 3 STATES: PENDING, PASS, FAIL
+	# Requirements with a rule are evaluated at each message received or sent
+	# by the rule node (signals (node, message) and {node}.{message}_sent).
 
 	def __new__(cls, *args, **kwargs):
 		if not cls._instance:
@@ -29,6 +38,8 @@ class RRequirementManager:
 		if not self._requirements.get(name):
 			return
 		self._requirements[name] = enums.RequirementStateType.PENDING
+		if name in self._rules:
+			self._rules[name].reset()
 		return True
 
 	def confirm(self, name):
@@ -43,8 +54,96 @@ class RRequirementManager:
 		self._requirements[name] = enums.RequirementStateType.FAIL
 		return True
 
+	# Rules
+
+	def add_rule(self, name, rule, **params):
+		"""
+		Add a requirement evaluated by a rule.
+		:param rule: 'rate' (node, message, min_rate, duration, window=1.0)
+					 or 'range' (node, message, field, min=None, max=None)
+					 Both accept within=seconds: FAIL if not passed in time from the start
+		"""
+		if name in self._rules:
+			raise ValueError(f"Requirement rule '{name}' already exists!")
+		_rule = create_rule(rule, **params)
+		self._rules[name] = _rule
+		self._requirements[name] = enums.RequirementStateType.PENDING
+
+		def on_received(data=None, payload=None, **kwargs):
+			self._evaluate(name, _rule, data if data is not None else payload)
+
+		def on_sent(**kwargs):
+			data = None
+			if _rule.needs_data:
+				from ..network import get_network
+				message_wrap = get_network().get_message_wrap(_rule.message, node_name=_rule.node)
+				data = message_wrap.get_message_data(to_dict=True)
+			self._evaluate(name, _rule, data)
+
+		self._subscriptions[name] = [
+			((_rule.node, _rule.message), on_received),
+			(f'{_rule.node}.{_rule.message}_sent', on_sent),
+		]
+		# Sharded nodes: the worker forwards the signals, the requirement is evaluated here
+		from ..network.sharding import connect_main
+		for signal, slot in self._subscriptions[name]:
+			connect_main(signal, slot)
+		if self._started:
+			self._arm(name, _rule)
+		return _rule
+
+	def remove_rule(self, name):
+		"""Remove a rule and its requirement."""
+		if name not in self._rules:
+			raise ValueError(f"Requirement rule '{name}' not found.")
+		del self._rules[name]
+		for signal, slot in self._subscriptions.pop(name):
+			signal_instance.disconnect(signal, slot)
+		self._requirements.pop(name, None)
+
+	def load_rules(self, filename):
+		"""Add the rules of a YAML file: {requirement name: {rule: rate|range, node: ..., message: ..., ...}}"""
+		import yaml
+		with open(filename, 'r') as stream:
+			rules = yaml.safe_load(stream)
+		for name, params in rules.items():
+			self.add_rule(name, **params)
+
+	def get_rule(self, name):
+		return self._rules.get(name)
+
+	def start(self):
+		"""Start the time limits (within) of the rules."""
+		RRequirementManager._started = True
+		for name, rule in self._rules.items():
+			self._arm(name, rule)
+
+	def _arm(self, name, rule):
+		if rule.within is not None:
+			get_timer_heap().call_later(rule.within, self._expire, name, rule)
+
+	def _expire(self, name, rule):
+		if self._rules.get(name) is rule and self._requirements[name] is enums.RequirementStateType.PENDING:
+			self._set_state(name, enums.RequirementStateType.FAIL, f'not passed within {rule.within}s')
+
+	def _evaluate(self, name, rule, data):
+		# A signal already emitted may reach a removed rule
+		if self._rules.get(name) is not rule or self._requirements.get(name) is enums.RequirementStateType.FAIL:
+			return
+		try:
+			state = rule.update(rclock.monotonic(), data)
+		except Exception as e:
+			self.logger.error(f'Requirement {name} not evaluated', exc=e)
+			return
+		if state is not None and state is not self._requirements[name]:
+			self._set_state(name, state)
+
+	def _set_state(self, name, state, reason=''):
+		self._requirements[name] = state
+		self.logger.info(f'Requirement {name}: {state.name}{f" ({reason})" if reason else ""}')
+
 
 requirements = RRequirementManager()
 
 def get_requirement_manager() -> RRequirementManager:
-	return requirements
\ No newline at end of file
+	return requirements
@@ -1,11 +1,32 @@
 import logging
+import threading
 from .. import rlogging
-from .statemachine import sm_config
+from .. import sm_config
+from ..utils.rsignal import signal_instance
+
+
+def global_signal(name):
+	"""Signal emitted with name=, value= and version= when the global variable is added or changed."""
+	return f'global.{name}'
 
 class RGlobal:
+	# Each variable has a version, incremented at every change.
+	# Variables are spread on STRIPES locks by name, so threads working on
+	# different variables rarely wait for each other.
+	# Watchers and signals are notified after the locks are released, in version order:
+	# one thread at a time delivers the changes of a variable, the others leave it their
+	# change, and a change older than the last one delivered is dropped.
 	_instance = None
+	STRIPES = 16
 	variables = dict()
-	logger = rlogging.RLogger(f"RGlobal", log_level=logging.INFO, file_name=sm_config.sm_log_path())
+	_versions = dict()
+	_watchers = dict()  # name: [callback]
+	_pending = dict()  # name: latest (name, value, version) not delivered yet
+	_delivered = dict()  # name: last version delivered
+	_delivering = set()  # names whose changes are being delivered by a thread
+	_stripes = [threading.Lock() for _ in range(STRIPES)]
+	_forward = None  # Set in a worker process: sends its changes to the main process
+	logger = rlogging.RLogger(f"RGlobal", log_level=logging.INFO, file_name=sm_config.sm_log_path)
 
 
 	def __new__(cls, *args, **kwargs):
@@ -14,20 +35,126 @@ class RGlobal:
 			cls._instance = super(RGlobal, cls).__new__(cls, *args, **kwargs)
 		return cls._instance
 
+	def _lock(self, name):
+		return self._stripes[hash(name) % self.STRIPES]
 
-	def add_global_variable(self, name, value):
-		if self.variables.get(name):
-			return
+	def _locks(self, names):
+		"""Locks of several variables, in a fixed order to avoid deadlocks."""
+		return [self._stripes[index] for index in sorted({hash(name) % self.STRIPES for name in names})]
+
+	def _set(self, name, value):
+		"""Set a variable (its lock held). Return the notification to send, None if unchanged."""
+		# 0 -> False or 1 -> 1.0 are changes too
+		if name in self.variables and type(self.variables[name]) is type(value) and self.variables[name] == value:
+			return None
 		self.variables[name] = value
+		self._versions[name] = self._versions.get(name, 0) + 1
+		return name, value, self._versions[name]
+
+	def _notify(self, changes):
+		if self._forward is not None and changes:
+			self._forward(changes)
+		for change in changes:
+			name, version = change[0], change[2]
+			with self._lock(name):
+				pending = self._pending.get(name)
+				if version <= self._delivered.get(name, 0) or pending is not None and version <= pending[2]:
+					continue
+				self._pending[name] = change
+				if name in self._delivering:
+					continue
+				self._delivering.add(name)
+			self._deliver(name)
+
+	def _deliver(self, name):
+		"""Deliver the pending changes of a variable until there is none left."""
+		while True:
+			with self._lock(name):
+				change = self._pending.pop(name, None)
+				if change is None:
+					self._delivering.discard(name)
+					return
+				_, value, version = change
+				self._delivered[name] = version
+			for callback in self._watchers.get(name, ()):
+				try:
+					callback(name=name, value=value, version=version)
+				except Exception as e:
+					self.logger.error(f'Watcher of {name} failed', exc=e)
+			signal_instance.emit(global_signal(name), name=name, value=value, version=version, logger=self.logger)
+
+	def add_global_variable(self, name, value):
+		with self._lock(name):
+			if name in self.variables:
+				return
+			change = self._set(name, value)
+		self._notify([change])
 
 	def get_global_variable(self, name):
 		return self.variables.get(name)
 
+	def get_versioned(self, name):
+		"""Return (value, version) of a variable, (None, 0) if it does not exist."""
+		with self._lock(name):
+			return self.variables.get(name), self._versions.get(name, 0)
+
 	def update_global_variable(self, name, value):
-		if not self.variables.get(name):
-			return False
-		self.variables[name] = value
+		with self._lock(name):
+			if name not in self.variables:
+				return False
+			change = self._set(name, value)
+		if change:
+			self._notify([change])
+		return True
+
+	def compare_and_set(self, name, version, value):
+		"""
+		Set the variable only if its version is still `version` (read with get_versioned).
+		:return: True if the value was set
+		"""
+		with self._lock(name):
+			if name not in self.variables or self._versions[name] != version:
+				return False
+			change = self._set(name, value)
+		if change:
+			self._notify([change])
 		return True
 
+	def get_global_variables(self, names=None):
+		"""Return a consistent snapshot {name: value} of the variables (all of them if names is None)."""
+		names = list(self.variables) if names is None else names
+		locks = self._locks(names)
+		for lock in locks:
+			lock.acquire()
+		try:
+			return {name: self.variables.get(name) for name in names}
+		finally:
+			for lock in reversed(locks):
+				lock.release()
+
+	def set_global_variables(self, values):
+		"""Add or update several variables at once: readers see all or none of the changes."""
+		locks = self._locks(values)
+		for lock in locks:
+			lock.acquire()
+		try:
+			changes = [self._set(name, value) for name, value in values.items()]
+		finally:
+			for lock in reversed(locks):
+				lock.release()
+		self._notify([change for change in changes if change])
+
+	def watch(self, name, callback):
+		"""
+		Call callback(name=, value=, version=) at the changes of the variable, in version order.
+		Changes made concurrently may be coalesced: the last one is always delivered.
+		"""
+		with self._lock(name):
+			self._watchers[name] = self._watchers.get(name, list()) + [callback]
+
+	def unwatch(self, name, callback):
+		with self._lock(name):
+			self._watchers[name] = [watcher for watcher in self._watchers.get(name, list()) if watcher != callback]
+
 def get_global_manager():
-	return RGlobal()
\ No newline at end of file
+	return RGlobal()
@@ -0,0 +1,121 @@
+from .. import enums
+
+PENDING = enums.RequirementStateType.PENDING
+PASS = enums.RequirementStateType.PASS
+FAIL = enums.RequirementStateType.FAIL
+
+
+class Rule:
+	"""
+	Requirement rule evaluated at each occurrence of a message:
+	received by the node (IN) or sent by the node (OUT).
+	update() returns the new state of the requirement, None if unchanged.
+	Every rule keeps a constant amount of state.
+	"""
+
+	def __init__(self, node, message, within=None):
+		"""
+		:param node: Node name
+		:param message: Message name
+		:param within: Seconds from the start to pass the rule, FAIL afterwards (None: no limit)
+		"""
+		self.node = node
+		self.message = message
+		self.within = within
+		self.events = 0
+
+	@property
+	def needs_data(self):
+		"""True if update() reads the message data."""
+		return False
+
+	def reset(self):
+		self.events = 0
+
+	def update(self, now, data):
+		pass
+
+
+class RateRule(Rule):
+	"""
+	PASS once the message rate is at least min_rate (Hz) for duration seconds.
+	The rate is measured on consecutive windows of `window` seconds.
+	"""
+
+	def __init__(self, node, message, min_rate, duration, window=1.0, within=None):
+		super().__init__(node, message, within)
+		self.min_rate = min_rate
+		self.duration = duration
+		self.window = window
+		self.reset()
+
+	def reset(self):
+		super().reset()
+		self._window_start = None
+		self._window_count = 0
+		self._since = None  # Start of the windows above min_rate
+
+	def update(self, now, data):
+		self.events += 1
+		if self._window_start is None:
+			self._window_start = now
+		elapsed = now - self._window_start
+		if elapsed >= self.window:
+			windows = int(elapsed // self.window)
+			if self._window_count / self.window >= self.min_rate:
+				if self._since is None:
+					self._since = self._window_start
+				if self._window_start + self.window - self._since >= self.duration:
+					return PASS
+			else:
+				self._since = None
+			if windows > 1:
+				# Windows without messages
+				self._since = None
+			self._window_start += windows * self.window
+			self._window_count = 0
+		self._window_count += 1
+		return None
+
+
+class RangeRule(Rule):
+	"""
+	PASS while every value of the field is within [min, max], FAIL at the first value outside.
+	The field is a dotted path of the message data ('position.x', 'items.0').
+	"""
+
+	def __init__(self, node, message, field, min=None, max=None, within=None):
+		super().__init__(node, message, within)
+		self.field = field
+		self.keys = [int(key) if key.isdigit() else key for key in field.split('.')]
+		self.min = min
+		self.max = max
+		self.last_value = None
+
+	@property
+	def needs_data(self):
+		return True
+
+	def reset(self):
+		super().reset()
+		self.last_value = None
+
+	def update(self, now, data):
+		self.events += 1
+		for key in self.keys:
+			data = data[key]
+		self.last_value = data
+		if (self.min is not None and data < self.min) or (self.max is not None and data > self.max):
+			return FAIL
+		return PASS
+
+
+_rules = dict(rate=RateRule, range=RangeRule)
+
+
+def create_rule(rule, **params):
+	"""Return the Rule of type `rule` ('rate' or 'range')."""
+	RuleType = _rules.get(rule)
+	if RuleType is None:
+		raise ValueError(f'Unknown requirement rule {rule!r}: expected one of {", ".join(_rules)}')
+	return RuleType(**params)
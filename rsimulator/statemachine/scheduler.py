@@ -0,0 +1,139 @@
+import heapq
+import itertools
+import threading
+
+from ..utils import rclock
+
+
+class ScheduledLoop:
+	"""Periodic loop of a state machine and its timing statistics."""
+
+	def __init__(self, name, machine, loop, interval):
+		self.name = name
+		self.machine = machine
+		self.loop = loop
+		self.interval = interval
+		self.deadline = None
+		self.cancelled = False
+		self.subscriptions = list()  # (signal, slot) of the machine events
+		self.runs = 0
+		self.overruns = 0        # Runs which ended after the next deadline
+		self.skipped = 0         # Periods skipped because of the overruns
+		self.errors = 0
+		self.last_duration = 0.0
+		self.max_duration = 0.0
+		self.max_lateness = 0.0  # Worst delay between a deadline and the start of its run
+
+	@property
+	def stats(self):
+		return dict(
+			interval=self.interval,
+			runs=self.runs,
+			overruns=self.overruns,
+			skipped=self.skipped,
+			errors=self.errors,
+			last_duration=self.last_duration,
+			max_duration=self.max_duration,
+			max_lateness=self.max_lateness,
+		)
+
+
+class Scheduler:
+	"""
+	Run the loops of the state machines from a deadline heap.
+	The loops are executed by `workers` threads (one by default): a loop is out of the
+	heap while it runs, so it never runs concurrently with itself.
+	Deadlines follow a fixed grid (start + k * interval) so periods do not drift;
+	a run ending after its next deadline is an overrun and the missed periods are skipped.
+	Removed loops are only flagged and dropped when they reach the top of the heap.
+	"""
+
+	def __init__(self, logger, workers=1):
+		self.logger = logger
+		self.workers = workers
+		self._heap = list()  # (deadline, sequence, ScheduledLoop)
+		self._sequence = itertools.count()
+		self._condition = threading.Condition()
+		self._threads = list()
+		self._running = False
+
+	def add(self, scheduled, delay=0.0):
+		with self._condition:
+			scheduled.deadline = rclock.monotonic() + delay
+			self._push(scheduled)
+
+	def remove(self, scheduled):
+		with self._condition:
+			scheduled.cancelled = True
+
+	def _push(self, scheduled):
+		heapq.heappush(self._heap, (scheduled.deadline, next(self._sequence), scheduled))
+		# Wake a worker only if the new loop is the next one due
+		if self._heap[0][2] is scheduled:
+			self._condition.notify()
+
+	def start(self):
+		if self._running:
+			return
+		self._running = True
+		self._threads = [threading.Thread(target=self._work, name=f'sm_scheduler_{index}', daemon=True)
+			for index in range(self.workers)]
+		for thread in self._threads:
+			thread.start()
+
+	def stop(self):
+		with self._condition:
+			self._running = False
+			self._condition.notify_all()
+		for thread in self._threads:
+			thread.join()
+		self._threads = list()
+		self._heap.clear()
+
+	def _next(self):
+		"""Wait for the next due loop. Return None when the scheduler stops."""
+		with self._condition:
+			while self._running:
+				if not self._heap:
+					rclock.wait(self._condition)
+					continue
+				deadline, _, scheduled = self._heap[0]
+				if scheduled.cancelled:
+					heapq.heappop(self._heap)
+					continue
+				delay = deadline - rclock.monotonic()
+				if delay > 0:
+					rclock.wait(self._condition, delay)
+					continue
+				heapq.heappop(self._heap)
+				return scheduled
+		return None
+
+	def _work(self):
+		while True:
+			scheduled = self._next()
+			if scheduled is None:
+				return
+			start = rclock.monotonic()
+			scheduled.max_lateness = max(scheduled.max_lateness, start - scheduled.deadline)
+			try:
+				scheduled.loop()
+			except Exception as e:
+				scheduled.errors += 1
+				self.logger.error(f'{scheduled.name} loop failed', exc=e)
+			end = rclock.monotonic()
+			scheduled.runs += 1
+			scheduled.last_duration = end - start
+			scheduled.max_duration = max(scheduled.max_duration, scheduled.last_duration)
+
+			deadline = scheduled.deadline + scheduled.interval
+			if end > deadline and scheduled.interval > 0:
+				missed = int((end - deadline) // scheduled.interval) + 1
+				scheduled.overruns += 1
+				scheduled.skipped += missed
+				deadline += missed * scheduled.interval
+			with self._condition:
+				if scheduled.cancelled:
+					continue
+				scheduled.deadline = deadline
+				self._push(scheduled)
@@ -1,14 +1,41 @@
-import threading
-import time
-from transitions import Machine
 import logging
 
 from .. import rlogging
 from .. import sm_config
+from ..utils.rsignal import signal_instance
+from .rglobal import global_signal
+from .scheduler import Scheduler, ScheduledLoop
+
+
+def on_signal(*signals):
+	"""
+	Decorator: call the method as soon as one of the signals is emitted,
+	with the keyword arguments of the signal (e.g. data= and logger= for a message).
+	"""
+	def decorator(method):
+		method.signals = getattr(method, 'signals', tuple()) + signals
+		return method
+	return decorator
+
+def on_message(node_name, message_name):
+	return on_signal((node_name, message_name))
+
+def on_connected(node_name):
+	return on_signal(f'{node_name}_connected')
+
+def on_disconnected(node_name):
+	return on_signal(f'{node_name}_disconnected')
+
+def on_global(name):
+	return on_signal(global_signal(name))
+
 
 class StateMachine:
+	# Loop period in seconds, None for a machine driven only by its events
 	interval = 1
-	logger = rlogging.RLogger(f"RSMManager", log_level=logging.INFO, file_name=sm_config.sm_log_path())
+	# {signal: trigger name}: the trigger is called (without arguments) when the signal is emitted
+	events = dict()
+	logger = rlogging.RLogger(f"RSMManager", log_level=logging.INFO, file_name=sm_config.sm_log_path)
 
 	def __init__(self):
 		pass
@@ -20,33 +47,15 @@ class StateMachine:
 		self.logger.info('Absract Loop called.. Reimplement loop() function!')
 
 
-class StateMachineWorker(threading.Thread):
-	# Lo scopo di questa classe è creare un thread
-	# dedicato per ogni singola state machine
-	# Il thread esegue un loop che tiene traccia
-	# dell'evoluzione dei parametri e la gestione degli eventi
-
-	def __init__(self, machine, loop, interval=1.0):
-		super().__init__(name=machine.__class__.__name__)
-		self.machine = machine
-		self.loop = loop
-		self.interval = interval
-		self._stop_event = threading.Event()
-
-	def run(self):
-		while not self._stop_event.is_set():
-			self.loop()
-			time.sleep(self.interval)
-
-	def stop(self):
-		self._stop_event.set()
-
-
 class RStateMachineManager:
+	# The loops of all the machines are run by a single Scheduler
+	# (sm_config.SCHEDULER_WORKERS threads) instead of a thread per machine
 	_instance = None
-	_machines = dict()  # name: StateMachineWorker
+	_machines = dict()  # name: ScheduledLoop
+	_scheduler = None
+	_running = False
 
-	logger = rlogging.RLogger(f"RSMManager", log_level=logging.INFO, file_name=sm_config.sm_log_path())
+	logger = rlogging.RLogger(f"RSMManager", log_level=logging.INFO, file_name=sm_config.sm_log_path)
 
 	def __new__(cls, *args, **kwargs):
 		"""
@@ -61,6 +70,12 @@ class RStateMachineManager:
 	def __init__(self):
 		pass
 
+	@property
+	def scheduler(self):
+		if self._scheduler is None:
+			RStateMachineManager._scheduler = Scheduler(self.logger, workers=sm_config.SCHEDULER_WORKERS)
+		return self._scheduler
+
 	def get_property(self, name, p):
 		return getattr(self.get_machine(name).model, p)
 
@@ -70,39 +85,91 @@ class RStateMachineManager:
 	def add_machine(self, name, machine, loop, interval=1.0):
 		if name in self._machines:
 			raise ValueError(f"Machine '{name}' already exists in manager!")
-		worker = StateMachineWorker(machine, loop, interval)
-		self._machines[name] = worker
+		scheduled = ScheduledLoop(name, machine, loop, interval)
+		self._machines[name] = scheduled
+		if self._running and interval is not None:
+			# Machines added at runtime are scheduled right away
+			self.scheduler.add(scheduled)
+			self.logger.info(f'{name} started.')
 
 	def start(self):
-		for name, worker in self._machines.items():
-			worker.start()
+		if self._running:
+			return
+		RStateMachineManager._running = True
+		for name, scheduled in self._machines.items():
+			if scheduled.interval is not None:
+				self.scheduler.add(scheduled)
 			self.logger.info(f'{name} started.')
+		self.scheduler.start()
 
 	def stop(self):
-		for worker in self._machines.values():
-			worker.stop()
-		for name, worker in self._machines.items():
-			worker.join()
+		if not self._running:
+			return
+		RStateMachineManager._running = False
+		self.scheduler.stop()
+		for name in self._machines:
 			self.logger.info(f'{name} stopped.')
 
 	def get_machine(self, name):
-		worker = self._machines.get(name)
-		if worker is None:
+		scheduled = self._machines.get(name)
+		if scheduled is None:
+			raise ValueError(f"Machine '{name}' not found in manager.")
+		return scheduled.machine
+
+	def get_stats(self, name=None):
+		"""
+		Return the timing statistics of a machine loop (runs, overruns, skipped periods, errors,
+		durations and worst lateness), or {name: statistics} of every machine if name is None.
+		"""
+		if name is None:
+			return {name: scheduled.stats for name, scheduled in self._machines.items()}
+		scheduled = self._machines.get(name)
+		if scheduled is None:
+			raise ValueError(f"Machine '{name}' not found in manager.")
+		return scheduled.stats
+
+	def subscribe(self, name, model):
+		"""
+		Connect the event handlers of the model of a machine: the methods decorated with
+		on_signal (on_message, on_connected, ...) and the triggers of its `events`.
+		They run in the thread emitting the signal, without waiting for the loop.
+		"""
+		scheduled = self._machines.get(name)
+		if scheduled is None:
 			raise ValueError(f"Machine '{name}' not found in manager.")
-		return worker.machine
+
+		def slot(handler, label, trigger=False):
+			def internal_slot(**kwargs):
+				try:
+					return handler() if trigger else handler(**kwargs)
+				except Exception as e:
+					self.logger.error(f'{name} {label} failed', exc=e)
+			return internal_slot
+
+		for signal, trigger in getattr(model, 'events', dict()).items():
+			scheduled.subscriptions.append((signal, slot(getattr(model, trigger), trigger, trigger=True)))
+		for attribute in dir(type(model)):
+			for signal in getattr(getattr(type(model), attribute, None), 'signals', tuple()):
+				scheduled.subscriptions.append((signal, slot(getattr(model, attribute), attribute)))
+		# Sharded nodes: the worker forwards the signals, the handlers change this model
+		from ..network.sharding import connect_main
+		for signal, internal_slot in scheduled.subscriptions:
+			connect_main(signal, internal_slot)
 
 	def remove_machine(self, name):
 		if name in self._machines:
-			worker = self._machines[name]
-			worker.stop()
-			worker.join()
-			del self._machines[name]
+			scheduled = self._machines.pop(name)
+			for signal, slot in scheduled.subscriptions:
+				signal_instance.disconnect(signal, slot)
+			# The loop is dropped from the scheduler when it is next due
+			self.scheduler.remove(scheduled)
 		else:
 			raise ValueError(f"Machine '{name}' not found in manager.")
 
 
 
 def create_machine(name, model, states, transitions, initial):
+	from transitions import Machine
 	machine = Machine(
 		model=model,
 		states=states,
@@ -110,7 +177,9 @@ def create_machine(name, model, states, transitions, initial):
 		initial=initial
 	)
 
-	RStateMachineManager().add_machine(name, machine, model.loop, model.interval)
+	manager = RStateMachineManager()
+	manager.add_machine(name, machine, model.loop, model.interval)
+	manager.subscribe(name, model)
 
 def get_sm_manager() -> RStateMachineManager:
 	return RStateMachineManager()
@@ -0,0 +1,41 @@
+import random
+
+
+class Backoff:
+	"""
+	Exponential backoff with jitter.
+	Iterating over a Backoff yields the delay to wait after each failed attempt:
+	initial, initial * factor, ... capped to maximum, each one randomized by +/- jitter.
+	"""
+
+	def __init__(self, initial=0.05, maximum=2.0, factor=2.0, jitter=0.2, attempts=None):
+		"""
+		:param initial: First delay in seconds
+		:param maximum: Upper bound of the delay in seconds
+		:param factor: Multiplier applied after each attempt
+		:param jitter: Relative randomization of each delay (0.2 -> +/-20%)
+		:param attempts: Number of attempts (None for unlimited)
+		"""
+		self.initial = initial
+		self.maximum = maximum
+		self.factor = factor
+		self.jitter = jitter
+		self.attempts = attempts
+		self._delay = initial
+
+	def reset(self):
+		self._delay = self.initial
+
+	def next_delay(self):
+		delay = min(self._delay, self.maximum)
+		self._delay = min(self._delay * self.factor, self.maximum)
+		if self.jitter:
+			delay *= 1 + random.uniform(-self.jitter, self.jitter)
+		return max(delay, 0)
+
+	def __iter__(self):
+		self.reset()
+		attempt = 0
+		while self.attempts is None or attempt < self.attempts:
+			attempt += 1
+			yield self.next_delay()
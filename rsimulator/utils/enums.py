@@ -3,7 +3,7 @@ import enum
 class RequirementStateType(enum.Enum):
 	PENDING = enum.auto()
 	PASS = enum.auto()
-	FAIL = enum.auto
+	FAIL = enum.auto()
 
 class MessageDirectionType(enum.Enum):
 	UNKNOWN = None
@@ -24,6 +24,8 @@ class ProtocolType(enum.Enum):
 	ZMQ = enum.auto()
 	SPEC_TCP = enum.auto()
 	SPEC_UDP = enum.auto()
+	INPROC = enum.auto()
+	SPEC_INPROC = enum.auto()
 
 	ZMQ_REQ = enum.auto()
 	ZMQ_PUSH = enum.auto()
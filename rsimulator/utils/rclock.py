@@ -0,0 +1,216 @@
+import threading
+import time as _time
+
+# Clock of the simulation: periodic senders, state machine loops, timers, watchdogs and
+# requirements read the time and sleep through this module.
+#
+#   rclock.use_virtual_clock()  # before rsimulator.start()
+#   rsimulator.start()
+#   rclock.sleep(600)           # the 10 minute scenario runs as fast as its events allow
+#
+# The clock must be chosen before the start: threads already waiting keep the old clock.
+# Sockets, connection statistics and traffic recordings always use the wall clock.
+
+RECHECK = 0.05  # Real seconds between two jump attempts of a blocked participant
+
+
+class RealClock:
+	"""Wall clock (default)."""
+	virtual = False
+
+	def time(self):
+		return _time.time()
+
+	def monotonic(self):
+		return _time.monotonic()
+
+	def sleep(self, seconds):
+		_time.sleep(seconds)
+
+	def wait(self, condition, timeout=None):
+		"""condition.wait(timeout), the caller holds the condition."""
+		return condition.wait(timeout)
+
+
+class VirtualClock:
+	"""
+	Simulated time advanced by the clock itself: when every participant thread is blocked
+	on the clock (sleep or wait), the time jumps to the earliest deadline.
+	Participants are the threads that sleep or wait on the clock and the registered ones
+	(the thread creating the clock with use_virtual_clock). A participant blocked on anything
+	else (socket, queue, lock) stops the time until it comes back to the clock.
+	Before each jump the clock waits `settle` real seconds, so the messages in flight between
+	the nodes are delivered at the current time.
+	"""
+	virtual = True
+
+	def __init__(self, start=None, settle=0.001):
+		"""
+		:param start: Epoch of the virtual time 0 (None for now)
+		:param settle: Real seconds given to the other threads before every jump
+		"""
+		self._now = 0.0
+		self._epoch = _time.time() if start is None else start
+		self.settle = settle
+		self._condition = threading.Condition()
+		self._participants = set()
+		self._blocked = dict()     # Thread: deadline (None if waiting without timeout)
+		self._conditions = dict()  # Thread: condition waited through wait()
+		self._generation = 0       # Incremented when a participant blocks or wakes up
+		self.jumps = 0
+
+	def time(self):
+		return self._epoch + self._now
+
+	def monotonic(self):
+		return self._now
+
+	def register(self, thread=None):
+		"""Count the thread as a participant: the time stops while it is not blocked on the clock."""
+		with self._condition:
+			self._participants.add(thread or threading.current_thread())
+
+	def unregister(self, thread=None):
+		with self._condition:
+			self._participants.discard(thread or threading.current_thread())
+		self._notify(self._advance())
+
+	def sleep(self, seconds):
+		me = threading.current_thread()
+		with self._condition:
+			deadline = self._now + max(seconds, 0.0)
+			self._block(me, deadline)
+		while True:
+			self._notify(self._advance())
+			with self._condition:
+				if self._now >= deadline or self._condition.wait(RECHECK) and self._now >= deadline:
+					self._unblock(me)
+					return
+
+	def wait(self, condition, timeout=None):
+		"""
+		condition.wait(timeout) in virtual time, the caller holds the condition (once).
+		Return False if the timeout expired. Like condition.wait, it may return early.
+		"""
+		me = threading.current_thread()
+		with self._condition:
+			deadline = None if timeout is None else self._now + max(timeout, 0.0)
+			self._block(me, deadline, condition)
+		try:
+			while True:
+				conditions = self._advance()
+				if condition in conditions:
+					# Other waiters of our condition (we hold it)
+					condition.notify_all()
+					conditions = [other for other in conditions if other is not condition]
+				if conditions:
+					# Never take another condition while holding ours: the other waiter may hold
+					# its own and be notifying ours. Release it, as condition.wait would.
+					condition.release()
+					try:
+						self._notify(conditions)
+					finally:
+						condition.acquire()
+					# A notify of our condition may have been missed meanwhile: the caller checks again
+					return deadline is None or self._now < deadline
+				if deadline is not None and self._now >= deadline:
+					return False
+				# Woken up by a notify of the condition or by a jump past the deadline
+				if condition.wait(RECHECK):
+					return deadline is None or self._now < deadline
+		finally:
+			with self._condition:
+				self._unblock(me)
+
+	def _block(self, thread, deadline, condition=None):
+		self._participants.add(thread)
+		self._blocked[thread] = deadline
+		if condition is not None:
+			self._conditions[thread] = condition
+		self._generation += 1
+
+	def _unblock(self, thread):
+		self._blocked.pop(thread, None)
+		self._conditions.pop(thread, None)
+		self._generation += 1
+
+	def _advance(self):
+		"""
+		Jump to the earliest deadline if every participant is blocked.
+		Return the conditions of the waiters reaching their deadline with the jump, to be notified
+		by the caller without holding any condition.
+		"""
+		with self._condition:
+			if not self._idle():
+				return []
+			generation = self._generation
+		if self.settle:
+			_time.sleep(self.settle)
+		with self._condition:
+			if generation != self._generation or not self._idle():
+				# A participant woke up or blocked meanwhile: it tries the jump itself
+				return []
+			deadlines = [deadline for deadline in self._blocked.values() if deadline is not None]
+			if not deadlines:
+				return []
+			deadline = min(deadlines)
+			if deadline <= self._now:
+				# Already reached: its waiter was woken up by the jump to it
+				return []
+			self._now = deadline
+			self.jumps += 1
+			self._condition.notify_all()
+			# Only the waiters of the new time: the earlier ones were notified by their own jump
+			return [condition for thread, condition in self._conditions.items()
+					if self._blocked[thread] == deadline]
+
+	def _idle(self):
+		# Participants which ended are forgotten
+		self._participants = {thread for thread in self._participants if thread.is_alive()}
+		return all(thread in self._blocked for thread in self._participants)
+
+	@staticmethod
+	def _notify(conditions):
+		for condition in conditions:
+			with condition:
+				condition.notify_all()
+
+
+_clock = RealClock()
+
+
+def get_clock():
+	return _clock
+
+
+def set_clock(clock):
+	global _clock
+	_clock = clock
+
+
+def use_virtual_clock(start=None, settle=0.001):
+	"""Switch to a VirtualClock with the calling thread as participant. Return the clock."""
+	clock = VirtualClock(start, settle)
+	clock.register()
+	set_clock(clock)
+	return clock
+
+
+def use_real_clock():
+	set_clock(RealClock())
+
+
+def time():
+	return _clock.time()
+
+
+def monotonic():
+	return _clock.monotonic()
+
+
+def sleep(seconds):
+	_clock.sleep(seconds)
+
+
+def wait(condition, timeout=None):
+	return _clock.wait(condition, timeout)
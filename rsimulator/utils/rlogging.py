@@ -1,5 +1,5 @@
 import logging
-import inspect
+import os
 import traceback
 
 
@@ -14,7 +14,7 @@ class RLogger(logging.Logger):
 		super().__init__(name)
 		self.setLevel(log_level)
 		if file_name:
-			self.addHandler(RLogger.get_file_handler(file_name))
+			self.addHandler(LazyFileHandler(file_name))
 		if console:
 			self.addHandler(RLogger.get_console_handler())
 
@@ -48,6 +48,7 @@ class RLogger(logging.Logger):
 	def get_file_handler(cls, file_name):
 		file_handler = cls.file_handlers.get(file_name)
 		if not file_handler:
+			os.makedirs(os.path.dirname(os.path.abspath(file_name)), exist_ok=True)
 			cls.file_handlers[file_name] = logging.FileHandler(file_name, mode='w')
 			cls.file_handlers[file_name].setFormatter(cls._formatter)
 		return cls.file_handlers[file_name]
@@ -60,3 +61,20 @@ class RLogger(logging.Logger):
 		return cls.console_handler
 
 
+class LazyFileHandler(logging.Handler):
+	"""
+	Forward the records to the shared RLogger file handler, opened on the first record.
+	Creating a logger therefore does not touch the file system.
+	:param file_name: Log file path, or a callable returning it
+	"""
+
+	def __init__(self, file_name):
+		super().__init__()
+		self.file_name = file_name
+		self._file_handler = None
+
+	def emit(self, record):
+		if self._file_handler is None:
+			file_name = self.file_name() if callable(self.file_name) else self.file_name
+			self._file_handler = RLogger.get_file_handler(file_name)
+		self._file_handler.handle(record)
@@ -24,12 +24,20 @@ class SignalSlot:
 
     # Note: signal = (node_name, message_name)       # message received
     #       signal = {node_name}_connected           # node connected      (ZMQ or TCP)
+    #       signal = global.{name}                   # global variable added or changed
+    #       signal = {node_name}.{message_name}_timeout  # no arrival within max_gap
+    #       signal = {node_name}.{message_name}_sent     # message sent with send_message
 
     def connect(self, signal, slot):
         """Link a slot to a signal"""
         self._listeners.setdefault(signal, list())
         self._listeners[signal].append(slot)
 
+    def disconnect(self, signal, slot):
+        """Unlink a slot from a signal"""
+        if slot in self._listeners.get(signal, list()):
+            self._listeners[signal].remove(slot)
+
     def emit(self, signal, *args, **kwargs):
         """Emit signal to the connected slots"""
         responses = list()
@@ -0,0 +1,103 @@
+import heapq
+import itertools
+import logging
+import os
+import threading
+
+from . import rclock
+from . import rlogging
+
+
+class Timer:
+	"""One-shot timer of a TimerHeap."""
+	__slots__ = 'deadline', 'callback', 'args', 'cancelled'
+
+	def __init__(self, deadline, callback, args):
+		self.deadline = deadline
+		self.callback = callback
+		self.args = args
+		self.cancelled = False
+
+	def cancel(self):
+		self.cancelled = True
+
+	def postpone(self, deadline):
+		"""
+		Move the deadline later without touching the heap: the timer is pushed
+		again at its new deadline when the old one is reached.
+		"""
+		self.deadline = deadline
+
+
+class TimerHeap:
+	"""
+	Timers of the whole process on a single heap and a single thread.
+	Scheduling costs O(log n), cancelling and postponing O(1): cancelled timers are
+	dropped and postponed timers pushed again only when they reach the top of the heap.
+	Callbacks run in the timer thread and must not block.
+	"""
+
+	def __init__(self):
+		self._heap = list()  # (deadline, sequence, Timer)
+		self._sequence = itertools.count()
+		self._condition = threading.Condition()
+		self._thread = None
+		self._pid = None
+		self.logger = rlogging.RLogger('TimerHeap', log_level=logging.INFO)
+
+	def call_at(self, deadline, callback, *args):
+		"""Call callback(*args) at the rclock.monotonic() deadline. Return the Timer."""
+		timer = Timer(deadline, callback, args)
+		with self._condition:
+			self._ensure_thread()
+			heapq.heappush(self._heap, (deadline, next(self._sequence), timer))
+			if self._heap[0][2] is timer:
+				self._condition.notify()
+		return timer
+
+	def call_later(self, delay, callback, *args):
+		return self.call_at(rclock.monotonic() + delay, callback, *args)
+
+	def __len__(self):
+		return len(self._heap)
+
+	def _ensure_thread(self):
+		# A forked process inherits the heap but not the thread
+		if self._pid != os.getpid():
+			self._pid = os.getpid()
+			self._heap = [entry for entry in self._heap if not entry[2].cancelled]
+			heapq.heapify(self._heap)
+			self._thread = threading.Thread(target=self._run, name='timer_heap', daemon=True)
+			self._thread.start()
+
+	def _run(self):
+		while True:
+			with self._condition:
+				while True:
+					if not self._heap:
+						rclock.wait(self._condition)
+						continue
+					deadline, _, timer = self._heap[0]
+					if timer.cancelled:
+						heapq.heappop(self._heap)
+						continue
+					if timer.deadline > deadline:
+						heapq.heapreplace(self._heap, (timer.deadline, next(self._sequence), timer))
+						continue
+					delay = deadline - rclock.monotonic()
+					if delay > 0:
+						rclock.wait(self._condition, delay)
+						continue
+					heapq.heappop(self._heap)
+					break
+			try:
+				timer.callback(*timer.args)
+			except Exception as e:
+				self.logger.error(f'Timer callback {timer.callback} failed', exc=e)
+
+
+_timer_heap = TimerHeap()
+
+
+def get_timer_heap() -> TimerHeap:
+	return _timer_heap
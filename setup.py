@@ -10,7 +10,8 @@ setup(
     },
     install_requires=[],
     extras_require={
-        'all': ['pyyaml', 'zmq', 'transitions']
+        'all': ['pyyaml', 'zmq', 'transitions'],
+        'batch': ['numpy']
     },
     author='Riccardo Griffo',
     author_email='riccardogriffo1995@gmail.com',